@@ -0,0 +1,204 @@
+"""Control de admisión de las peticiones de transcripción y análisis.
+
+Cada worker de la API limita las peticiones que procesa a la vez y las que
+pueden esperar turno; el resto se rechaza enseguida con 429 y `Retry-After`
+en lugar de acumularse en los pools hasta agotar el tiempo del cliente.
+PROCESSING_TIMEOUT acota el tiempo total de cada petición admitida (504).
+
+Al vencer el plazo el cliente recibe 504, pero el trabajo ya enviado a los
+pools no se puede interrumpir: la petición conserva su lugar hasta que ese
+trabajo termina, de modo que `active` refleja la carga real de los pools.
+"""
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+from fastapi import HTTPException
+
+from . import metrics
+from .config import settings
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class AdmissionLimiter:
+    """Semáforo con cola acotada.
+
+    Admite hasta `max_concurrent` peticiones a la vez y deja esperar hasta
+    `max_queue`; con la cola llena responde 429 con un `Retry-After`
+    estimado a partir de la duración media de las peticiones recientes.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, retry_after: int = 5):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        # Media móvil de la duración de las peticiones admitidas
+        self._service_time: Optional[float] = None
+        self.stats = {"admitted": 0, "rejected": 0, "timeouts": 0}
+        # Peticiones vencidas cuyo trabajo sigue en curso
+        self._detached: set = set()
+
+    def is_full(self) -> bool:
+        return self.active >= self.max_concurrent and self.waiting >= self.max_queue
+
+    def estimate_retry_after(self) -> int:
+        """Segundos hasta que probablemente se libere un lugar en la cola."""
+        if self._service_time is None:
+            return self.retry_after
+        waves = (self.waiting + 1) / self.max_concurrent
+        return max(self.retry_after, min(300, math.ceil(self._service_time * waves)))
+
+    def check(self) -> None:
+        """Rechaza con 429 si no hay lugar; no reserva nada."""
+        if self.is_full():
+            self.stats["rejected"] += 1
+            metrics.ADMISSION_REQUESTS.labels(self.name, "rejected").inc()
+            retry_after = self.estimate_retry_after()
+            logger.warning(f"Petición rechazada por {self.name}: {self.active} en curso, {self.waiting} en espera")
+            raise HTTPException(
+                status_code=429,
+                detail="El servidor está ocupado, reintente más tarde",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """Reserva un lugar, esperando en la cola como mucho `timeout` segundos."""
+        self.check()
+        self.waiting += 1
+        metrics.QUEUE_DEPTH.labels(f"admission_{self.name}").inc()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise self.timed_out()
+        finally:
+            self.waiting -= 1
+            metrics.QUEUE_DEPTH.labels(f"admission_{self.name}").dec()
+
+        self.active += 1
+        self.stats["admitted"] += 1
+        metrics.ADMISSION_REQUESTS.labels(self.name, "admitted").inc()
+        metrics.ADMISSION_ACTIVE.labels(self.name).inc()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._service_time = (
+                elapsed if self._service_time is None else 0.8 * self._service_time + 0.2 * elapsed
+            )
+            self.active -= 1
+            metrics.ADMISSION_ACTIVE.labels(self.name).dec()
+            self._semaphore.release()
+
+    def timed_out(self) -> HTTPException:
+        self.stats["timeouts"] += 1
+        metrics.ADMISSION_REQUESTS.labels(self.name, "timeout").inc()
+        return HTTPException(
+            status_code=504,
+            detail="El procesamiento superó el tiempo máximo permitido"
+        )
+
+    async def run(
+        self,
+        func: Callable[..., Awaitable[T]],
+        *args: Any,
+        timeout: Optional[float] = None
+    ) -> T:
+        """Ejecuta `await func(*args)` con un lugar reservado y un límite de tiempo.
+
+        El límite cuenta desde la llegada, así que incluye la espera en la
+        cola; por defecto es PROCESSING_TIMEOUT. Si vence con la petición ya
+        admitida, su trabajo sigue en segundo plano y libera el lugar al
+        terminar, en lugar de dejar hilos o procesos ocupados sin contarlos.
+        """
+        timeout = settings.PROCESSING_TIMEOUT if timeout is None else timeout
+        started = asyncio.Event()
+
+        async def admitted() -> T:
+            async with self.slot():
+                started.set()
+                return await func(*args)
+
+        task = asyncio.ensure_future(admitted())
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if started.is_set() and not task.done():
+                self._detach(task)
+            else:
+                task.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                raise self.timed_out()
+            raise
+
+    def _detach(self, task: "asyncio.Future[Any]") -> None:
+        """Deja terminar una petición vencida sin esperar su resultado."""
+        self._detached.add(task)
+
+        def done(finished: "asyncio.Future[Any]") -> None:
+            self._detached.discard(finished)
+            if not finished.cancelled() and finished.exception() is not None:
+                logger.warning(f"Petición vencida de {self.name} terminó con error: {finished.exception()}")
+
+        task.add_done_callback(done)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "active": self.active,
+            "waiting": self.waiting,
+            "detached": len(self._detached),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "service_time": self._service_time,
+        }
+
+async def with_deadline(events: AsyncIterator[T], deadline: float, limiter: AdmissionLimiter) -> AsyncIterator[T]:
+    """Reemite los eventos de `events` hasta `deadline` (reloj del event loop).
+
+    Al vencer se cierra el generador y se lanza 504, que el endpoint de
+    streaming convierte en un evento de error.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(events.__anext__(), timeout=max(0.0, deadline - loop.time()))
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise limiter.timed_out()
+            yield event
+    finally:
+        await events.aclose()
+
+# Limitadores de este worker de la API
+transcription_admission = AdmissionLimiter(
+    "transcription",
+    settings.MAX_CONCURRENT_TRANSCRIPTIONS,
+    settings.TRANSCRIPTION_QUEUE_SIZE,
+    settings.ADMISSION_RETRY_AFTER
+)
+analysis_admission = AdmissionLimiter(
+    "analysis",
+    settings.MAX_CONCURRENT_ANALYSES,
+    settings.ANALYSIS_QUEUE_SIZE,
+    settings.ADMISSION_RETRY_AFTER
+)
+
+def get_admission_stats() -> Dict[str, Any]:
+    return {
+        limiter.name: limiter.get_stats()
+        for limiter in (transcription_admission, analysis_admission)
+    }
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import os
+import tempfile
+from typing import Optional
+
+import numpy as np
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Formato que espera Whisper: 16 kHz, mono, PCM de 16 bits
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+class AudioDecodeError(Exception):
+    """Error al decodificar un archivo de audio con ffmpeg."""
+
+async def decode_to_pcm(
+    path: str,
+    dest_path: Optional[str] = None,
+    temp_dir: Optional[str] = None
+) -> str:
+    """Decodifica cualquier formato soportado por ffmpeg a PCM crudo en disco.
+
+    La salida (s16le, mono, 16 kHz) se escribe directamente en un archivo para
+    que la memoria del proceso no dependa de la duración de la grabación. Sin
+    `dest_path` se crea un temporal en `temp_dir` (p. ej. /dev/shm).
+    """
+    if dest_path is None:
+        fd, dest_path = tempfile.mkstemp(suffix=".pcm", dir=temp_dir)
+        os.close(fd)
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-nostdin", "-v", "error", "-y",
+            "-i", path,
+            "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ac", "1", "-ar", str(SAMPLE_RATE),
+            dest_path,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise AudioDecodeError(stderr.decode(errors="replace").strip() or "ffmpeg falló")
+    except (OSError, AudioDecodeError) as e:
+        try:
+            os.unlink(dest_path)
+        except OSError:
+            pass
+        if isinstance(e, AudioDecodeError):
+            raise
+        raise AudioDecodeError(f"No se pudo ejecutar ffmpeg: {str(e)}")
+    return dest_path
+
+def load_pcm(pcm_path: str) -> np.ndarray:
+    """Mapea en memoria un archivo PCM sin copiarlo."""
+    if os.path.getsize(pcm_path) == 0:
+        return np.zeros(0, dtype=np.int16)
+    return np.memmap(pcm_path, dtype=np.int16, mode="r")
+
+def pcm_slice(pcm: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Convierte un tramo de muestras int16 a float32 normalizado para Whisper."""
+    return np.asarray(pcm[start:end], dtype=np.float32) / 32768.0
+
+def pcm_duration(pcm: np.ndarray) -> float:
+    """Duración en segundos de un buffer PCM."""
+    return len(pcm) / SAMPLE_RATE
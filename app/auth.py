@@ -1,14 +1,24 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional
 from fastapi import Depends, HTTPException, status, Response, Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt, ExpiredSignatureError
 from passlib.context import CryptContext
+from sqlalchemy import DateTime, event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import json
 import logging
+import threading
+import time
 
+import redis
+
+from . import metrics
 from .config import settings
-from .database import get_db
+from .database import get_async_db
 from .models import User, TokenData
 
 # Configuración de logging
@@ -18,10 +28,178 @@
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
+class PrincipalCache:
+    """Caché de usuarios autenticados indexada por el sujeto del token.
+
+    Evita consultar la base de datos en cada petición autenticada. Guarda las
+    columnas del usuario (sin el hash de la contraseña) en Redis si está
+    configurado o, si no, en un LRU local con TTL corto. Con Redis no se usa
+    el LRU local: una invalidación en Redis la ven todos los workers en la
+    siguiente petición. Sin Redis, las modificaciones hechas con el ORM solo
+    invalidan la caché del proceso que las hace y los demás workers pueden
+    servir la versión anterior hasta AUTH_CACHE_TTL segundos; lo mismo vale
+    para los cambios por SQL directo en ambos modos.
+    """
+
+    EXCLUDED_COLUMNS = ("hashed_password",)
+
+    def __init__(self, ttl: int, max_entries: int, redis_client=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.redis_client = redis_client
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0, "errors": 0}
+
+    @staticmethod
+    def _redis_key(subject: str) -> str:
+        return f"auth:user:{subject}"
+
+    def _serialize(self, user: User) -> Dict[str, Any]:
+        data = {}
+        for column in User.__table__.columns:
+            if column.key in self.EXCLUDED_COLUMNS:
+                continue
+            value = getattr(user, column.key)
+            data[column.key] = value.isoformat() if isinstance(value, datetime) else value
+        return data
+
+    @staticmethod
+    def _deserialize(data: Dict[str, Any]) -> User:
+        values = dict(data)
+        for column in User.__table__.columns:
+            if isinstance(column.type, DateTime) and isinstance(values.get(column.key), str):
+                values[column.key] = datetime.fromisoformat(values[column.key])
+        # Instancia nueva por petición: los handlers no comparten objetos
+        return User(**values)
+
+    def get(self, subject: str) -> Optional[User]:
+        if self.ttl <= 0:
+            return None
+        if self.redis_client is None:
+            now = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(subject)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(subject)
+                    self.stats["hits"] += 1
+                    metrics.cache_result("auth", "local_hit")
+                    return self._deserialize(entry[1])
+        else:
+            try:
+                raw = self.redis_client.get(self._redis_key(subject))
+            except Exception as e:
+                logger.error(f"Error al leer usuario de Redis: {str(e)}")
+                raw = None
+                with self._lock:
+                    self.stats["errors"] += 1
+            if raw is not None:
+                data = json.loads(raw)
+                with self._lock:
+                    self.stats["redis_hits"] += 1
+                metrics.cache_result("auth", "redis_hit")
+                return self._deserialize(data)
+
+        with self._lock:
+            self.stats["misses"] += 1
+        metrics.cache_result("auth", "miss")
+        return None
+
+    def _store_local(self, subject: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[subject] = (time.monotonic() + self.ttl, data)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set(self, subject: str, user: User) -> None:
+        if self.ttl <= 0:
+            return
+        data = self._serialize(user)
+        if self.redis_client is None:
+            self._store_local(subject, data)
+        else:
+            try:
+                self.redis_client.setex(self._redis_key(subject), self.ttl, json.dumps(data))
+            except Exception as e:
+                logger.error(f"Error al guardar usuario en Redis: {str(e)}")
+                with self._lock:
+                    self.stats["errors"] += 1
+
+    def invalidate(self, subject: Optional[str]) -> None:
+        if not subject:
+            return
+        with self._lock:
+            self._entries.pop(subject, None)
+            self.stats["invalidations"] += 1
+        if self.redis_client is not None:
+            try:
+                self.redis_client.delete(self._redis_key(subject))
+            except Exception as e:
+                logger.error(f"Error al invalidar usuario en Redis: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.stats["hits"] + self.stats["redis_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_ratio": hits / lookups if lookups else 0.0
+            }
+
+_auth_redis = None
+if settings.AUTH_CACHE_REDIS and settings.REDIS_HOST:
+    try:
+        _auth_redis = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            password=settings.REDIS_PASSWORD,
+            db=settings.REDIS_DB,
+            decode_responses=True,
+            socket_timeout=0.5
+        )
+    except Exception as e:
+        logger.error(f"Error al conectar con Redis: {str(e)}")
+
+principal_cache = PrincipalCache(
+    ttl=settings.AUTH_CACHE_TTL,
+    max_entries=settings.AUTH_CACHE_MAX_ENTRIES,
+    redis_client=_auth_redis
+)
+
+def _pending_invalidations(target: User) -> set:
+    session = inspect(target).session
+    return session.info.setdefault("auth_cache_invalidate", set()) if session is not None else set()
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target: User) -> None:
+    """Invalida el usuario modificado, también con su email anterior."""
+    subjects = {target.email, *inspect(target).attrs.email.history.deleted}
+    for subject in subjects:
+        principal_cache.invalidate(subject)
+    # Repetir tras el commit: otra petición pudo cachear la versión anterior
+    _pending_invalidations(target).update(subjects)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    for subject in session.info.pop("auth_cache_invalidate", ()):
+        principal_cache.invalidate(subject)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica si la contraseña coincide con el hash."""
     return pwd_context.verify(plain_password, hashed_password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verifica la contraseña en el threadpool: bcrypt es costoso en CPU."""
+    return await run_in_threadpool(verify_password, plain_password, hashed_password)
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    """Busca un usuario por email."""
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
+
 def get_password_hash(password: str) -> str:
     """Genera un hash de la contraseña."""
     return pwd_context.hash(password)
@@ -58,7 +236,7 @@ async def get_token_from_cookie(request: Request) -> Optional[str]:
 
 async def get_current_user(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Obtiene el usuario actual basado en el token JWT de la cookie."""
     credentials_exception = HTTPException(
@@ -90,7 +268,11 @@ async def get_current_user(
         logger.error(f"Error al decodificar token: {str(e)}")
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == token_data.email).first()
+    user = principal_cache.get(token_data.email)
+    if user is None:
+        user = await get_user_by_email(db, token_data.email)
+        if user is not None:
+            principal_cache.set(token_data.email, user)
     if user is None:
         logger.warning(f"Usuario no encontrado: {email}")
         raise credentials_exception
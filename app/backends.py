@@ -0,0 +1,89 @@
+import logging
+import os
+from typing import Any
+
+from transformers import AutoTokenizer, pipeline
+
+from .config import settings
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Backends de inferencia soportados para los pipelines de análisis
+BACKENDS = ("pytorch", "pytorch_int8", "onnx")
+
+# Modelos de análisis disponibles: tarea del pipeline e id del modelo
+ANALYSIS_MODELS = {
+    'sentiment': ('text-classification', 'nlptown/bert-base-multilingual-uncased-sentiment'),
+    'summarizer': ('summarization', 'facebook/bart-large-cnn'),
+    'emotion': ('text-classification', 'SamLowe/roberta-base-go_emotions'),
+    'zero_shot': ('zero-shot-classification', 'facebook/bart-large-mnli'),
+}
+
+def backend_for(model_name: str) -> str:
+    """Backend configurado para un modelo (MODEL_BACKENDS o MODEL_BACKEND)."""
+    backend = settings.MODEL_BACKENDS.get(model_name, settings.MODEL_BACKEND)
+    if backend not in BACKENDS:
+        logger.warning(f"Backend desconocido {backend} para {model_name}, se usa pytorch")
+        return "pytorch"
+    return backend
+
+def onnx_artifact_dir(model_name: str) -> str:
+    """Directorio de los artefactos ONNX exportados de un modelo."""
+    return os.path.join(settings.TRANSFORMERS_CACHE, "onnx", model_name)
+
+def ort_model_class(task: str):
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTModelForSequenceClassification
+
+    if task == "summarization":
+        return ORTModelForSeq2SeqLM
+    return ORTModelForSequenceClassification
+
+def _pytorch_pipeline(task: str, model_id: str, quantize: bool) -> Any:
+    model_pipeline = pipeline(
+        task,
+        model=model_id,
+        device=settings.MODEL_DEVICE,
+        batch_size=settings.MODEL_BATCH_SIZE,
+        model_kwargs={"low_cpu_mem_usage": True}
+    )
+    if quantize:
+        import torch
+
+        # Cuantización dinámica int8 de las capas lineales (solo CPU)
+        model_pipeline.model = torch.quantization.quantize_dynamic(
+            model_pipeline.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return model_pipeline
+
+def _onnx_pipeline(model_name: str, task: str) -> Any:
+    artifact_dir = onnx_artifact_dir(model_name)
+    if not os.path.isdir(artifact_dir):
+        raise FileNotFoundError(
+            f"No hay artefactos ONNX en {artifact_dir}; ejecutar "
+            f"'python -m app.export_models --models {model_name}'"
+        )
+    model = ort_model_class(task).from_pretrained(artifact_dir)
+    tokenizer = AutoTokenizer.from_pretrained(artifact_dir)
+    return pipeline(
+        task,
+        model=model,
+        tokenizer=tokenizer,
+        batch_size=settings.MODEL_BATCH_SIZE
+    )
+
+def load_pipeline(model_name: str, task: str, model_id: str, backend: str) -> Any:
+    """Construye el pipeline de un modelo con el backend indicado.
+
+    Si el backend ONNX no está disponible (optimum no instalado o modelo sin
+    exportar) se lanza el error en lugar de usar PyTorch: la versión de las
+    tareas y la caché se calculan con el backend configurado.
+    """
+    if backend == "onnx":
+        try:
+            return _onnx_pipeline(model_name, task)
+        except ImportError as e:
+            raise RuntimeError(
+                f"Backend ONNX configurado para {model_name} sin optimum[onnxruntime] instalado"
+            ) from e
+    return _pytorch_pipeline(task, model_id, quantize=backend == "pytorch_int8")
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """Agrupa peticiones concurrentes para ejecutar un pipeline una sola vez.
+
+    Cada `submit` encola un elemento y espera su resultado. Un bucle de fondo
+    junta hasta `max_batch_size` elementos o espera como máximo `max_wait_ms`
+    desde el primero, ejecuta `process_batch` sobre la lista en `executor` y
+    reparte los resultados (en el mismo orden) a quienes los esperaban.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        process_batch: Callable[[List[Any]], List[Any]],
+        executor: Optional[Executor] = None,
+        max_batch_size: int = 16,
+        max_wait_ms: int = 10
+    ):
+        self.name = name
+        self.process_batch = process_batch
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"batches": 0, "items": 0, "max_batch": 0, "retried": 0}
+
+    def _ensure_running(self) -> asyncio.Queue:
+        # La cola y la tarea pertenecen al event loop en el que se crean
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+        return self._queue
+
+    async def submit(self, item: Any) -> Any:
+        """Encola un elemento y devuelve su resultado cuando el lote termina."""
+        queue = self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((item, future))
+        return await future
+
+    async def submit_many(self, items: List[Any]) -> List[Any]:
+        """Encola varios elementos a la vez; pueden compartir lote con otros."""
+        return list(await asyncio.gather(*(self.submit(item) for item in items)))
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    @staticmethod
+    def _settle(future: asyncio.Future, result: Any = None, exception: Optional[BaseException] = None) -> None:
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    async def _run_single(self, loop: asyncio.AbstractEventLoop, item: Any, future: asyncio.Future) -> None:
+        """Procesa un elemento en un lote propio y resuelve su futuro."""
+        try:
+            results = await loop.run_in_executor(self.executor, self.process_batch, [item])
+            if len(results) != 1:
+                raise RuntimeError(f"El lote de {self.name} devolvió {len(results)} resultados para 1 elemento")
+        except Exception as e:
+            logger.error(f"Error al procesar elemento de {self.name}: {str(e)}")
+            self._settle(future, exception=e)
+            return
+        self._settle(future, results[0])
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Ignorar elementos cuyos solicitantes ya cancelaron la espera
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            metrics.QUEUE_DEPTH.labels(f"batch:{self.name}").set(self._queue.qsize())
+            metrics.BATCH_SIZE.labels(self.name).observe(len(items))
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self.executor, self.process_batch, items)
+                metrics.observe("pipeline", time.perf_counter() - start, model=self.name)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"El lote de {self.name} devolvió {len(results)} resultados para {len(items)} elementos"
+                    )
+            except Exception as e:
+                if len(batch) == 1:
+                    logger.error(f"Error al procesar lote de {self.name}: {str(e)}")
+                    self._settle(batch[0][1], exception=e)
+                    continue
+                # Un elemento defectuoso no debe hacer fallar a los demás: se
+                # reintenta cada uno por separado y solo falla el que lo cause
+                logger.warning(
+                    f"Error al procesar lote de {self.name} ({len(batch)} elementos), "
+                    f"se reintenta uno por uno: {str(e)}"
+                )
+                self.stats["retried"] += 1
+                await asyncio.gather(*(self._run_single(loop, item, future) for item, future in batch))
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["items"] += len(items)
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(items))
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "avg_batch": self.stats["items"] / batches if batches else 0.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0
+        }
@@ -0,0 +1,498 @@
+"""Benchmark reproducible de los pipelines de transcripción y análisis.
+
+Uso:
+    python -m app.benchmark transcribe --audio-seconds 120 --requests 20 --concurrency 4
+    python -m app.benchmark analyze --words 1500 --requests 200 --concurrency 16
+    python -m app.benchmark http --requests 20 --output bench.json
+
+Genera audio sintético (ráfagas armónicas con forma de sílabas separadas por
+silencios) y transcripciones sintéticas a partir de una semilla, ejecuta
+`transcribe_audio` / `analyze_text` en el propio proceso o el camino HTTP
+completo con un cliente ASGI, y emite un reporte JSON con rendimiento,
+latencias p50/p95/p99, pico de RSS y uso de CPU.
+
+Con `--models stub` (por defecto) Whisper y los pipelines se sustituyen por
+modelos de latencia configurable, de modo que se mide el overhead del
+pipeline (decodificación, VAD, chunks, micro-batching, caché, HTTP). Con
+`--models real` se usan los modelos configurados; para una ejecución rápida,
+p. ej. `WHISPER_MODEL=tiny`.
+
+Las cachés de transcripciones y análisis se desactivan salvo con `--cache`,
+para que repetir un benchmark con la misma semilla mida lo mismo.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+# Vocabulario de las transcripciones sintéticas: relleno de llamada más
+# algunas palabras clave de categoría para ejercitar la cascada
+FILLER_WORDS = (
+    "buenos dias le habla su asesor en que puedo ayudarle si claro entiendo "
+    "me comenta el numero de cliente un momento por favor estoy revisando su "
+    "caso ya veo perfecto muchas gracias por la espera le confirmo que queda "
+    "registrado algo mas en lo que pueda ayudarle que tenga un buen dia"
+).split()
+TOPIC_WORDS = (
+    "factura consulta saldo plan promocion precio internet router conexion "
+    "falla reclamo cargo devolucion reembolso tecnico servicio"
+).split()
+
+def synth_audio(
+    path: str,
+    seconds: float,
+    speech_ratio: float = 0.7,
+    seed: int = 0
+) -> str:
+    """Escribe un WAV sintético (16 kHz, mono, 16 bits) de `seconds` segundos.
+
+    Alterna enunciados de 1-6 s, formados por sílabas de 120-350 ms con una
+    fundamental de 90-240 Hz y sus armónicos, con silencios de ruido débil.
+    `speech_ratio` fija la proporción aproximada de voz.
+    """
+    rng = np.random.default_rng(seed)
+    speech_ratio = min(max(speech_ratio, 0.05), 1.0)
+    total = int(seconds * SAMPLE_RATE)
+    written = 0
+    with wave.open(path, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLE_RATE)
+
+        def write(samples: np.ndarray) -> None:
+            nonlocal written
+            samples = samples[:total - written]
+            out.writeframes((np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes())
+            written += len(samples)
+
+        while written < total:
+            utterance = rng.uniform(1.0, 6.0)
+            parts = []
+            elapsed = 0.0
+            while elapsed < utterance:
+                length = rng.uniform(0.12, 0.35)
+                t = np.arange(int(length * SAMPLE_RATE)) / SAMPLE_RATE
+                f0 = rng.uniform(90, 240) * (1 + 0.05 * np.sin(2 * np.pi * 3 * t))
+                phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+                voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+                envelope = np.sin(np.pi * t / length) ** 2
+                parts.append(0.3 * voiced * envelope)
+                elapsed += length
+            write(np.concatenate(parts))
+
+            pause = utterance * (1 - speech_ratio) / speech_ratio * rng.uniform(0.5, 1.5)
+            write(rng.normal(0, 0.001, int(pause * SAMPLE_RATE)))
+    return path
+
+def synth_transcript(words: int, seed: int = 0, topic_ratio: float = 0.05) -> str:
+    """Transcripción sintética de `words` palabras en frases de 6-20 palabras."""
+    rng = random.Random(seed)
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, rng.randint(6, 20))
+        sentence = [
+            rng.choice(TOPIC_WORDS if rng.random() < topic_ratio else FILLER_WORDS)
+            for _ in range(length)
+        ]
+        sentences.append(" ".join(sentence).capitalize() + ".")
+        remaining -= length
+    return " ".join(sentences)
+
+class StubWhisper:
+    """Sustituto de WhisperModel: tarda `rtf` segundos por segundo de audio."""
+
+    def __init__(self, rtf: float, seed: int = 0):
+        self.rtf = rtf
+        self.seed = seed
+
+    def transcribe(self, audio: np.ndarray, beam_size: int = 5, **kwargs):
+        seconds = len(audio) / SAMPLE_RATE
+        time.sleep(seconds * self.rtf)
+        rng = random.Random(self.seed + len(audio))
+        segments = []
+        start = 0.0
+        while start < seconds:
+            end = min(seconds, start + rng.uniform(2.0, 6.0))
+            text = " ".join(rng.choice(FILLER_WORDS) for _ in range(max(1, int((end - start) * 2.5))))
+            segments.append(SimpleNamespace(start=start, end=end, text=text))
+            start = end
+        return iter(segments), SimpleNamespace(language="es", duration=seconds)
+
+class StubPipeline:
+    """Sustituto de un pipeline de transformers con la forma de salida real.
+
+    Cada llamada tarda `call_ms` más `item_ms` por texto, como un lote.
+    """
+
+    # Sin tokenizador: la división en ventanas se aproxima por palabras
+    tokenizer = None
+
+    def __init__(self, task: str, call_ms: float, item_ms: float):
+        self.task = task
+        self.call_ms = call_ms
+        self.item_ms = item_ms
+
+    def __call__(self, texts, *args, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        time.sleep((self.call_ms + self.item_ms * len(texts)) / 1000)
+        results = [self._result(text, args) for text in texts]
+        return results[0] if single else results
+
+    def _result(self, text: str, args) -> Any:
+        rng = random.Random(len(text))
+        if self.task == "summarization":
+            return {"summary_text": " ".join(text.split()[:40])}
+        if self.task == "zero-shot-classification":
+            labels = list(args[0]) if args else ["a", "b"]
+            scores = _normalized([rng.random() for _ in labels])
+            ranked = sorted(zip(labels, scores), key=lambda item: item[1], reverse=True)
+            return {"sequence": text, "labels": [l for l, _ in ranked], "scores": [s for _, s in ranked]}
+        labels = [f"{stars} stars" for stars in range(1, 6)]
+        scores = _normalized([rng.random() for _ in labels])
+        return [{"label": label, "score": score} for label, score in zip(labels, scores)]
+
+def _normalized(values: List[float]) -> List[float]:
+    total = sum(values) or 1.0
+    return [value / total for value in values]
+
+def install_stub_models(services, args) -> None:
+    """Registra los modelos sustitutos en el registro del proceso."""
+    services.registry.register("whisper", lambda: StubWhisper(args.stub_rtf, args.seed))
+    for name, (task, _) in services.ANALYSIS_MODELS.items():
+        services.registry.register(
+            name,
+            lambda task=task: StubPipeline(task, args.stub_call_ms, args.stub_item_ms)
+        )
+    # Descartar modelos reales precargados al importar
+    for name in services.registry.loaded():
+        services.registry.unload(name)
+
+class ResourceMonitor:
+    """Muestrea el RSS del proceso y mide el tiempo de CPU de un intervalo."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self) -> None:
+        from .registry import get_process_rss
+
+        while not self._stop.is_set():
+            self.peak_rss = max(self.peak_rss, get_process_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "ResourceMonitor":
+        self._times = os.times()
+        self._wall = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        times = os.times()
+        self.wall_seconds = time.perf_counter() - self._wall
+        self.cpu_seconds = (times.user - self._times.user) + (times.system - self._times.system)
+
+    def report(self) -> Dict[str, Any]:
+        cores = os.cpu_count() or 1
+        utilisation = self.cpu_seconds / self.wall_seconds if self.wall_seconds else 0.0
+        return {
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            # 1.0 = un núcleo completo; se normaliza también por núcleos
+            "cpu_utilisation": utilisation,
+            "cpu_utilisation_per_core": utilisation / cores,
+            "peak_rss_bytes": self.peak_rss,
+        }
+
+def latency_summary(latencies: List[float]) -> Dict[str, Optional[float]]:
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    values = np.asarray(latencies)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "mean": float(values.mean()),
+        "max": float(values.max()),
+    }
+
+async def run_load(
+    call: Callable[[int], Any],
+    requests: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    """Ejecuta `requests` llamadas `call(i)` con `concurrency` en vuelo.
+
+    `call` devuelve la cantidad de trabajo procesada (segundos de audio o
+    palabras) para calcular el rendimiento.
+    """
+    latencies: List[float] = []
+    errors: List[str] = []
+    work = 0.0
+    counter = iter(range(requests))
+
+    async def client() -> None:
+        nonlocal work
+        for index in counter:
+            start = time.perf_counter()
+            try:
+                work += await call(index) or 0.0
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(getattr(e, "detail", None) or str(e))
+
+    with ResourceMonitor() as monitor:
+        await asyncio.gather(*(client() for _ in range(max(1, concurrency))))
+
+    resources = monitor.report()
+    wall = resources["wall_seconds"] or 1.0
+    return {
+        "requests": requests,
+        "completed": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "throughput_rps": len(latencies) / wall,
+        "work": work,
+        "work_per_second": work / wall,
+        "latency_seconds": latency_summary(latencies),
+        **resources,
+    }
+
+def audio_files(args, workdir: str) -> List[str]:
+    # Un archivo distinto por petición (hasta --distinct-audio) para no
+    # medir la caché de transcripciones por contenido
+    distinct = max(1, min(args.requests, args.distinct_audio))
+    paths = []
+    for index in range(distinct):
+        path = os.path.join(workdir, f"bench_{args.seed}_{index}.wav")
+        synth_audio(path, args.audio_seconds, args.speech_ratio, args.seed + index)
+        paths.append(path)
+    return paths
+
+async def bench_transcribe(args, services, workdir: str) -> Dict[str, Any]:
+    from fastapi import UploadFile
+    from starlette.datastructures import Headers
+
+    paths = audio_files(args, workdir)
+
+    async def call(index: int) -> float:
+        path = paths[index % len(paths)]
+        with open(path, "rb") as source:
+            upload = UploadFile(
+                source,
+                filename=os.path.basename(path),
+                headers=Headers({"content-type": "audio/wav"})
+            )
+            transcription = await services.transcribe_audio(upload)
+        return transcription.get("duration") or args.audio_seconds
+
+    for index in range(args.warmup):
+        await call(index)
+    result = await run_load(call, args.requests, args.concurrency)
+    result["work_unit"] = "audio_seconds"
+    return result
+
+async def bench_analyze(args, services, workdir: str) -> Dict[str, Any]:
+    texts = [synth_transcript(args.words, args.seed + index) for index in range(args.requests + args.warmup)]
+    tasks = args.tasks.split(",") if args.tasks else None
+
+    async def call(index: int) -> float:
+        await services.analyze_text(texts[index], tasks)
+        return float(args.words)
+
+    for index in range(args.warmup):
+        await call(args.requests + index)
+    result = await run_load(call, args.requests, args.concurrency)
+    result["work_unit"] = "words"
+    return result
+
+def asgi_app(args):
+    """La aplicación FastAPI con un usuario fijo y, salvo `--persist`, sin
+    guardar los análisis en la base de datos."""
+    from . import main
+    from .auth import get_current_user
+    from .database import get_db
+
+    user = SimpleNamespace(id=args.user_id, email="benchmark@localhost", is_admin=False)
+    main.app.dependency_overrides[get_current_user] = lambda: user
+    if not args.persist:
+        async def skip_save(*_args, **_kwargs) -> int:
+            return 0
+
+        main.app.dependency_overrides[get_db] = lambda: None
+        main.save_analysis = skip_save
+    return main.app
+
+async def bench_http(args, services, workdir: str) -> Dict[str, Any]:
+    """Transcripción y análisis por HTTP, como lo haría el frontend."""
+    import httpx
+
+    app = asgi_app(args)
+    paths = audio_files(args, workdir)
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            async def call(index: int) -> float:
+                path = paths[index % len(paths)]
+                with open(path, "rb") as source:
+                    response = await client.post(
+                        "/api/transcribe/",
+                        files={"file": (os.path.basename(path), source, "audio/wav")}
+                    )
+                response.raise_for_status()
+                text = response.json()["text"] or synth_transcript(args.words, args.seed + index)
+                response = await client.post(
+                    "/api/analyze/",
+                    data={"text": text, "filename": os.path.basename(path)}
+                )
+                response.raise_for_status()
+                return float(args.audio_seconds)
+
+            for index in range(args.warmup):
+                await call(index)
+            result = await run_load(call, args.requests, args.concurrency)
+    finally:
+        app.dependency_overrides.clear()
+    result["work_unit"] = "audio_seconds"
+    return result
+
+SCENARIOS = {
+    "transcribe": bench_transcribe,
+    "analyze": bench_analyze,
+    "http": bench_http,
+}
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _settings_snapshot() -> Dict[str, Any]:
+    from .config import settings
+
+    keys = (
+        "WHISPER_MODEL", "MODEL_DEVICE", "MODEL_COMPUTE_TYPE", "WHISPER_BEAM_SIZE",
+        "WHISPER_NUM_WORKERS", "WHISPER_CPU_THREADS", "TRANSCRIPTION_CHUNK_SECONDS",
+        "VAD_ENABLED", "MAX_CONCURRENT_ANALYSES", "MODEL_BATCH_SIZE",
+        "ANALYSIS_MAX_BATCH_SIZE", "ANALYSIS_MAX_WAIT_MS", "MODEL_BACKEND",
+        "MODEL_BACKENDS", "LONG_DOCUMENT_MODE", "CASCADE_ENABLED",
+        "TRANSCRIPT_CACHE_ENABLED", "REDIS_HOST",
+    )
+    return {key: getattr(settings, key, None) for key in keys}
+
+def add_input_arguments(parser: argparse.ArgumentParser) -> None:
+    """Opciones de entradas sintéticas y modelos, compartidas con app.loadtest."""
+    parser.add_argument("--models", choices=("stub", "real"), default="stub")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--audio-seconds", type=float, default=60.0)
+    parser.add_argument("--speech-ratio", type=float, default=0.7, help="Proporción de voz del audio")
+    parser.add_argument("--distinct-audio", type=int, default=8, help="Archivos de audio distintos")
+    parser.add_argument("--words", type=int, default=600, help="Palabras por transcripción")
+    parser.add_argument("--tasks", help="Tareas de análisis separadas por comas")
+    parser.add_argument("--stub-rtf", type=float, default=0.05, help="Segundos de Whisper sustituto por segundo de audio")
+    parser.add_argument("--stub-call-ms", type=float, default=10.0, help="Latencia fija por lote de los pipelines sustitutos")
+    parser.add_argument("--stub-item-ms", type=float, default=5.0, help="Latencia por texto de los pipelines sustitutos")
+    parser.add_argument("--cache", action="store_true", help="Mantener las cachés de transcripciones y análisis")
+    parser.add_argument("--persist", action="store_true", help="Guardar los análisis en la base de datos (http)")
+    parser.add_argument("--user-id", type=int, default=1, help="Usuario de las grabaciones guardadas con --persist")
+
+def prepare(args, workdir: str):
+    """Ajusta el entorno, importa los servicios e instala los modelos sustitutos.
+
+    La configuración se lee al importar, así que el entorno se ajusta antes.
+    """
+    os.environ.setdefault("UPLOAD_DIR", os.path.join(workdir, "uploads"))
+    os.environ["MODEL_SERVER_SOCKET"] = ""
+    if args.models == "stub":
+        os.environ["MODEL_PRELOAD"] = "[]"
+    if not args.cache:
+        os.environ["TRANSCRIPT_CACHE_ENABLED"] = "false"
+        os.environ["REDIS_HOST"] = ""
+        os.environ["ANALYSIS_CACHE_MAX_BYTES"] = "0"
+
+    from .config import settings
+
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT, stream=sys.stderr)
+
+    from . import services
+
+    if args.models == "stub":
+        install_stub_models(services, args)
+    return services
+
+def environment_report(include_settings: bool = True) -> Dict[str, Any]:
+    return {
+        "revision": _git_revision(),
+        "settings": _settings_snapshot() if include_settings else None,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+    }
+
+def write_report(report: Dict[str, Any], output: Optional[str]) -> None:
+    content = json.dumps(report, indent=2, ensure_ascii=False, default=str)
+    if output:
+        with open(output, "w") as destination:
+            destination.write(content + "\n")
+        logger.info(f"Reporte guardado en {output}")
+    else:
+        sys.stdout.write(content + "\n")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de transcripción y análisis")
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=1, help="Peticiones previas sin medir")
+    parser.add_argument("--output", help="Archivo del reporte JSON (por defecto stdout)")
+    add_input_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="auditoria_bench_")
+    services = prepare(args, workdir)
+
+    logger.info(f"Benchmark {args.scenario} ({args.models}) en {workdir}")
+    results = asyncio.run(SCENARIOS[args.scenario](args, services, workdir))
+
+    write_report({
+        "scenario": args.scenario,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "parameters": vars(args),
+        **environment_report(),
+        "results": results,
+    }, args.output)
+
+if __name__ == "__main__":
+    main()
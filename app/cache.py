@@ -0,0 +1,171 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from . import metrics
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Límite de fallos recordados antes de purgar los expirados
+_MAX_NEGATIVE_ENTRIES = 10000
+
+def normalize_text(text: str) -> str:
+    """Normaliza Unicode y espacios para que textos equivalentes compartan clave."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+class AnalysisCache:
+    """Caché de análisis en dos niveles: LRU en proceso limitado por bytes y Redis.
+
+    Las claves son un hash SHA-256 del texto normalizado junto con la firma de
+    versión de los modelos y parámetros, de modo que al cambiar un modelo las
+    entradas anteriores dejan de usarse. Los valores se guardan como JSON
+    comprimido con zlib. Los fallos de Redis se recuerdan solo durante
+    `negative_ttl` segundos para no consultar Redis repetidamente por el mismo
+    texto sin ocultar entradas que se escriban después.
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        signature: str = "",
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl: int = 1800,
+        negative_ttl: int = 5,
+        prefix: str = "analysis"
+    ):
+        self.redis_client = redis_client
+        self.signature = signature
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.prefix = prefix
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._negative: Dict[str, float] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "negative_hits": 0,
+            "evictions": 0,
+            "errors": 0
+        }
+
+    def key(self, text: str, variant: str = "") -> str:
+        digest = hashlib.sha256(
+            f"{self.signature}\x00{variant}\x00{normalize_text(text)}".encode("utf-8")
+        ).hexdigest()
+        return f"{self.prefix}:{digest}"
+
+    @staticmethod
+    def _encode(value: Dict[str, Any]) -> bytes:
+        return zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+    @staticmethod
+    def _decode(data: bytes) -> Dict[str, Any]:
+        return json.loads(zlib.decompress(data).decode("utf-8"))
+
+    def _store_local(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = data
+            self._bytes += len(data)
+            self._negative.pop(key, None)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.stats["evictions"] += 1
+
+    def get(self, text: str, variant: str = "") -> Optional[Dict[str, Any]]:
+        """Obtiene un análisis de la caché local o de Redis.
+
+        `variant` distingue análisis del mismo texto con distinto contenido,
+        p. ej. perfiles que calculan tareas diferentes.
+        """
+        key = self.key(text, variant)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.stats["local_hits"] += 1
+                metrics.cache_result("analysis", "local_hit")
+            else:
+                expires = self._negative.get(key)
+                if expires is not None:
+                    if expires > time.monotonic():
+                        self.stats["negative_hits"] += 1
+                        self.stats["misses"] += 1
+                        metrics.cache_result("analysis", "miss")
+                        return None
+                    del self._negative[key]
+        if data is not None:
+            return self._decode(data)
+
+        if self.redis_client is not None:
+            try:
+                data = self.redis_client.get(key)
+            except Exception as e:
+                logger.error(f"Error al obtener de caché: {str(e)}")
+                with self._lock:
+                    self.stats["errors"] += 1
+                data = None
+            if data is not None:
+                try:
+                    value = self._decode(data)
+                except (zlib.error, ValueError) as e:
+                    logger.warning(f"Entrada de caché corrupta {key}: {str(e)}")
+                else:
+                    self._store_local(key, data)
+                    with self._lock:
+                        self.stats["redis_hits"] += 1
+                    metrics.cache_result("analysis", "redis_hit")
+                    return value
+
+        metrics.cache_result("analysis", "miss")
+        with self._lock:
+            self.stats["misses"] += 1
+            if self.negative_ttl > 0:
+                now = time.monotonic()
+                if len(self._negative) >= _MAX_NEGATIVE_ENTRIES:
+                    self._negative = {
+                        k: expires for k, expires in self._negative.items() if expires > now
+                    }
+                self._negative[key] = now + self.negative_ttl
+        return None
+
+    def set(self, text: str, value: Dict[str, Any], variant: str = "") -> None:
+        """Guarda un análisis en ambos niveles."""
+        key = self.key(text, variant)
+        data = self._encode(value)
+        self._store_local(key, data)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.setex(key, self.ttl, data)
+            except Exception as e:
+                logger.error(f"Error al guardar en caché: {str(e)}")
+                with self._lock:
+                    self.stats["errors"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.stats["local_hits"] + self.stats["redis_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_ratio": hits / lookups if lookups else 0.0
+            }
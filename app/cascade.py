@@ -0,0 +1,103 @@
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+
+# Palabras clave por categoría para la primera etapa de la cascada
+CATEGORY_KEYWORDS: Dict[str, List[str]] = {
+    "atención al cliente": [
+        "consulta", "informacion", "horario", "actualizar mis datos", "cambio de domicilio",
+        "titular", "estado de cuenta", "saldo", "gracias por comunicarse", "en que puedo ayudarle",
+    ],
+    "ventas": [
+        "contratar", "nuevo plan", "promocion", "oferta", "precio", "descuento",
+        "comprar", "cotizacion", "dar de alta", "portabilidad", "financiacion",
+    ],
+    "soporte técnico": [
+        "no funciona", "falla", "mensaje de error", "reiniciar", "router", "modem", "conexion",
+        "senal", "internet", "configurar", "tecnico", "actualizacion", "sin servicio",
+    ],
+    "reclamaciones": [
+        "reclamo", "reclamacion", "queja", "denuncia", "cobro indebido", "cargo indebido",
+        "devolucion", "reembolso", "no reconozco", "estafa", "defensa del consumidor",
+    ],
+}
+
+# Tareas de análisis que puede seleccionar un perfil
+ANALYSIS_TASKS = ("sentiment", "emotion", "summary", "category")
+
+# Clave del resultado y modelo de cada tarea de análisis
+TASK_OUTPUTS = {
+    "sentiment": ("sentiment", "sentiment"),
+    "emotion": ("emotions", "emotion"),
+    "summary": ("summary", "summarizer"),
+    "category": ("categorization", "zero_shot"),
+}
+
+cascade_stats = {"keyword_decisions": 0, "escalations": 0, "short_summaries": 0}
+_stats_lock = threading.Lock()
+
+def count(stat: str) -> None:
+    with _stats_lock:
+        cascade_stats[stat] += 1
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+def category_keywords() -> Dict[str, List[str]]:
+    """Palabras clave efectivas: CASCADE_KEYWORDS reemplaza las de cada categoría."""
+    return {**CATEGORY_KEYWORDS, **settings.CASCADE_KEYWORDS}
+
+def _keywords() -> Dict[str, List[str]]:
+    return {category: [_normalize(word) for word in words] for category, words in category_keywords().items()}
+
+_patterns: Optional[Dict[str, re.Pattern]] = None
+
+def _category_patterns() -> Dict[str, re.Pattern]:
+    global _patterns
+    if _patterns is None:
+        _patterns = {
+            category: re.compile(r"\b(" + "|".join(re.escape(word) for word in words) + r")\b")
+            for category, words in _keywords().items()
+            if words
+        }
+    return _patterns
+
+def classify_keywords(text: str, categories: List[str]) -> Optional[Dict[str, Any]]:
+    """Clasificación rápida por palabras clave.
+
+    Devuelve la categoría si hay al menos CASCADE_MIN_HITS coincidencias y la
+    proporción de la categoría ganadora supera CASCADE_CONFIDENCE_THRESHOLD;
+    en otro caso None, y el texto debe escalar al modelo zero-shot.
+    """
+    normalized = _normalize(text)
+    hits = {
+        category: len(pattern.findall(normalized))
+        for category, pattern in _category_patterns().items()
+        if category in categories
+    }
+    total = sum(hits.values())
+    if total < settings.CASCADE_MIN_HITS:
+        return None
+    category = max(hits, key=hits.get)
+    confidence = hits[category] / total
+    if confidence < settings.CASCADE_CONFIDENCE_THRESHOLD:
+        return None
+    return {
+        "category": category,
+        "score": confidence,
+        "scores": {name: hits[name] / total for name in hits},
+        "method": "keywords"
+    }
+
+def resolve_profile(profile: Optional[str] = None) -> List[str]:
+    """Tareas de análisis de un perfil.
+
+    Los perfiles se definen en ANALYSIS_PROFILES; sin perfil se usa "default"
+    y, si no está configurado, se calculan todas las tareas.
+    """
+    tasks = settings.ANALYSIS_PROFILES.get(profile or "default", list(ANALYSIS_TASKS))
+    return [task for task in ANALYSIS_TASKS if task in tasks]
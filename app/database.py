@@ -1,13 +1,40 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
 
+def _pool_options() -> dict:
+    """Parámetros del pool de conexiones comunes a ambos engines."""
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+def async_database_url() -> str:
+    """URL de la base de datos con el driver asyncpg."""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    scheme, rest = settings.DATABASE_URL.split("://", 1)
+    return f"{scheme.split('+')[0]}+asyncpg://{rest}"
+
 # Crear engine de SQLAlchemy
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(settings.DATABASE_URL, **_pool_options())
+
+# Engine asíncrono para los endpoints: no bloquea el event loop
+async_engine = create_async_engine(async_database_url(), **_pool_options())
 
 # Crear sesión
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 
 # Base para los modelos
 Base = declarative_base()
@@ -20,7 +47,12 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Obtiene una sesión asíncrona de base de datos."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_db():
     """Inicializa la base de datos creando todas las tablas."""
     from .models import Base
-    Base.metadata.create_all(bind=engine) 
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
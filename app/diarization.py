@@ -0,0 +1,271 @@
+"""Diarización ligera sobre el PCM ya decodificado para Whisper.
+
+Sin modelos adicionales: cada segmento de Whisper se divide en ventanas de
+DIARIZATION_WINDOW_SECONDS, de cada ventana se extrae una huella espectral
+(media y desviación de coeficientes cepstrales en escala mel, sin el de
+energía para no depender del volumen) y las ventanas se agrupan con k-means.
+El número de hablantes (1..DIARIZATION_MAX_SPEAKERS) se elige por silueta.
+Cada segmento recibe el hablante mayoritario de sus ventanas.
+
+Los hablantes se numeran por orden de aparición y se estima cuál es el
+agente por sus frases habituales ("le habla", "en qué puedo ayudarle"...).
+"""
+import logging
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .audio import SAMPLE_RATE, load_pcm
+from .config import settings
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Análisis espectral: tramas de 25 ms cada 10 ms
+FRAME_LENGTH = 400
+FRAME_HOP = 160
+N_FFT = 512
+N_MELS = 24
+N_CEPS = 13
+# Ventanas más cortas no tienen tramas suficientes para una huella estable
+MIN_WINDOW_SECONDS = 0.5
+# Proporción mínima de ventanas de cada hablante
+MIN_SPEAKER_SHARE = 0.05
+
+# Frases típicas del agente para asignar roles
+AGENT_PHRASES = [
+    "le habla", "mi nombre es", "gracias por comunicarse", "gracias por llamar",
+    "en que puedo ayudarle", "en que le puedo ayudar", "le puedo ayudar en algo mas",
+    "algo mas en lo que", "me confirma", "le confirmo", "aguarde en linea",
+]
+
+ROLE_AGENT = "agente"
+ROLE_CUSTOMER = "cliente"
+
+def _mel_filterbank() -> np.ndarray:
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10 ** (mel / 2595.0) - 1.0)
+
+    mels = np.linspace(hz_to_mel(60.0), hz_to_mel(SAMPLE_RATE / 2 - 200), N_MELS + 2)
+    bins = np.floor((N_FFT + 1) * mel_to_hz(mels) / SAMPLE_RATE).astype(int)
+    bank = np.zeros((N_MELS, N_FFT // 2 + 1))
+    for i in range(N_MELS):
+        left, center, right = bins[i], bins[i + 1], bins[i + 2]
+        if center > left:
+            bank[i, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            bank[i, center:right] = (right - np.arange(center, right)) / (right - center)
+    return bank
+
+_MEL_BANK = _mel_filterbank()
+# DCT-II; se descarta el coeficiente 0 (energía)
+_DCT = np.cos(np.pi / N_MELS * (np.arange(N_MELS) + 0.5)[None, :] * np.arange(1, N_CEPS)[:, None])
+_HAMMING = np.hamming(FRAME_LENGTH)
+
+def window_embedding(samples: np.ndarray) -> Optional[np.ndarray]:
+    """Huella espectral de un tramo de muestras int16, o None si es silencio."""
+    audio = np.asarray(samples, dtype=np.float32) / 32768.0
+    if len(audio) < FRAME_LENGTH:
+        return None
+    count = 1 + (len(audio) - FRAME_LENGTH) // FRAME_HOP
+    frames = np.lib.stride_tricks.as_strided(
+        audio,
+        shape=(count, FRAME_LENGTH),
+        strides=(audio.strides[0] * FRAME_HOP, audio.strides[0])
+    ) * _HAMMING
+    power = np.abs(np.fft.rfft(frames, n=N_FFT)) ** 2
+    energy = power.sum(axis=1)
+    # Solo las tramas con voz: las de menor energía son pausas entre palabras
+    voiced = energy > max(np.percentile(energy, 30), 1e-8)
+    if voiced.sum() < 10:
+        return None
+    log_mel = np.log(power[voiced] @ _MEL_BANK.T + 1e-10)
+    cepstra = log_mel @ _DCT.T
+    return np.concatenate([cepstra.mean(axis=0), cepstra.std(axis=0)])
+
+def _kmeans(points: np.ndarray, k: int, seed: int = 0, iterations: int = 30) -> Tuple[np.ndarray, np.ndarray]:
+    """k-means con inicialización k-means++; devuelve etiquetas y centroides."""
+    rng = np.random.default_rng(seed)
+    centroids = [points[rng.integers(len(points))]]
+    for _ in range(1, k):
+        distances = np.min([((points - c) ** 2).sum(axis=1) for c in centroids], axis=0)
+        total = distances.sum()
+        index = rng.choice(len(points), p=distances / total) if total > 0 else rng.integers(len(points))
+        centroids.append(points[index])
+    centroids = np.array(centroids)
+
+    labels = np.full(len(points), -1)
+    for _ in range(iterations):
+        distances = ((points[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+        if (new_labels == labels).all():
+            break
+        labels = new_labels
+        for cluster in range(k):
+            members = points[labels == cluster]
+            if len(members):
+                centroids[cluster] = members.mean(axis=0)
+    return labels, centroids
+
+def _silhouette(points: np.ndarray, labels: np.ndarray, seed: int = 0, sample: int = 800, block: int = 256) -> float:
+    """Silueta media sobre una muestra de puntos.
+
+    Las distancias se calculan por bloques de filas a partir de la matriz de
+    Gram (|x|² + |y|² - 2·x·y), así que la memoria es block × muestra en
+    lugar de muestra × muestra × dimensiones.
+    """
+    if len(set(labels.tolist())) < 2:
+        return -1.0
+    rng = np.random.default_rng(seed)
+    if len(points) > sample:
+        index = rng.choice(len(points), sample, replace=False)
+        points, labels = points[index], labels[index]
+    clusters, labels = np.unique(labels, return_inverse=True)
+    one_hot = np.eye(len(clusters))[labels]
+    sizes = one_hot.sum(axis=0)
+    norms = (points ** 2).sum(axis=1)
+
+    scores = []
+    for start in range(0, len(points), block):
+        rows = slice(start, start + block)
+        squared = norms[rows, None] + norms[None, :] - 2.0 * points[rows] @ points.T
+        # Suma de distancias de cada punto del bloque a cada grupo
+        sums = np.sqrt(np.maximum(squared, 0.0)) @ one_hot
+        own = labels[rows]
+        count = sizes[own] - 1
+        valid = count > 0
+        a = sums[np.arange(len(own)), own] / np.maximum(count, 1)
+        means = sums / sizes
+        means[np.arange(len(own)), own] = np.inf
+        b = means.min(axis=1)
+        scores.append(((b - a) / np.maximum(np.maximum(a, b), 1e-10))[valid])
+    scores = np.concatenate(scores)
+    return float(scores.mean()) if len(scores) else -1.0
+
+def cluster_speakers(embeddings: np.ndarray, max_speakers: int) -> np.ndarray:
+    """Agrupa las huellas eligiendo el número de hablantes por silueta."""
+    if len(embeddings) < 4 or max_speakers < 2:
+        return np.zeros(len(embeddings), dtype=int)
+    std = embeddings.std(axis=0)
+    points = (embeddings - embeddings.mean(axis=0)) / np.where(std > 0, std, 1.0)
+
+    best_labels = np.zeros(len(points), dtype=int)
+    best_score = settings.DIARIZATION_MIN_SILHOUETTE
+    for k in range(2, min(max_speakers, len(points) // 2) + 1):
+        labels, _ = _kmeans(points, k)
+        # Un grupo con muy pocas ventanas suele ser ruido, no un hablante
+        if np.bincount(labels, minlength=k).min() < MIN_SPEAKER_SHARE * len(points):
+            continue
+        score = _silhouette(points, labels)
+        if score > best_score:
+            best_labels, best_score = labels, score
+    return best_labels
+
+def _windows(start: int, end: int) -> List[Tuple[int, int]]:
+    length = int(settings.DIARIZATION_WINDOW_SECONDS * SAMPLE_RATE)
+    hop = max(1, length // 2)
+    if end - start < MIN_WINDOW_SECONDS * SAMPLE_RATE:
+        return []
+    if end - start <= length:
+        return [(start, end)]
+    return [(offset, min(offset + length, end)) for offset in range(start, end - hop, hop)]
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+_AGENT_PATTERN = re.compile(r"\b(" + "|".join(re.escape(phrase) for phrase in AGENT_PHRASES) + r")\b")
+
+def assign_roles(segments: List[Dict[str, Any]], speakers: int) -> List[str]:
+    """Rol de cada hablante: el agente es quien más usa frases de agente o,
+    sin coincidencias, quien habla primero."""
+    if speakers < 2:
+        return [ROLE_AGENT] if speakers else []
+    hits = [0] * speakers
+    for segment in segments:
+        hits[segment["speaker"]] += len(_AGENT_PATTERN.findall(_normalize(segment["text"])))
+    agent = max(range(speakers), key=lambda speaker: hits[speaker]) if any(hits) else 0
+    return [ROLE_AGENT if speaker == agent else ROLE_CUSTOMER for speaker in range(speakers)]
+
+def diarize(pcm: np.ndarray, segments: List[Dict[str, Any]]) -> Tuple[List[int], Dict[str, Any]]:
+    """Asigna un hablante a cada segmento (tiempos en segundos sobre `pcm`).
+
+    Devuelve la etiqueta de cada segmento y un resumen con arrays por
+    hablante: rol, segundos de habla, turnos y palabras.
+    """
+    owners: List[int] = []
+    embeddings: List[np.ndarray] = []
+    for index, segment in enumerate(segments):
+        start = int(segment["start"] * SAMPLE_RATE)
+        end = min(int(segment["end"] * SAMPLE_RATE), len(pcm))
+        for window_start, window_end in _windows(start, end):
+            embedding = window_embedding(pcm[window_start:window_end])
+            if embedding is not None:
+                owners.append(index)
+                embeddings.append(embedding)
+
+    window_labels = (
+        cluster_speakers(np.array(embeddings), settings.DIARIZATION_MAX_SPEAKERS)
+        if embeddings else np.zeros(0, dtype=int)
+    )
+
+    # Voto por segmento; los segmentos sin ventanas heredan del anterior
+    votes: Dict[int, Dict[int, int]] = {}
+    for owner, label in zip(owners, window_labels.tolist()):
+        votes.setdefault(owner, {})
+        votes[owner][label] = votes[owner].get(label, 0) + 1
+    raw: List[int] = []
+    for index in range(len(segments)):
+        if index in votes:
+            raw.append(max(votes[index], key=votes[index].get))
+        else:
+            raw.append(raw[-1] if raw else 0)
+
+    # Numerar por orden de aparición
+    order: Dict[int, int] = {}
+    for label in raw:
+        order.setdefault(label, len(order))
+    labels = [order[label] for label in raw]
+    speakers = len(order)
+
+    talk_seconds = [0.0] * speakers
+    turns = [0] * speakers
+    words = [0] * speakers
+    previous = None
+    for segment, speaker in zip(segments, labels):
+        talk_seconds[speaker] += max(0.0, segment["end"] - segment["start"])
+        words[speaker] += len(segment["text"].split())
+        if speaker != previous:
+            turns[speaker] += 1
+        previous = speaker
+
+    labelled = [{**segment, "speaker": speaker} for segment, speaker in zip(segments, labels)]
+    summary = {
+        "count": speakers,
+        "roles": assign_roles(labelled, speakers),
+        "talk_seconds": [round(seconds, 2) for seconds in talk_seconds],
+        "turns": turns,
+        "words": words,
+    }
+    logger.info(f"Diarización: {speakers} hablantes en {len(segments)} segmentos ({len(embeddings)} ventanas)")
+    return labels, summary
+
+def diarize_pcm(pcm_path: str, segments: List[Dict[str, Any]]) -> Tuple[List[int], Dict[str, Any]]:
+    """`diarize` sobre un archivo PCM, para ejecutarlo en un pool."""
+    return diarize(load_pcm(pcm_path), segments)
+
+def speaker_texts(transcription: Dict[str, Any]) -> Optional[List[str]]:
+    """Texto de cada hablante, en orden de id, si hay más de uno."""
+    speakers = (transcription.get("speakers") or {}).get("count", 0)
+    if speakers < 2:
+        return None
+    texts: List[List[str]] = [[] for _ in range(speakers)]
+    for segment in transcription.get("segments") or []:
+        if "speaker" in segment:
+            texts[segment["speaker"]].append(segment["text"].strip())
+    return [" ".join(parts) for parts in texts]
@@ -0,0 +1,176 @@
+"""Exporta los modelos de análisis a ONNX y compara backends.
+
+Uso:
+    python -m app.export_models --models sentiment emotion
+    python -m app.export_models --compare --backends pytorch pytorch_int8 onnx
+
+La exportación escribe en TRANSFORMERS_CACHE/onnx/<modelo> el grafo ONNX
+cuantizado con int8 dinámico (requiere optimum[onnxruntime]). La comparación
+ejecuta cada backend sobre textos de ejemplo y reporta latencia y
+concordancia con PyTorch en JSON.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from .backends import ANALYSIS_MODELS, BACKENDS, load_pipeline, onnx_artifact_dir, ort_model_class
+from .config import settings
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Textos de ejemplo para la comparación
+SAMPLE_TEXTS = [
+    "Buenos días, llamo porque la factura de este mes vino con un cargo que no reconozco.",
+    "Muchas gracias por la ayuda, el técnico resolvió el problema de conexión enseguida.",
+    "Quiero contratar el plan familiar con más datos, ¿qué promociones tienen disponibles?",
+    "Es la tercera vez que llamo y nadie me soluciona nada, quiero presentar una reclamación.",
+    "El router se reinicia solo cada pocos minutos desde la actualización de ayer.",
+    "Perfecto, entonces queda agendada la visita para el jueves por la mañana.",
+]
+
+def export_onnx(model_name: str, quantize: bool = True) -> str:
+    """Exporta un modelo a ONNX y opcionalmente lo cuantiza a int8 dinámico."""
+    from optimum.onnxruntime import ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    task, model_id = ANALYSIS_MODELS[model_name]
+    artifact_dir = onnx_artifact_dir(model_name)
+
+    with tempfile.TemporaryDirectory(dir=settings.TRANSFORMERS_CACHE) as export_dir:
+        logger.info(f"Exportando {model_id} a ONNX")
+        model = ort_model_class(task).from_pretrained(model_id, export=True)
+        model.save_pretrained(export_dir)
+        AutoTokenizer.from_pretrained(model_id).save_pretrained(export_dir)
+
+        if quantize:
+            qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            # Los modelos seq2seq exportan varios grafos (encoder, decoder)
+            for onnx_file in glob.glob(os.path.join(export_dir, "*.onnx")):
+                quantizer = ORTQuantizer.from_pretrained(
+                    export_dir, file_name=os.path.basename(onnx_file)
+                )
+                quantizer.quantize(save_dir=export_dir, quantization_config=qconfig)
+                # El modelo cuantizado reemplaza al original con el mismo nombre
+                quantized = onnx_file.replace(".onnx", "_quantized.onnx")
+                os.replace(quantized, onnx_file)
+
+        if os.path.isdir(artifact_dir):
+            shutil.rmtree(artifact_dir)
+        shutil.copytree(export_dir, artifact_dir)
+
+    logger.info(f"Artefactos de {model_name} guardados en {artifact_dir}")
+    return artifact_dir
+
+def _call(model_pipeline, task: str, text: str):
+    if task == "zero-shot-classification":
+        return model_pipeline(text, settings.ANALYSIS_CATEGORIES, truncation=True)
+    if task == "summarization":
+        return model_pipeline(text, max_length=130, min_length=30, do_sample=False, truncation=True)
+    return model_pipeline(text, truncation=True, max_length=settings.MODEL_MAX_LENGTH)
+
+def _prediction(task: str, output) -> str:
+    if task == "zero-shot-classification":
+        return output["labels"][0]
+    if task == "summarization":
+        return output[0]["summary_text"]
+    return output[0]["label"]
+
+def _token_overlap(a: str, b: str) -> float:
+    tokens_a, tokens_b = set(a.lower().split()), set(b.lower().split())
+    if not tokens_a and not tokens_b:
+        return 1.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def compare_backends(model_name: str, backends: List[str], texts: List[str], repeats: int) -> Dict[str, Any]:
+    """Latencia y concordancia con PyTorch de cada backend para un modelo."""
+    task, model_id = ANALYSIS_MODELS[model_name]
+    report: Dict[str, Any] = {}
+    reference: List[str] = []
+    for backend in ["pytorch"] + [b for b in backends if b != "pytorch"]:
+        try:
+            model_pipeline = load_pipeline(model_name, task, model_id, backend)
+        except Exception as e:
+            report[backend] = {"error": str(e)}
+            continue
+
+        # Calentamiento
+        _call(model_pipeline, task, texts[0])
+
+        latencies, predictions = [], []
+        for _ in range(repeats):
+            for text in texts:
+                start = time.perf_counter()
+                output = _call(model_pipeline, task, text)
+                latencies.append((time.perf_counter() - start) * 1000)
+                predictions.append(_prediction(task, output))
+        predictions = predictions[:len(texts)]
+
+        if backend == "pytorch":
+            reference = predictions
+
+        report[backend] = {
+            "p50_ms": round(_percentile(latencies, 50), 2),
+            "p95_ms": round(_percentile(latencies, 95), 2),
+            "mean_ms": round(statistics.mean(latencies), 2),
+        }
+        # Sin la referencia de PyTorch no hay concordancia que medir
+        if reference:
+            if task == "summarization":
+                agreement = statistics.mean(_token_overlap(a, b) for a, b in zip(predictions, reference))
+            else:
+                agreement = sum(a == b for a, b in zip(predictions, reference)) / len(texts)
+            report[backend]["agreement"] = round(agreement, 4)
+        del model_pipeline
+    return report
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Exportación y comparación de backends de inferencia")
+    parser.add_argument("--models", nargs="+", default=list(ANALYSIS_MODELS), choices=list(ANALYSIS_MODELS))
+    parser.add_argument("--no-quantize", action="store_true", help="Exportar ONNX sin cuantizar")
+    parser.add_argument("--compare", action="store_true", help="Comparar backends en lugar de exportar")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--texts", help="Archivo con un texto de ejemplo por línea")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Archivo JSON del reporte (por defecto stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+
+    if not args.compare:
+        for model_name in args.models:
+            export_onnx(model_name, quantize=not args.no_quantize)
+        return
+
+    texts = SAMPLE_TEXTS
+    if args.texts:
+        with open(args.texts, encoding="utf-8") as texts_file:
+            texts = [line.strip() for line in texts_file if line.strip()]
+
+    report = {
+        model_name: compare_backends(model_name, args.backends, texts, args.repeats)
+        for model_name in args.models
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as report_file:
+            report_file.write(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""Hooks de gunicorn (se carga con `-c python:app.gunicorn_conf`)."""
+from app import metrics
+
+def child_exit(server, worker):
+    # Descartar los gauges del worker que terminó
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,220 @@
+"""Ingesta masiva de grabaciones desde el servidor.
+
+Uso:
+    python -m app.ingest /app/uploads/pbx/2024-05-01 --user auditor@empresa.com
+    python -m app.ingest /app/uploads/pbx/volcado.zip --user auditor@empresa.com --wait
+
+Recorre un directorio (o extrae un .zip / .tar.gz) dentro de UPLOAD_DIR y
+encola un trabajo 'completo' por cada audio, creando grabaciones y trabajos
+en transacciones de --chunk-size archivos. Los workers de la cola hacen la
+transcripción y el análisis; con --wait se informa del progreso hasta que
+terminan. El reporte final se imprime en JSON.
+
+Los archivos comprimidos se extraen en UPLOAD_DIR/ingest/<hash del archivo>,
+así que relanzar la ingesta del mismo archivo reutiliza la extracción y no
+vuelve a encolar sus audios. La extracción se elimina cuando ninguno de sus
+trabajos sigue pendiente o en proceso (con --wait, al terminar el lote; sin
+él, al relanzar la ingesta una vez drenada la cola).
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tarfile
+import time
+import uuid
+import zipfile
+from typing import Any, Dict, List, Optional
+
+from .cascade import resolve_profile
+from .config import settings
+from .database import SessionLocal
+from .jobs import enqueue_batch, get_batch_progress
+from .models import Job, User
+from .transcript_store import file_digest
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Extensiones aceptadas, las mismas que admite la API
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a")
+
+def _inside(root: str, path: str) -> bool:
+    root = os.path.realpath(root)
+    return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+def extract_archive(archive: str, dest: str) -> None:
+    """Extrae un .zip o .tar(.gz) ignorando rutas que salgan de `dest`."""
+    os.makedirs(dest, exist_ok=True)
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as source:
+            for member in source.infolist():
+                if not _inside(dest, os.path.join(dest, member.filename)):
+                    logger.warning(f"Entrada ignorada fuera del destino: {member.filename}")
+                    continue
+                source.extract(member, dest)
+        return
+
+    with tarfile.open(archive) as source:
+        members = []
+        for member in source.getmembers():
+            if not (member.isfile() or member.isdir()) or not _inside(dest, os.path.join(dest, member.name)):
+                logger.warning(f"Entrada ignorada: {member.name}")
+                continue
+            members.append(member)
+        source.extractall(dest, members=members)
+
+def extraction_dir(archive: str) -> str:
+    """Directorio de extracción estable para el contenido de `archive`."""
+    return os.path.join(settings.UPLOAD_DIR, "ingest", file_digest(archive)[:32])
+
+def extract_once(archive: str) -> str:
+    """Extrae `archive` salvo que una ingesta anterior ya lo haya hecho."""
+    root = extraction_dir(archive)
+    marker = os.path.join(root, ".extracted")
+    if os.path.exists(marker):
+        logger.info(f"Reutilizando la extracción de {archive} en {root}")
+        return root
+    logger.info(f"Extrayendo {archive} en {root}")
+    extract_archive(archive, root)
+    open(marker, "w").close()
+    return root
+
+def cleanup_extraction(db, root: str, paths: List[str]) -> bool:
+    """Elimina la extracción si ninguno de sus trabajos queda por procesar."""
+    for start in range(0, len(paths), 1000):
+        chunk = paths[start:start + 1000]
+        active = db.query(Job.id).filter(
+            Job.payload["path"].as_string().in_(chunk),
+            Job.status.in_(("pendiente", "procesando"))
+        ).first()
+        if active is not None:
+            return False
+    shutil.rmtree(root, ignore_errors=True)
+    logger.info(f"Extracción eliminada: {root}")
+    return True
+
+def scan_audio(root: str) -> List[str]:
+    """Rutas de los archivos de audio bajo `root`, en orden estable."""
+    paths = []
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.lower().endswith(AUDIO_EXTENSIONS):
+                paths.append(os.path.join(directory, filename))
+    return sorted(paths)
+
+def _already_enqueued(db, paths: List[str]) -> set:
+    """Rutas que ya tienen un trabajo, para poder relanzar la ingesta."""
+    enqueued = set()
+    for start in range(0, len(paths), 1000):
+        chunk = paths[start:start + 1000]
+        rows = db.query(Job.payload["path"].as_string()).filter(
+            Job.payload["path"].as_string().in_(chunk)
+        ).all()
+        enqueued.update(path for path, in rows)
+    return enqueued
+
+def ingest(
+    db,
+    user_id: int,
+    paths: List[str],
+    chunk_size: int = 500,
+    priority: int = 0,
+    tasks: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Encola los archivos en transacciones de `chunk_size` bajo un mismo lote."""
+    batch_id = uuid.uuid4().hex
+    enqueued = 0
+    for start in range(0, len(paths), chunk_size):
+        chunk = paths[start:start + chunk_size]
+        enqueue_batch(
+            db,
+            user_id,
+            [(path, os.path.basename(path)) for path in chunk],
+            priority=priority,
+            tasks=tasks,
+            batch_id=batch_id
+        )
+        enqueued += len(chunk)
+        logger.info(f"Lote {batch_id}: {enqueued}/{len(paths)} archivos encolados")
+    return {"batch_id": batch_id, "enqueued": enqueued}
+
+def wait_for_batch(batch_id: str, interval: float) -> Dict[str, Any]:
+    """Informa del progreso del lote hasta que todos los trabajos terminan."""
+    while True:
+        db = SessionLocal()
+        try:
+            progress = get_batch_progress(db, batch_id)
+        finally:
+            db.close()
+        sys.stderr.write(
+            f"\r{progress['finished']}/{progress['total']} terminados, "
+            f"{progress['by_status'].get('error', 0)} con error, "
+            f"{progress['files_per_minute']:.1f} archivos/min"
+        )
+        sys.stderr.flush()
+        if progress["done"]:
+            sys.stderr.write("\n")
+            return progress
+        time.sleep(interval)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingesta masiva de grabaciones")
+    parser.add_argument("source", help="Directorio o archivo .zip/.tar.gz dentro de UPLOAD_DIR")
+    parser.add_argument("--user", required=True, help="Email del usuario propietario de las grabaciones")
+    parser.add_argument("--priority", type=int, default=0)
+    parser.add_argument("--profile", help="Perfil de análisis (ANALYSIS_PROFILES)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Archivos por transacción")
+    parser.add_argument("--force", action="store_true", help="Encolar también archivos ya ingeridos")
+    parser.add_argument("--wait", action="store_true", help="Esperar a que los workers terminen")
+    parser.add_argument("--interval", type=float, default=5.0, help="Segundos entre reportes de progreso")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+
+    source = os.path.realpath(args.source)
+    if not _inside(settings.UPLOAD_DIR, source) or not os.path.exists(source):
+        parser.error(f"{args.source} no existe o no está dentro de UPLOAD_DIR ({settings.UPLOAD_DIR})")
+
+    archive = os.path.isfile(source)
+    root = extract_once(source) if archive else source
+
+    paths = scan_audio(root)
+    scanned = paths
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == args.user).first()
+        if user is None:
+            parser.error(f"Usuario no encontrado: {args.user}")
+
+        skipped = 0
+        if not args.force:
+            enqueued = _already_enqueued(db, paths)
+            skipped = len(enqueued)
+            paths = [path for path in paths if path not in enqueued]
+
+        tasks = resolve_profile(args.profile)
+        report: Dict[str, Any] = {"source": source, "found": len(paths) + skipped, "skipped": skipped}
+        if not paths:
+            report["enqueued"] = 0
+        else:
+            report.update(ingest(db, user.id, paths, max(1, args.chunk_size), args.priority, tasks))
+    finally:
+        db.close()
+
+    if args.wait and report.get("batch_id"):
+        report["progress"] = wait_for_batch(report["batch_id"], args.interval)
+
+    if archive:
+        db = SessionLocal()
+        try:
+            report["extraction_removed"] = cleanup_extraction(db, root, scanned)
+        finally:
+            db.close()
+
+    sys.stdout.write(json.dumps(report, indent=2, ensure_ascii=False, default=str) + "\n")
+
+if __name__ == "__main__":
+    main()
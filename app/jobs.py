@@ -0,0 +1,407 @@
+import logging
+from datetime import datetime, timedelta
+import uuid
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import or_, and_, func, insert, update
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import Job, Recording
+from .persistence import insert_recordings
+from .stats import record_outcome
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Tipos de trabajo soportados
+JOB_KINDS = ("transcripcion", "analisis", "completo", "reanalisis")
+
+def _set_recording_status(db: Session, recording_id: Optional[int], status: str):
+    """Sincroniza el estado de la grabación con el ciclo de vida del trabajo.
+
+    Devuelve el usuario propietario y la fecha de creación de la grabación.
+    """
+    if recording_id is None:
+        return None
+    recordings = Recording.__table__
+    return db.execute(
+        update(recordings)
+        .where(recordings.c.id == recording_id)
+        .values(status=status)
+        .returning(recordings.c.user_id, recordings.c.created_at)
+    ).first()
+
+def _finish_recording(
+    db: Session,
+    recording_id: Optional[int],
+    status: str,
+    analysis: Optional[Dict[str, Any]] = None,
+    duration: Optional[float] = None
+) -> None:
+    """Marca la grabación con su estado final y la suma a los agregados del
+    día en que se creó. No hace commit."""
+    recording = _set_recording_status(db, recording_id, status)
+    if recording is None:
+        return
+    day = recording.created_at.date() if recording.created_at else None
+    record_outcome(db, recording.user_id, status, day, analysis, duration)
+
+def enqueue_job(
+    db: Session,
+    recording_id: Optional[int],
+    kind: str = "completo",
+    priority: int = 0,
+    payload: Optional[Dict[str, Any]] = None,
+    commit: bool = True
+) -> Job:
+    """Encola un trabajo persistente y marca la grabación como pendiente."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Tipo de trabajo no soportado: {kind}")
+
+    job = Job(
+        recording_id=recording_id,
+        kind=kind,
+        priority=priority,
+        status="pendiente",
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        payload=payload or {},
+        run_after=datetime.now()
+    )
+    db.add(job)
+    _set_recording_status(db, recording_id, "pendiente")
+    if commit:
+        db.commit()
+        db.refresh(job)
+    else:
+        db.flush()
+    return job
+
+def enqueue_batch(
+    db: Session,
+    user_id: int,
+    files: List[Tuple[str, str]],
+    kind: str = "completo",
+    priority: int = 0,
+    tasks: Optional[List[str]] = None,
+    batch_id: Optional[str] = None
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """Crea las grabaciones y los trabajos de un lote en una sola transacción.
+
+    `files` son pares (ruta, nombre original). Cada tabla se escribe con un
+    único INSERT multi-fila con RETURNING en lugar de una transacción por
+    archivo. Devuelve el id del lote y los ids de trabajo y grabación de
+    cada archivo.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Tipo de trabajo no soportado: {kind}")
+    batch_id = batch_id or uuid.uuid4().hex
+
+    try:
+        recording_ids = insert_recordings(db, [
+            {"user_id": user_id, "filename": filename, "status": "pendiente"}
+            for _, filename in files
+        ])
+        now = datetime.now()
+        job_ids = db.execute(
+            insert(Job).returning(Job.id, sort_by_parameter_order=True),
+            [
+                {
+                    "recording_id": recording_id,
+                    "kind": kind,
+                    "priority": priority,
+                    "status": "pendiente",
+                    "attempts": 0,
+                    "max_attempts": settings.JOB_MAX_ATTEMPTS,
+                    "batch_id": batch_id,
+                    "payload": {"path": path, "filename": filename, "tasks": tasks},
+                    "run_after": now,
+                    "created_at": now,
+                    "updated_at": now
+                }
+                for recording_id, (path, filename) in zip(recording_ids, files)
+            ]
+        ).scalars().all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    entries = [
+        {"job_id": job_id, "recording_id": recording_id, "filename": filename}
+        for job_id, recording_id, (_, filename) in zip(job_ids, recording_ids, files)
+    ]
+    return batch_id, entries
+
+def enqueue_reanalysis(
+    db: Session,
+    batches: List[List[int]],
+    batch_id: str,
+    priority: int = 0,
+    tasks: Optional[List[str]] = None
+) -> List[int]:
+    """Encola un trabajo 'reanalisis' por cada grupo de grabaciones en un solo
+    INSERT multi-fila y lo confirma.
+
+    Los trabajos no tienen grabación propia, así que no cambian el estado de
+    las grabaciones mientras se recalculan. Devuelve los ids de trabajo.
+    """
+    if not batches:
+        return []
+    now = datetime.now()
+    try:
+        job_ids = db.execute(
+            insert(Job).returning(Job.id, sort_by_parameter_order=True),
+            [
+                {
+                    "recording_id": None,
+                    "kind": "reanalisis",
+                    "priority": priority,
+                    "status": "pendiente",
+                    "attempts": 0,
+                    "max_attempts": settings.JOB_MAX_ATTEMPTS,
+                    "batch_id": batch_id,
+                    "payload": {"recording_ids": recording_ids, "tasks": tasks},
+                    "run_after": now,
+                    "created_at": now,
+                    "updated_at": now
+                }
+                for recording_ids in batches
+            ]
+        ).scalars().all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return list(job_ids)
+
+def _fail_permanently(db: Session, job_id: int, recording_id: Optional[int], error: str) -> None:
+    """Deja el trabajo y su grabación en 'error' y lo suma a los agregados. No hace commit."""
+    jobs = Job.__table__
+    db.execute(
+        update(jobs)
+        .where(jobs.c.id == job_id)
+        .values(status="error", error=error, locked_at=None)
+    )
+    _finish_recording(db, recording_id, "error")
+    logger.error(f"Trabajo {job_id} falló definitivamente: {error}")
+
+def _expire_exhausted(db: Session, lease_expired: datetime) -> None:
+    """Pasa a 'error' los trabajos con el lease vencido y sin intentos restantes.
+
+    Un trabajo que tira abajo a su worker (OOM, fallo nativo de ffmpeg o
+    Whisper) nunca llega a `fail_job`; sin este corte se reclamaría tras
+    cada JOB_LEASE_TIMEOUT indefinidamente.
+    """
+    exhausted = (
+        db.query(Job.id, Job.recording_id, Job.attempts)
+        .filter(
+            Job.status == "procesando",
+            Job.locked_at < lease_expired,
+            Job.attempts >= Job.max_attempts
+        )
+        .with_for_update(skip_locked=True)
+        .limit(100)
+        .all()
+    )
+    for job_id, recording_id, attempts in exhausted:
+        _fail_permanently(
+            db, job_id, recording_id,
+            f"El worker no terminó el trabajo tras {attempts} intentos (lease vencido)"
+        )
+
+def claim_next_job(db: Session, worker_id: str) -> Optional[Job]:
+    """Reserva el siguiente trabajo disponible según prioridad y antigüedad.
+
+    Usa SELECT ... FOR UPDATE SKIP LOCKED para que varios workers puedan
+    drenar la cola en paralelo sin tomar el mismo trabajo. Los trabajos que
+    quedaron en 'procesando' más allá de JOB_LEASE_TIMEOUT (worker caído)
+    se vuelven a reclamar mientras les queden intentos; los demás quedan en
+    'error'.
+    """
+    now = datetime.now()
+    lease_expired = now - timedelta(seconds=settings.JOB_LEASE_TIMEOUT)
+    _expire_exhausted(db, lease_expired)
+
+    job = (
+        db.query(Job)
+        .filter(
+            or_(
+                and_(Job.status == "pendiente", Job.run_after <= now),
+                and_(
+                    Job.status == "procesando",
+                    Job.locked_at < lease_expired,
+                    Job.attempts < Job.max_attempts
+                )
+            )
+        )
+        .order_by(Job.priority.desc(), Job.created_at)
+        .with_for_update(skip_locked=True)
+        .limit(1)
+        .first()
+    )
+    if job is None:
+        # Confirmar los trabajos agotados que se hayan pasado a 'error'
+        db.commit()
+        return None
+
+    job.status = "procesando"
+    job.attempts = (job.attempts or 0) + 1
+    job.locked_at = now
+    job.worker_id = worker_id
+    _set_recording_status(db, job.recording_id, "procesando")
+    db.commit()
+    db.refresh(job)
+    return job
+
+def renew_lease(db: Session, job_id: int, worker_id: str) -> bool:
+    """Renueva el lease de un trabajo en curso para que no se reclame.
+
+    Devuelve False si el trabajo ya no pertenece a este worker.
+    """
+    jobs = Job.__table__
+    renewed = db.execute(
+        update(jobs)
+        .where(
+            jobs.c.id == job_id,
+            jobs.c.worker_id == worker_id,
+            jobs.c.status == "procesando"
+        )
+        .values(locked_at=datetime.now())
+    ).rowcount
+    db.commit()
+    return renewed > 0
+
+def _release_job(db: Session, job_id: int, worker_id: str, **values: Any) -> Optional[Tuple[int, int]]:
+    """Cierra el lease del trabajo solo si sigue siendo de este worker.
+
+    Un trabajo cuyo lease expiró pudo ser reclamado por otro worker; el
+    UPDATE condicional evita que ambos lo den por terminado. Devuelve
+    (attempts, max_attempts) o None si el trabajo ya no nos pertenece.
+    """
+    jobs = Job.__table__
+    row = db.execute(
+        update(jobs)
+        .where(
+            jobs.c.id == job_id,
+            jobs.c.worker_id == worker_id,
+            jobs.c.status == "procesando"
+        )
+        .values(locked_at=None, **values)
+        .returning(jobs.c.attempts, jobs.c.max_attempts)
+    ).first()
+    if row is None:
+        db.rollback()
+        logger.warning(f"Trabajo {job_id} ya no pertenece a {worker_id}; se descarta su resultado")
+        return None
+    return row.attempts, row.max_attempts
+
+def complete_job(db: Session, job: Job, worker_id: str, result: Optional[Dict[str, Any]] = None) -> bool:
+    """Marca el trabajo y su grabación como completados y actualiza los agregados.
+
+    Devuelve False (y deshace la transacción) si otro worker reclamó el trabajo.
+    """
+    job_id, recording_id = job.id, job.recording_id
+    if _release_job(db, job_id, worker_id, status="completado", result=result, error=None) is None:
+        return False
+    _finish_recording(
+        db, recording_id, "completado", (result or {}).get("analysis"), (result or {}).get("duration")
+    )
+    db.commit()
+    return True
+
+def fail_job(db: Session, job: Job, worker_id: str, error: str) -> bool:
+    """Registra un fallo y reprograma el trabajo con backoff exponencial.
+
+    Cuando se agotan los intentos el trabajo y la grabación quedan en 'error'.
+    Devuelve False si otro worker reclamó el trabajo.
+    """
+    job_id, recording_id = job.id, job.recording_id
+    lease = _release_job(db, job_id, worker_id, error=error)
+    if lease is None:
+        return False
+    attempts, max_attempts = lease
+    jobs = Job.__table__
+    if attempts < max_attempts:
+        delay = settings.JOB_RETRY_BACKOFF * (2 ** (attempts - 1))
+        db.execute(
+            update(jobs)
+            .where(jobs.c.id == job_id)
+            .values(status="pendiente", run_after=datetime.now() + timedelta(seconds=delay))
+        )
+        _set_recording_status(db, recording_id, "pendiente")
+        logger.warning(
+            f"Trabajo {job_id} falló (intento {attempts}/{max_attempts}), "
+            f"reintento en {delay}s: {error}"
+        )
+    else:
+        _fail_permanently(db, job_id, recording_id, error)
+    db.commit()
+    return True
+
+def get_job(db: Session, job_id: int, user_id: int) -> Optional[Job]:
+    """Obtiene un trabajo perteneciente a las grabaciones del usuario."""
+    return (
+        db.query(Job)
+        .join(Recording, Job.recording_id == Recording.id)
+        .filter(Job.id == job_id, Recording.user_id == user_id)
+        .first()
+    )
+
+def get_batch_progress(db: Session, batch_id: str, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Progreso de un lote: trabajos por estado, errores y duración."""
+    query = db.query(Job).filter(Job.batch_id == batch_id)
+    if user_id is not None:
+        query = query.join(Recording, Job.recording_id == Recording.id).filter(Recording.user_id == user_id)
+
+    rows = (
+        query.with_entities(
+            Job.status,
+            func.count(Job.id),
+            func.min(Job.created_at),
+            func.max(Job.updated_at)
+        )
+        .group_by(Job.status)
+        .all()
+    )
+    if not rows:
+        return None
+
+    by_status = {status: count for status, count, _, _ in rows}
+    total = sum(by_status.values())
+    finished = by_status.get("completado", 0) + by_status.get("error", 0)
+    started_at = min(first for _, _, first, _ in rows)
+    last_update = max(last for _, _, _, last in rows if last is not None)
+    # Mientras el lote está en curso la duración se mide hasta ahora
+    end = last_update if finished == total else datetime.now()
+    elapsed = (end - started_at).total_seconds()
+
+    errors = (
+        query.filter(Job.status == "error")
+        .with_entities(Job.id, Job.recording_id, Job.payload, Job.error)
+        .limit(100)
+        .all()
+    )
+    return {
+        "batch_id": batch_id,
+        "total": total,
+        "by_status": by_status,
+        "finished": finished,
+        "done": finished == total,
+        "elapsed_seconds": elapsed,
+        "files_per_minute": finished / elapsed * 60 if elapsed else 0.0,
+        "errors": [
+            {
+                "job_id": job_id,
+                "recording_id": recording_id,
+                "filename": (payload or {}).get("filename"),
+                "error": error
+            }
+            for job_id, recording_id, payload, error in errors
+        ]
+    }
+
+def count_jobs_by_status(db: Session) -> Dict[str, int]:
+    """Devuelve la profundidad de la cola agrupada por estado."""
+    rows = db.query(Job.status, func.count(Job.id)).group_by(Job.status).all()
+    return {status: count for status, count in rows}
@@ -0,0 +1,212 @@
+"""Generador de carga con barrido de concurrencia.
+
+Uso:
+    python -m app.loadtest analyze --url http://localhost:8000 --user auditor@empresa.com --levels 1,2,4,8,16,32
+    python -m app.loadtest transcribe --levels 1,2,4,8 --duration 30
+
+Para cada nivel de concurrencia lanza ese número de clientes en bucle
+cerrado durante `--duration` segundos contra `/api/transcribe/` o
+`/api/analyze/`, y registra rendimiento, latencias y respuestas 429/504.
+El "codo" es el último nivel en que subir la concurrencia todavía aumenta el
+rendimiento al menos `--min-gain` sin superar `--max-error-rate` de
+rechazos o errores: a partir de ahí solo crece la latencia. Sirve para
+fijar MAX_CONCURRENT_* y el número de workers con datos.
+
+Sin `--url` la carga se genera contra la aplicación en el propio proceso
+con modelos sustitutos (ver app.benchmark), útil para medir el overhead y
+probar el control de admisión; contra un servidor real la contraseña se lee
+de AUDITORIA_PASSWORD.
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from .benchmark import (
+    ResourceMonitor,
+    add_input_arguments,
+    asgi_app,
+    audio_files,
+    environment_report,
+    latency_summary,
+    prepare,
+    synth_transcript,
+    write_report,
+)
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+async def _login(client, user: str, password: str) -> None:
+    response = await client.post("/token", data={"username": user, "password": password})
+    response.raise_for_status()
+    # La API marca la cookie como secure; se fija a mano para poder usar http
+    client.cookies.set("access_token", response.json()["access_token"])
+
+def _request_factory(args, paths: List[str]):
+    """Función que envía la petición número `index` del escenario."""
+    audio = []
+    for path in paths:
+        with open(path, "rb") as source:
+            audio.append(source.read())
+
+    async def transcribe(client, index: int):
+        content = bytearray(audio[index % len(audio)])
+        if not args.cache:
+            # Últimas muestras distintas en cada petición para que el
+            # servidor no reutilice transcripciones por contenido
+            content[-8:] = index.to_bytes(8, "little")
+        return await client.post(
+            "/api/transcribe/",
+            files={"file": (f"loadtest_{index}.wav", bytes(content), "audio/wav")}
+        )
+
+    async def analyze(client, index: int):
+        data = {"text": synth_transcript(args.words, args.seed + index), "filename": f"loadtest_{index}.wav"}
+        if args.profile:
+            data["profile"] = args.profile
+        return await client.post("/api/analyze/", data=data)
+
+    return transcribe if args.scenario == "transcribe" else analyze
+
+async def run_level(client, send, concurrency: int, duration: float, max_backoff: float, offset: int) -> Dict[str, Any]:
+    """Bucle cerrado de `concurrency` clientes durante `duration` segundos."""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    counter = iter(range(offset, offset + 10 ** 9))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+
+    async def worker() -> None:
+        while loop.time() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await send(client, next(counter))
+                status = str(response.status_code)
+            except Exception as e:
+                response, status = None, type(e).__name__
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == "200":
+                latencies.append(time.perf_counter() - start)
+            elif status == "429":
+                # Respetar Retry-After, acotado para seguir generando carga
+                retry_after = float(response.headers.get("Retry-After", "1"))
+                await asyncio.sleep(min(retry_after, max_backoff))
+
+    with ResourceMonitor() as monitor:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    resources = monitor.report()
+    total = sum(statuses.values())
+    ok = statuses.get("200", 0)
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": ok,
+        "statuses": statuses,
+        "rejected_rate": statuses.get("429", 0) / total if total else 0.0,
+        "error_rate": (total - ok) / total if total else 0.0,
+        "throughput_rps": ok / resources["wall_seconds"] if resources["wall_seconds"] else 0.0,
+        "latency_seconds": latency_summary(latencies),
+        # Solo significativo con la aplicación en el propio proceso
+        "cpu_utilisation": resources["cpu_utilisation"],
+        "peak_rss_bytes": resources["peak_rss_bytes"],
+    }
+
+def find_knee(levels: List[Dict[str, Any]], min_gain: float, max_error_rate: float) -> Optional[Dict[str, Any]]:
+    """Último nivel que mejora el rendimiento sin rechazos ni errores relevantes."""
+    knee = None
+    for level in levels:
+        if level["error_rate"] > max_error_rate or not level["ok"]:
+            break
+        if knee is not None:
+            previous = knee["throughput_rps"]
+            gain = (level["throughput_rps"] - previous) / previous if previous else math.inf
+            if gain < min_gain:
+                break
+        knee = level
+    return knee
+
+async def sweep(args, app=None) -> Dict[str, Any]:
+    import httpx
+
+    workdir = tempfile.mkdtemp(prefix="auditoria_loadtest_")
+    paths = audio_files(args, workdir) if args.scenario == "transcribe" else []
+    send = _request_factory(args, paths)
+
+    if app is not None:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=None)
+    else:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+
+    levels: List[Dict[str, Any]] = []
+    async with client:
+        if app is None:
+            await _login(client, args.user, os.getenv("AUDITORIA_PASSWORD", ""))
+        for index, concurrency in enumerate(args.levels):
+            logger.info(f"Nivel {concurrency}: {args.duration:.0f}s de carga")
+            level = await run_level(
+                client, send, concurrency, args.duration, args.max_backoff, offset=index * 10 ** 6
+            )
+            latency = level["latency_seconds"]
+            logger.info(
+                f"Nivel {concurrency}: {level['throughput_rps']:.2f} req/s, "
+                f"p95 {latency['p95'] or 0:.2f}s, {level['rejected_rate']:.1%} rechazadas"
+            )
+            levels.append(level)
+            if args.cooldown:
+                await asyncio.sleep(args.cooldown)
+
+    knee = find_knee(levels, args.min_gain, args.max_error_rate)
+    return {
+        "levels": levels,
+        "knee": {
+            "concurrency": knee["concurrency"],
+            "throughput_rps": knee["throughput_rps"],
+            "latency_p95": knee["latency_seconds"]["p95"],
+        } if knee else None,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Barrido de concurrencia contra la API")
+    parser.add_argument("scenario", choices=("transcribe", "analyze"))
+    parser.add_argument("--url", help="URL de la API; sin ella se usa la aplicación en proceso")
+    parser.add_argument("--user", default=os.getenv("AUDITORIA_USER", ""), help="Email para iniciar sesión con --url")
+    parser.add_argument("--profile", help="Perfil de análisis enviado a /api/analyze/")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="Niveles de concurrencia separados por comas")
+    parser.add_argument("--duration", type=float, default=30.0, help="Segundos de carga por nivel")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="Pausa entre niveles")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Timeout por petición con --url")
+    parser.add_argument("--max-backoff", type=float, default=1.0, help="Espera máxima tras un 429")
+    parser.add_argument("--min-gain", type=float, default=0.1, help="Mejora mínima de rendimiento entre niveles")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Proporción máxima de 429/errores")
+    parser.add_argument("--output", help="Archivo del reporte JSON (por defecto stdout)")
+    add_input_arguments(parser)
+    args = parser.parse_args()
+    args.levels = sorted({int(level) for level in args.levels.split(",") if level.strip()})
+
+    app = None
+    if args.url:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    else:
+        prepare(args, tempfile.mkdtemp(prefix="auditoria_loadtest_"))
+        app = asgi_app(args)
+
+    results = asyncio.run(sweep(args, app))
+    report = {
+        "scenario": args.scenario,
+        "target": args.url or "in-process",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "parameters": vars(args),
+        # Con --url la configuración local no es la del servidor
+        **environment_report(include_settings=not args.url),
+        **results,
+    }
+    write_report(report, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,29 @@
 from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import os
 import json
+import asyncio
 import logging
 from datetime import datetime, timedelta
 import jwt
 from pathlib import Path
 
 # Importaciones locales
-from .database import get_db, init_db
+from .database import SessionLocal, get_async_db, get_db, init_db
 from .auth import (
     get_current_user,
+    get_current_admin_user,
+    principal_cache,
     create_access_token,
-    verify_password,
+    verify_password_async,
+    get_user_by_email,
     get_password_hash
 )
 from .models import (
@@ -27,15 +33,27 @@
     UserCreate,
     Token,
     RecordingCreate,
-    AnalysisCreate
+    RecordingSummary,
+    AnalysisCreate,
+    JobRead
 )
 from .config import settings
 from .services import (
     transcribe_audio,
+    transcribe_file_stream,
     analyze_text,
+    analyze_text_stream,
     save_analysis,
-    get_recording_stats
+    get_recording_stats,
+    list_recordings,
+    store_upload,
+    get_model_stats
 )
+from .jobs import count_jobs_by_status, enqueue_job, enqueue_batch, get_batch_progress, get_job
+from . import metrics
+from .cascade import resolve_profile
+from .diarization import speaker_texts
+from .admission import analysis_admission, get_admission_stats, transcription_admission, with_deadline
 
 # Configuración de logging
 logging.basicConfig(
@@ -57,6 +75,7 @@
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Montar directorios estáticos
@@ -83,10 +102,10 @@ def validate_audio_file(file: UploadFile) -> None:
 async def login(
     response: Response,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await get_user_by_email(db, form_data.username)
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=401,
             detail="Credenciales inválidas"
@@ -120,46 +139,306 @@ async def transcribe_endpoint(
         # Validar tipo de archivo
         validate_audio_file(file)
         
-        text = await transcribe_audio(file)
-        return {"text": text}
+        transcription = await transcription_admission.run(transcribe_audio, file)
+        return {
+            "text": transcription["text"],
+            "segments": transcription["segments"],
+            "speakers": transcription.get("speakers")
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error en transcripción: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def sse_event(event: str, data) -> str:
+    """Formatea un evento Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/transcribe/stream")
+async def transcribe_stream_endpoint(
+    file: UploadFile = File(...),
+    profile: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Transcribe y analiza emitiendo resultados parciales por SSE.
+
+    Eventos: `segments` por cada chunk transcrito, `transcription` con el
+    texto completo, `analysis` por cada tarea de análisis terminada,
+    `analysis_complete` y `error` si algo falla tras iniciar la respuesta.
+    Si el servidor está ocupado responde 429 antes de iniciar el stream.
+    """
+    validate_audio_file(file)
+    transcription_admission.check()
+    tasks = resolve_profile(profile)
+    path = await store_upload(file)
+    filename = file.filename
+    user_id = current_user.id
+    deadline = asyncio.get_running_loop().time() + settings.PROCESSING_TIMEOUT
+
+    async def events():
+        try:
+            transcription = None
+            loop = asyncio.get_running_loop()
+            async with transcription_admission.slot(max(0.0, deadline - loop.time())):
+                async for event in with_deadline(transcribe_file_stream(path), deadline, transcription_admission):
+                    if event["event"] == "segments":
+                        yield sse_event("segments", {
+                            "segments": event["segments"],
+                            "chunk": event["chunk"],
+                            "chunks": event["chunks"]
+                        })
+                    else:
+                        transcription = event["transcription"]
+                        yield sse_event("transcription", {
+                            "text": transcription["text"],
+                            "duration": transcription.get("duration"),
+                            "speakers": transcription.get("speakers")
+                        })
+
+            if not transcription["text"]:
+                yield sse_event("analysis_complete", {"analysis": None})
+                return
+
+            async with analysis_admission.slot(max(0.0, deadline - loop.time())):
+                analysis_events = with_deadline(
+                    analyze_text_stream(transcription["text"], tasks, speaker_texts(transcription)),
+                    deadline,
+                    analysis_admission
+                )
+                async for event in analysis_events:
+                    if event["event"] == "analysis":
+                        yield sse_event("analysis", {"task": event["task"], "result": event["result"]})
+                        continue
+                    analysis = {
+                        **event["analysis"],
+                        "text": transcription["text"],
+                        "segments": transcription["segments"],
+                        "duration": transcription.get("duration"),
+                        "speakers": transcription.get("speakers")
+                    }
+                    # La sesión del endpoint ya no es válida mientras se transmite
+                    db = SessionLocal()
+                    try:
+                        await save_analysis(analysis, filename, user_id, db)
+                    finally:
+                        db.close()
+                    yield sse_event("analysis_complete", {"analysis": event["analysis"]})
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail, "status_code": e.status_code})
+        except Exception as e:
+            logger.error(f"Error en transcripción en streaming: {str(e)}")
+            yield sse_event("error", {"detail": "Error al procesar el archivo de audio", "status_code": 500})
+        finally:
+            try:
+                os.unlink(path)
+            except Exception as e:
+                logger.warning(f"Error al eliminar archivo temporal {path}: {str(e)}")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/analyze/")
 async def analyze_endpoint(
     text: str = Form(...),
     filename: str = Form(...),
+    profile: Optional[str] = Form(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     try:
-        analysis = await analyze_text(text)
-        await save_analysis(analysis, filename, current_user.id, db)
+        tasks = resolve_profile(profile)
+        analysis = await analysis_admission.run(analyze_text, text, tasks)
+        # Con el texto se guarda su transcripción para poder reanalizarlo
+        await save_analysis({**analysis, "text": text}, filename, current_user.id, db)
         return {"analysis": analysis}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error en análisis: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Endpoints de la cola de trabajos
+def _enqueue_upload(
+    db: Session,
+    user_id: int,
+    filename: str,
+    path: str,
+    priority: int,
+    tasks: List[str]
+):
+    """Crea la grabación y su trabajo en una transacción (síncrono, para el threadpool)."""
+    try:
+        recording = Recording(user_id=user_id, filename=filename, status="pendiente")
+        db.add(recording)
+        db.flush()
+        job = enqueue_job(
+            db,
+            recording.id,
+            kind="completo",
+            priority=priority,
+            payload={"path": path, "filename": filename, "tasks": tasks}
+        )
+    except Exception:
+        db.rollback()
+        raise
+    return {"job_id": job.id, "recording_id": recording.id, "status": job.status}
+
+@app.post("/api/jobs/", status_code=202)
+async def create_job_endpoint(
+    file: UploadFile = File(...),
+    priority: int = Form(0),
+    profile: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Encola la transcripción y el análisis de un archivo y devuelve el id del trabajo."""
+    validate_audio_file(file)
+    tasks = resolve_profile(profile)
+    path = await store_upload(file)
+    try:
+        return await run_in_threadpool(
+            _enqueue_upload, db, current_user.id, file.filename, path, priority, tasks
+        )
+    except Exception as e:
+        os.unlink(path)
+        logger.error(f"Error al encolar trabajo: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error al encolar el trabajo")
+
+@app.post("/api/jobs/batch", status_code=202)
+async def create_batch_endpoint(
+    files: List[UploadFile] = File(...),
+    priority: int = Form(0),
+    profile: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Encola varios archivos como un lote y devuelve su id para seguir el progreso."""
+    tasks = resolve_profile(profile)
+    stored, rejected = [], []
+    try:
+        for file in files:
+            try:
+                validate_audio_file(file)
+            except HTTPException as e:
+                rejected.append({"filename": file.filename, "detail": e.detail})
+                continue
+            stored.append((await store_upload(file), file.filename))
+
+        if not stored:
+            raise HTTPException(status_code=400, detail="Ningún archivo del lote es válido")
+
+        batch_id, jobs = await run_in_threadpool(
+            enqueue_batch,
+            db,
+            current_user.id,
+            stored,
+            priority=priority,
+            tasks=tasks
+        )
+    except Exception as e:
+        for path, _ in stored:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        if isinstance(e, HTTPException):
+            raise
+        logger.error(f"Error al encolar lote: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error al encolar el lote")
+
+    return {
+        "batch_id": batch_id,
+        "jobs": jobs,
+        "rejected": rejected
+    }
+
+@app.get("/api/jobs/batch/{batch_id}")
+def get_batch_endpoint(
+    batch_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    progress = get_batch_progress(db, batch_id, current_user.id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Lote no encontrado")
+    return progress
+
+@app.get("/api/jobs/{job_id}", response_model=JobRead)
+def get_job_endpoint(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    job = get_job(db, job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
 # Endpoints de grabaciones
-@app.get("/api/recordings", response_model=List[Recording])
+@app.get("/api/recordings", response_model=List[RecordingSummary])
 async def get_recordings(
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    skip: int = 0,
-    limit: int = 10
+    db: AsyncSession = Depends(get_async_db),
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    category: Optional[str] = None,
+    sentiment_min: Optional[float] = Query(None, ge=1, le=5),
+    sentiment_max: Optional[float] = Query(None, ge=1, le=5),
+    include_metadata: bool = False
 ):
-    recordings = db.query(Recording).filter(
-        Recording.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    """Lista las grabaciones; la página siguiente se pide con la cabecera X-Next-Cursor."""
+    recordings, next_cursor = await list_recordings(
+        db,
+        current_user.id,
+        limit=limit,
+        cursor=cursor,
+        status=status,
+        date_from=date_from,
+        date_to=date_to,
+        category=category,
+        sentiment_min=sentiment_min,
+        sentiment_max=sentiment_max,
+        include_metadata=include_metadata
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return recordings
 
 @app.get("/api/recordings/stats")
 async def get_stats(
+    days: int = Query(30, ge=1, le=366),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    return await get_recording_stats(current_user.id, db)
+    return await get_recording_stats(current_user.id, db, days)
+
+# Endpoints de administración
+@app.get("/api/admin/models")
+async def get_models_status(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Modelos residentes, memoria estimada y contadores del registro."""
+    stats = await get_model_stats()
+    # La caché de usuarios vive en cada worker de la API
+    stats["auth_cache"] = principal_cache.get_stats()
+    stats["admission"] = get_admission_stats()
+    return stats
+
+# Métricas Prometheus; nginx solo permite el acceso desde la red interna
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(db: Session = Depends(get_db)):
+    for status, count in count_jobs_by_status(db).items():
+        metrics.JOBS.labels(status).set(count)
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
 
 # Inicialización
 @app.on_event("startup")
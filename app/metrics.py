@@ -0,0 +1,193 @@
+"""Métricas Prometheus de la API, los workers y el servidor de modelos.
+
+Con varios procesos (gunicorn, workers de la cola, servidor de modelos) hay
+que exportar PROMETHEUS_MULTIPROC_DIR apuntando a un directorio vacío antes
+de arrancarlos; `/metrics` agrega entonces los valores de todos ellos.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# Segundos; cubre desde una consulta a la base de datos hasta una llamada larga
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+STAGE_SECONDS = Histogram(
+    "auditoria_stage_seconds",
+    "Duración de cada etapa del procesamiento",
+    ["stage", "model", "audio_bucket"],
+    buckets=_LATENCY_BUCKETS
+)
+AUDIO_SECONDS = Counter(
+    "auditoria_audio_seconds_total",
+    "Segundos de audio procesados por etapa",
+    ["stage"]
+)
+BATCH_SIZE = Histogram(
+    "auditoria_pipeline_batch_size",
+    "Elementos por lote de cada pipeline",
+    ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+QUEUE_DEPTH = Gauge(
+    "auditoria_queue_depth",
+    "Elementos en espera por cola",
+    ["queue"],
+    multiprocess_mode="livesum"
+)
+JOBS = Gauge(
+    "auditoria_jobs",
+    "Trabajos de la cola persistente por estado",
+    ["status"],
+    multiprocess_mode="mostrecent"
+)
+EXECUTOR_WORKERS = Gauge(
+    "auditoria_executor_workers",
+    "Hilos disponibles por pool",
+    ["executor"],
+    multiprocess_mode="livesum"
+)
+EXECUTOR_ACTIVE = Gauge(
+    "auditoria_executor_active",
+    "Tareas en ejecución por pool",
+    ["executor"],
+    multiprocess_mode="livesum"
+)
+EXECUTOR_QUEUED = Gauge(
+    "auditoria_executor_queued",
+    "Tareas esperando un hilo libre por pool",
+    ["executor"],
+    multiprocess_mode="livesum"
+)
+ADMISSION_REQUESTS = Counter(
+    "auditoria_admission_requests_total",
+    "Peticiones por limitador y resultado (admitted, rejected, timeout)",
+    ["limiter", "result"]
+)
+ADMISSION_ACTIVE = Gauge(
+    "auditoria_admission_active",
+    "Peticiones en proceso por limitador",
+    ["limiter"],
+    multiprocess_mode="livesum"
+)
+CACHE_REQUESTS = Counter(
+    "auditoria_cache_requests_total",
+    "Consultas a cachés por resultado",
+    ["cache", "result"]
+)
+MODEL_LOAD_SECONDS = Histogram(
+    "auditoria_model_load_seconds",
+    "Tiempo de carga de cada modelo",
+    ["model"],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+MODEL_EVENTS = Counter(
+    "auditoria_model_events_total",
+    "Cargas, errores de carga y descargas de modelos",
+    ["model", "event"]
+)
+MODEL_MEMORY = Gauge(
+    "auditoria_model_memory_bytes",
+    "Memoria estimada de los modelos residentes",
+    ["model"],
+    multiprocess_mode="livesum"
+)
+PROCESS_RSS = Gauge(
+    "auditoria_process_rss_bytes",
+    "Memoria residente de cada proceso",
+    multiprocess_mode="liveall"
+)
+
+def audio_bucket(seconds: Optional[float]) -> str:
+    """Etiqueta de duración del audio para no crear una serie por grabación."""
+    if seconds is None:
+        return "n/a"
+    if seconds < 60:
+        return "<1m"
+    if seconds < 300:
+        return "1-5m"
+    if seconds < 900:
+        return "5-15m"
+    if seconds < 3600:
+        return "15-60m"
+    return ">60m"
+
+def observe(stage: str, seconds: float, model: str = "", audio_seconds: Optional[float] = None) -> None:
+    STAGE_SECONDS.labels(stage, model, audio_bucket(audio_seconds)).observe(seconds)
+    if audio_seconds:
+        AUDIO_SECONDS.labels(stage).inc(audio_seconds)
+
+@contextmanager
+def track(stage: str, model: str = "", audio_seconds: Optional[float] = None):
+    """Mide la duración del bloque como una etapa."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start, model, audio_seconds)
+
+def cache_result(cache: str, result: str) -> None:
+    CACHE_REQUESTS.labels(cache, result).inc()
+
+class InstrumentedThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor que publica hilos ocupados y tareas en espera."""
+
+    def __init__(self, name: str, max_workers: Optional[int] = None, **kwargs):
+        super().__init__(max_workers=max_workers, **kwargs)
+        self.name = name
+        EXECUTOR_WORKERS.labels(name).set(self._max_workers)
+
+    def submit(self, fn, /, *args, **kwargs):
+        queued = EXECUTOR_QUEUED.labels(self.name)
+        active = EXECUTOR_ACTIVE.labels(self.name)
+        queued.inc()
+        started = threading.Event()
+
+        def run():
+            started.set()
+            queued.dec()
+            active.inc()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                active.dec()
+
+        future = super().submit(run)
+        # Si la tarea se cancela antes de empezar no llega a descontarse
+        future.add_done_callback(lambda _: None if started.is_set() else queued.dec())
+        return future
+
+def update_process_metrics() -> None:
+    from .registry import get_process_rss
+
+    PROCESS_RSS.set(get_process_rss())
+
+def render() -> Tuple[bytes, str]:
+    """Serializa las métricas en el formato de exposición de Prometheus."""
+    update_process_metrics()
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid: int) -> None:
+    """Descarta los gauges 'live' de un proceso que terminó."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,190 @@
+"""Servidor de inferencia compartido por los workers de la API.
+
+Uso:
+    python -m app.model_server
+
+Un único proceso carga Whisper y los pipelines de análisis y atiende por un
+socket Unix (MODEL_SERVER_SOCKET) las peticiones de los workers de gunicorn y
+de la cola de trabajos. Con MODEL_SERVER_SOCKET configurado, los workers no
+cargan modelos: `transcribe_file` y `analyze_text` delegan en este proceso.
+
+Los mensajes se serializan con pickle, así que cada conexión se autentica con
+MODEL_SERVER_AUTHKEY (desafío HMAC de multiprocessing) antes de leer nada, y
+el socket se crea sin permisos para otros usuarios.
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from .config import settings
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+def server_authkey() -> bytes:
+    """Clave de autenticación del socket; sin ella no se acepta ni se abre ninguna conexión."""
+    if not settings.MODEL_SERVER_AUTHKEY:
+        raise RuntimeError("MODEL_SERVER_AUTHKEY no está configurado")
+    return settings.MODEL_SERVER_AUTHKEY.encode("utf-8")
+
+class ModelServerClient:
+    """Cliente del servidor de inferencia con un pool de conexiones."""
+
+    def __init__(self, address: str, pool_size: int):
+        self.address = address
+        self._pool: "queue.LifoQueue" = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self):
+        return Client(self.address, family="AF_UNIX", authkey=server_authkey())
+
+    def _call(self, op: str, **kwargs) -> Any:
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            conn.send({"op": op, **kwargs})
+            response = conn.recv()
+        except (EOFError, OSError) as e:
+            conn.close()
+            logger.error(f"Error de comunicación con el servidor de modelos: {str(e)}")
+            raise HTTPException(
+                status_code=503,
+                detail="El servidor de modelos no está disponible"
+            )
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+        if not response.get("ok"):
+            raise HTTPException(
+                status_code=response.get("status_code", 500),
+                detail=response.get("detail", "Error en el servidor de modelos")
+            )
+        return response["result"]
+
+    async def call(self, op: str, **kwargs) -> Any:
+        """Ejecuta una operación remota sin bloquear el event loop."""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, lambda: self._call(op, **kwargs))
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            logger.error(f"No se pudo conectar con el servidor de modelos: {str(e)}")
+            raise HTTPException(
+                status_code=503,
+                detail="El servidor de modelos no está disponible"
+            )
+
+    async def transcribe(self, path: str):
+        return await self.call("transcribe", path=path)
+
+    async def transcribe_chunk(self, pcm_path: str, start: int, end: int) -> List[Dict[str, Any]]:
+        return await self.call("transcribe_chunk", pcm_path=pcm_path, start=start, end=end)
+
+    async def diarize(self, pcm_path: str, segments: List[Dict[str, Any]]):
+        return await self.call("diarize", pcm_path=pcm_path, segments=segments)
+
+    async def analyze(
+        self,
+        text: str,
+        tasks: Optional[List[str]] = None,
+        speakers: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        return await self.call("analyze", text=text, tasks=tasks, speakers=speakers)
+
+    async def stats(self) -> Dict[str, Any]:
+        return await self.call("stats")
+
+class ModelServer:
+    """Atiende peticiones de inferencia sobre un socket Unix."""
+
+    def __init__(self, address: str):
+        self.address = address
+        self.loop = asyncio.new_event_loop()
+
+    async def _dispatch(self, request: Dict[str, Any]) -> Any:
+        from . import metrics, services
+
+        metrics.update_process_metrics()
+        op = request.get("op")
+        if op == "transcribe":
+            return await services._transcribe_file_local(request["path"])
+        if op == "transcribe_chunk":
+            return await services._transcribe_chunk_local(request["pcm_path"], request["start"], request["end"])
+        if op == "diarize":
+            return await services._diarize_local(request["pcm_path"], request["segments"])
+        if op == "analyze":
+            return await services._analyze_text_local(
+                request["text"], request.get("tasks"), request.get("speakers")
+            )
+        if op == "stats":
+            return await services.get_model_stats()
+        raise ValueError(f"Operación no soportada: {op}")
+
+    def _handle_connection(self, conn) -> None:
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                future = asyncio.run_coroutine_threadsafe(self._dispatch(request), self.loop)
+                try:
+                    response = {"ok": True, "result": future.result()}
+                except HTTPException as e:
+                    response = {"ok": False, "status_code": e.status_code, "detail": e.detail}
+                except Exception as e:
+                    logger.error(f"Error en el servidor de modelos: {str(e)}")
+                    response = {"ok": False, "status_code": 500, "detail": str(e)}
+                try:
+                    conn.send(response)
+                except (EOFError, OSError):
+                    return
+
+    def serve_forever(self) -> None:
+        from . import services
+
+        # Cargar por adelantado los modelos configurados en este proceso
+        services.registry.preload(settings.MODEL_PRELOAD)
+
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        # El socket nace con 0660: no hay ventana con permisos más abiertos
+        previous_umask = os.umask(0o117)
+        try:
+            listener = Listener(self.address, family="AF_UNIX", authkey=server_authkey())
+        finally:
+            os.umask(previous_umask)
+        logger.info(f"Servidor de modelos escuchando en {self.address}")
+        try:
+            while True:
+                conn = listener.accept()
+                threading.Thread(
+                    target=self._handle_connection,
+                    args=(conn,),
+                    daemon=True
+                ).start()
+        finally:
+            listener.close()
+
+def main() -> None:
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+    if not settings.MODEL_SERVER_SOCKET:
+        raise SystemExit("MODEL_SERVER_SOCKET no está configurado")
+    address = settings.MODEL_SERVER_SOCKET
+    server_authkey()
+    # El servidor siempre ejecuta la inferencia localmente
+    settings.MODEL_SERVER_SOCKET = ""
+    ModelServer(address).serve_forever()
+
+if __name__ == "__main__":
+    main()
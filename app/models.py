@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Float
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, JSON, Float, Text, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -21,6 +21,10 @@ class User(Base):
 
 class Recording(Base):
     __tablename__ = "recordings"
+    __table_args__ = (
+        Index("ix_recordings_user_created", "user_id", "created_at", "id"),
+        Index("ix_recordings_user_status", "user_id", "status", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -29,18 +33,88 @@ class Recording(Base):
     created_at = Column(DateTime, default=datetime.now)
     status = Column(String, default="pending")
     metadata = Column(JSON, nullable=True)
+    category = Column(String, nullable=True)  # Copia de metadata para filtrar sin leer el JSON
+    sentiment = Column(Float, nullable=True)  # Estrellas esperadas (1-5)
     user = relationship("User", back_populates="recordings")
     analysis = relationship("Analysis", back_populates="recording")
+    transcript = relationship("Transcript", back_populates="recording", uselist=False)
+    jobs = relationship("Job", back_populates="recording")
+
+class Transcript(Base):
+    """Transcripción de una grabación, guardada aparte de sus análisis para
+    poder reanalizar sin volver a ejecutar Whisper."""
+    __tablename__ = "transcripts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recording_id = Column(Integer, ForeignKey("recordings.id"), unique=True, nullable=False)
+    text = Column(Text, nullable=False)
+    segments = Column(JSON, nullable=True)  # Sin segmentos si solo se envió texto
+    speakers = Column(JSON, nullable=True)  # Resumen de la diarización
+    duration = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    recording = relationship("Recording", back_populates="transcript")
 
 class Analysis(Base):
     __tablename__ = "analyses"
+    __table_args__ = (
+        Index("ix_analyses_recording_kind", "recording_id", "kind", "model_version"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     recording_id = Column(Integer, ForeignKey("recordings.id"))
+    kind = Column(String, nullable=True)  # Tarea: 'sentiment', 'emotion', 'summary', 'category'; NULL = análisis completo anterior
+    model_version = Column(String, nullable=True)  # services.task_version al calcularlo
     result = Column(JSON)
     created_at = Column(DateTime, default=datetime.now)
     recording = relationship("Recording", back_populates="analysis")
 
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_queue", "status", "priority", "run_after"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    recording_id = Column(Integer, ForeignKey("recordings.id"), index=True)
+    kind = Column(String, default="completo")  # 'transcripcion', 'analisis', 'completo'
+    priority = Column(Integer, default=0)  # Mayor valor = se procesa antes
+    status = Column(String, default="pendiente")  # 'pendiente', 'procesando', 'completado', 'error'
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    batch_id = Column(String, nullable=True, index=True)  # Lote de ingesta masiva
+    payload = Column(JSON, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    worker_id = Column(String, nullable=True)
+    run_after = Column(DateTime, default=datetime.now)
+    locked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    recording = relationship("Recording", back_populates="jobs")
+
+class RecordingStatsDaily(Base):
+    """Agregados diarios por usuario, estado final y categoría.
+
+    Se actualizan de forma incremental cuando una grabación termina, de modo
+    que el dashboard no recorre la tabla de grabaciones.
+    """
+    __tablename__ = "recording_stats_daily"
+    __table_args__ = (
+        UniqueConstraint("user_id", "day", "status", "category", name="uq_recording_stats_daily"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    day = Column(Date, nullable=False)
+    status = Column(String, nullable=False)  # 'completado', 'error'
+    category = Column(String, nullable=False, default="")  # '' = sin categoría
+    count = Column(Integer, nullable=False, default=0)
+    duration_seconds = Column(Float, nullable=False, default=0.0)
+    sentiment_sum = Column(Float, nullable=False, default=0.0)  # Suma de estrellas (1-5)
+    sentiment_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
 # Modelos Pydantic
 class UserBase(BaseModel):
     email: EmailStr
@@ -81,7 +155,21 @@ class Recording(RecordingBase):
     class Config:
         from_attributes = True
 
+class RecordingSummary(BaseModel):
+    """Proyección ligera para el listado; `metadata` solo si se pide."""
+    id: int
+    user_id: int
+    filename: str
+    duration: Optional[float] = None
+    status: str
+    created_at: datetime
+    category: Optional[str] = None
+    sentiment: Optional[float] = None
+    metadata: Optional[dict] = None
+
 class AnalysisBase(BaseModel):
+    kind: Optional[str] = None
+    model_version: Optional[str] = None
     result: dict
 
 class AnalysisCreate(AnalysisBase):
@@ -93,4 +181,22 @@ class Analysis(AnalysisBase):
     created_at: datetime
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class JobBase(BaseModel):
+    kind: str = "completo"
+    priority: int = 0
+
+class JobRead(JobBase):
+    id: int
+    recording_id: Optional[int] = None
+    batch_id: Optional[str] = None
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    result: Optional[dict] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,244 @@
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import JSON, DateTime, String, bindparam, cast, insert, literal, select, union_all, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from . import metrics
+from .cascade import TASK_OUTPUTS
+from .models import Analysis, Recording, Transcript
+from .stats import record_outcome, record_reanalyses, sentiment_value
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Se trabaja sobre las tablas: la columna `metadata` de Recording no es
+# accesible como atributo del modelo
+recordings = Recording.__table__
+analyses = Analysis.__table__
+transcripts = Transcript.__table__
+
+def summary_columns(analysis: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Columnas de la grabación derivadas del análisis para filtrar el listado."""
+    categorization = (analysis or {}).get("categorization") or {}
+    return {
+        "category": categorization.get("category"),
+        "sentiment": sentiment_value(analysis),
+    }
+
+def insert_recordings(db: Session, rows: List[Dict[str, Any]]) -> List[int]:
+    """Inserta varias grabaciones en un solo INSERT ... RETURNING.
+
+    Devuelve los ids en el mismo orden que `rows`. No hace commit.
+    """
+    if not rows:
+        return []
+    now = datetime.now()
+    result = db.execute(
+        insert(recordings).returning(recordings.c.id, sort_by_parameter_order=True),
+        [{"created_at": now, **summary_columns(row.get("metadata")), "metadata": None, **row} for row in rows]
+    )
+    return list(result.scalars())
+
+def analysis_rows(analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Filas de un análisis: una por tarea, con su resultado y la versión con
+    que se calculó. Un análisis sin `tasks` se guarda completo en una fila sin tipo."""
+    versions = analysis.get("versions") or {}
+    rows = [
+        {
+            "kind": task,
+            "model_version": versions.get(task),
+            "result": {TASK_OUTPUTS[task][0]: analysis.get(TASK_OUTPUTS[task][0])}
+        }
+        for task in analysis.get("tasks") or []
+        if task in TASK_OUTPUTS
+    ]
+    return rows or [{"kind": None, "model_version": None, "result": analysis}]
+
+def transcript_values(analysis: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Columnas de la transcripción incluida en un análisis, si la hay."""
+    text = (analysis or {}).get("text")
+    if not text:
+        return None
+    return {
+        "text": text,
+        "segments": analysis.get("segments"),
+        "speakers": analysis.get("speakers"),
+        "duration": analysis.get("duration"),
+    }
+
+def insert_analyses(db: Session, rows: List[Tuple[int, Dict[str, Any]]]) -> None:
+    """Inserta los análisis (recording_id, análisis) en un solo INSERT, una
+    fila por tarea. No hace commit."""
+    if not rows:
+        return
+    now = datetime.now()
+    db.execute(
+        insert(analyses),
+        [
+            {"recording_id": recording_id, "created_at": now, **row}
+            for recording_id, analysis in rows
+            for row in analysis_rows(analysis)
+        ]
+    )
+
+def upsert_transcripts(db: Session, rows: List[Tuple[int, Optional[Dict[str, Any]]]]) -> None:
+    """Guarda las transcripciones (recording_id, análisis) que incluyen texto,
+    reemplazando la anterior de cada grabación. No hace commit."""
+    now = datetime.now()
+    values = []
+    for recording_id, analysis in rows:
+        columns = transcript_values(analysis)
+        if columns is not None:
+            values.append({"recording_id": recording_id, **columns, "created_at": now, "updated_at": now})
+    if not values:
+        return
+    statement = pg_insert(transcripts)
+    excluded = statement.excluded
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[transcripts.c.recording_id],
+            set_={
+                "text": excluded.text,
+                "segments": excluded.segments,
+                "speakers": excluded.speakers,
+                "duration": excluded.duration,
+                "updated_at": excluded.updated_at
+            }
+        ),
+        values
+    )
+
+def save_recording_analysis(
+    db: Session,
+    user_id: int,
+    filename: str,
+    analysis: Dict[str, Any],
+    status: str = "completado"
+) -> int:
+    """Guarda grabación, análisis y transcripción en una transacción.
+
+    El INSERT de la grabación va en un CTE cuyo RETURNING alimenta el INSERT
+    de las filas de análisis, así que grabación y análisis se guardan en un
+    único viaje a la base de datos; la transcripción, si la hay, en un
+    segundo. Devuelve el id de la grabación.
+    """
+    now = datetime.now()
+    new_recording = (
+        insert(recordings)
+        .values(
+            user_id=user_id,
+            filename=filename,
+            status=status,
+            metadata=analysis,
+            duration=analysis.get("duration"),
+            created_at=now,
+            **summary_columns(analysis)
+        )
+        .returning(recordings.c.id)
+        .cte("new_recording")
+    )
+    # Una fila por tarea; los literales van con CAST porque en un UNION
+    # Postgres los tipa como texto. El CTE se ejecuta una sola vez
+    rows = union_all(*[
+        select(
+            new_recording.c.id,
+            cast(literal(row["kind"], String), String),
+            cast(literal(row["model_version"], String), String),
+            cast(literal(row["result"], JSON), JSON),
+            cast(literal(now, DateTime), DateTime)
+        )
+        for row in analysis_rows(analysis)
+    ])
+    statement = (
+        insert(analyses)
+        .from_select(["recording_id", "kind", "model_version", "result", "created_at"], rows)
+        .returning(analyses.c.recording_id)
+    )
+    try:
+        with metrics.track("db_save"):
+            recording_id = db.execute(statement).scalars().first()
+            upsert_transcripts(db, [(recording_id, analysis)])
+            record_outcome(db, user_id, status, now.date(), analysis, analysis.get("duration"))
+            db.commit()
+        return recording_id
+    except Exception:
+        db.rollback()
+        raise
+
+def store_job_analysis(
+    db: Session,
+    recording_id: int,
+    analysis: Dict[str, Any],
+    commit: bool = True
+) -> None:
+    """Actualiza la grabación de un trabajo y añade su análisis y su transcripción.
+
+    Con `commit=False` los cambios quedan en la transacción del llamador, p.
+    ej. para confirmarlos junto con el estado del trabajo.
+    """
+    try:
+        start = time.perf_counter()
+        updated: Optional[int] = db.execute(
+            update(recordings)
+            .where(recordings.c.id == recording_id)
+            .values(metadata=analysis, duration=analysis.get("duration"), **summary_columns(analysis))
+            .returning(recordings.c.id)
+        ).scalar_one_or_none()
+        if updated is None:
+            raise ValueError(f"Grabación no encontrada: {recording_id}")
+        insert_analyses(db, [(recording_id, analysis)])
+        upsert_transcripts(db, [(recording_id, analysis)])
+        if commit:
+            db.commit()
+        metrics.observe("db_save", time.perf_counter() - start)
+    except Exception:
+        db.rollback()
+        raise
+
+def store_reanalyses(db: Session, items: List[Tuple[int, Dict[str, Any], Dict[str, Any]]]) -> None:
+    """Guarda un lote de reanálisis (recording_id, metadata, análisis parcial).
+
+    `metadata` es el análisis completo de la grabación con las tareas
+    recalculadas ya fusionadas; el parcial solo contiene esas tareas y se
+    añade como filas nuevas. Los agregados del dashboard se corrigen con la
+    diferencia entre el análisis guardado y el nuevo, en la misma
+    transacción. No hace commit.
+    """
+    if not items:
+        return
+    # Análisis guardado, bloqueado hasta el commit para que la diferencia
+    # aplicada a los agregados sea exacta
+    previous = {
+        row.id: row
+        for row in db.execute(
+            select(
+                recordings.c.id,
+                recordings.c.user_id,
+                recordings.c.status,
+                recordings.c.created_at,
+                recordings.c.duration,
+                recordings.c.metadata
+            )
+            .where(recordings.c.id.in_([recording_id for recording_id, _, _ in items]))
+            .with_for_update()
+        )
+    }
+    changes = []
+    for recording_id, metadata, _ in items:
+        row = previous.get(recording_id)
+        if row is not None:
+            day = (row.created_at or datetime.now()).date()
+            changes.append((row.user_id, row.status, day, row.duration, row.metadata, metadata))
+    record_reanalyses(db, changes)
+    db.execute(
+        update(recordings).where(recordings.c.id == bindparam("recording")),
+        [
+            {"recording": recording_id, "metadata": metadata, **summary_columns(metadata)}
+            for recording_id, metadata, _ in items
+        ]
+    )
+    insert_analyses(db, [(recording_id, partial) for recording_id, _, partial in items])
@@ -0,0 +1,113 @@
+"""Pool de procesos para la inferencia y el pre/postproceso (EXECUTION_MODE=process).
+
+La tokenización, la división en ventanas y el postproceso en Python de los
+pipelines compiten por el GIL con el event loop que atiende las peticiones.
+En modo `process` ese trabajo se ejecuta en PROCESS_POOL_WORKERS procesos
+hijos que cargan sus propios modelos al iniciarse y reparten los núcleos
+(PROCESS_POOL_THREADS hilos de torch y CTranslate2 cada uno).
+
+Los procesos se crean con `spawn` (no es seguro hacer fork de un proceso con
+hilos de torch) y solo importan los servicios en el inicializador, ya en modo
+`thread`, de modo que un hijo nunca crea su propio pool. El audio no se copia
+entre procesos: los hijos mapean en memoria el mismo archivo PCM, que con
+PCM_TEMP_DIR=/dev/shm vive en memoria compartida.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+from . import metrics
+from .config import settings
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+def threads_per_process() -> int:
+    """Hilos intra-op por proceso para no sobresuscribir la CPU."""
+    if settings.PROCESS_POOL_THREADS > 0:
+        return settings.PROCESS_POOL_THREADS
+    return max(1, (os.cpu_count() or 1) // max(1, settings.PROCESS_POOL_WORKERS))
+
+def init_process(threads: int, preload: List[str]) -> None:
+    """Inicializador de cada proceso del pool."""
+    # Antes de importar torch para que OpenMP respete el límite
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+
+    import torch
+
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    # Cada proceso ejecuta una tarea a la vez con un único worker de Whisper
+    settings.EXECUTION_MODE = "thread"
+    settings.MODEL_PRELOAD = []
+    settings.WHISPER_NUM_WORKERS = 1
+    settings.WHISPER_CPU_THREADS = threads
+
+    from . import services
+
+    services.registry.preload(preload)
+    logger.info(f"Proceso {os.getpid()} del pool listo ({threads} hilos, modelos: {', '.join(preload) or '-'})")
+
+class ProcessPool(Executor):
+    """ProcessPoolExecutor que arranca en el primer uso y se recrea si un
+    proceso hijo muere (p. ej. por falta de memoria)."""
+
+    def __init__(self, name: str, max_workers: int, threads: int, preload: List[str]):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.threads = threads
+        self.preload = preload
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        metrics.EXECUTOR_WORKERS.labels(name).set(self.max_workers)
+
+    def _create(self) -> ProcessPoolExecutor:
+        logger.info(f"Iniciando pool de {self.max_workers} procesos ({self.threads} hilos cada uno)")
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_process,
+            initargs=(self.threads, self.preload)
+        )
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._create()
+            try:
+                future = self._pool.submit(fn, *args, **kwargs)
+            except BrokenProcessPool:
+                logger.error("El pool de procesos quedó inutilizable, se recrea")
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = self._create()
+                future = self._pool.submit(fn, *args, **kwargs)
+
+        # Tareas enviadas y no terminadas (en cola o en ejecución en un hijo)
+        active = metrics.EXECUTOR_ACTIVE.labels(self.name)
+        active.inc()
+        future.add_done_callback(lambda _: active.dec())
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+                self._pool = None
+
+def create_process_pool() -> Optional[ProcessPool]:
+    """Pool de procesos si EXECUTION_MODE=process, None en modo thread."""
+    if settings.EXECUTION_MODE != "process":
+        return None
+    return ProcessPool(
+        "process",
+        settings.PROCESS_POOL_WORKERS,
+        threads_per_process(),
+        settings.PROCESS_POOL_PRELOAD
+    )
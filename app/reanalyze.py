@@ -0,0 +1,335 @@
+"""Reanálisis incremental de las grabaciones guardadas.
+
+Uso:
+    python -m app.reanalyze --dry-run
+    python -m app.reanalyze --wait
+    python -m app.reanalyze --tasks category --user auditor@empresa.com --batch-size 100
+
+Cada fila de análisis guarda la versión de su tarea (hash del modelo y sus
+parámetros, ver `services.task_version`). Al cambiar un modelo o la lista de
+categorías solo quedan desactualizadas las tareas afectadas: el comando
+recorre las grabaciones terminadas por id, detecta las tareas cuya versión
+actual no está guardada y encola trabajos 'reanalisis' de --batch-size
+grabaciones. Los workers de la cola los calculan sobre las transcripciones
+guardadas, sin volver a ejecutar Whisper.
+
+Es reanudable: los trabajos persisten en la cola y cada worker vuelve a
+comprobar qué está desactualizado antes de calcular, así que tras una
+interrupción basta con relanzar el comando. Las grabaciones analizadas
+antes de que se guardaran versiones se recalculan en la primera pasada.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from .cascade import ANALYSIS_TASKS, TASK_OUTPUTS
+from .config import settings
+from .database import SessionLocal
+from .diarization import speaker_texts
+from .ingest import wait_for_batch
+from .jobs import enqueue_reanalysis
+from .models import Analysis, Job, Recording, Transcript, User
+from .persistence import store_reanalyses, upsert_transcripts
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+recordings = Recording.__table__
+analyses = Analysis.__table__
+transcripts = Transcript.__table__
+
+# Grabaciones leídas por consulta al buscar tareas desactualizadas
+SCAN_PAGE_SIZE = 1000
+
+def stored_versions(db: Session, recording_ids: List[int]) -> Dict[int, Set[Tuple[str, str]]]:
+    """Pares (tarea, versión) ya guardados de cada grabación."""
+    done: Dict[int, Set[Tuple[str, str]]] = {}
+    rows = db.execute(
+        select(analyses.c.recording_id, analyses.c.kind, analyses.c.model_version)
+        .where(analyses.c.recording_id.in_(recording_ids), analyses.c.kind.isnot(None))
+    )
+    for recording_id, kind, version in rows:
+        done.setdefault(recording_id, set()).add((kind, version))
+    return done
+
+def stale_tasks(
+    recorded_tasks: Optional[List[str]],
+    done: Set[Tuple[str, str]],
+    versions: Dict[str, str],
+    tasks: Optional[List[str]] = None
+) -> List[str]:
+    """Tareas cuya versión actual no está guardada.
+
+    Por defecto se consideran las tareas que ya tenía el análisis de la
+    grabación; `tasks` fija la lista, p. ej. para añadir una tarea nueva.
+    """
+    wanted = tasks or recorded_tasks or ANALYSIS_TASKS
+    return [task for task in ANALYSIS_TASKS if task in wanted and (task, versions[task]) not in done]
+
+def load_recordings(db: Session, recording_ids: List[int]) -> List[Dict[str, Any]]:
+    """Transcripción y análisis actual de cada grabación.
+
+    Las grabaciones sin fila en `transcripts` (guardadas antes de separar las
+    transcripciones) usan el texto de su análisis; las que no tienen texto se
+    omiten.
+    """
+    rows = db.execute(
+        select(
+            recordings.c.id,
+            recordings.c.metadata,
+            transcripts.c.text,
+            transcripts.c.segments,
+            transcripts.c.speakers,
+            transcripts.c.duration
+        )
+        .select_from(recordings.outerjoin(transcripts, transcripts.c.recording_id == recordings.c.id))
+        .where(recordings.c.id.in_(recording_ids))
+        .order_by(recordings.c.id)
+    ).all()
+
+    loaded = []
+    for recording_id, metadata, text, segments, speakers, duration in rows:
+        metadata = metadata or {}
+        stored = text is not None
+        if not stored:
+            text = metadata.get("text")
+            segments = metadata.get("segments")
+            speakers = metadata.get("speakers")
+            duration = metadata.get("duration")
+        if not text:
+            continue
+        loaded.append({
+            "id": recording_id,
+            "metadata": metadata,
+            "transcription": {"text": text, "segments": segments, "speakers": speakers, "duration": duration},
+            "stored": stored
+        })
+    return loaded
+
+def merge_analysis(metadata: Dict[str, Any], partial: Dict[str, Any]) -> Dict[str, Any]:
+    """Análisis completo de la grabación con las tareas recalculadas."""
+    recomputed = partial["tasks"]
+    merged = {**metadata, **{TASK_OUTPUTS[task][0]: partial[TASK_OUTPUTS[task][0]] for task in recomputed}}
+    merged["tasks"] = [
+        task for task in ANALYSIS_TASKS
+        if task in recomputed or task in (metadata.get("tasks") or [])
+    ]
+    merged["versions"] = {**(metadata.get("versions") or {}), **(partial.get("versions") or {})}
+    merged["timestamp"] = partial["timestamp"]
+    return merged
+
+async def reanalyze_recordings(
+    db: Session,
+    recording_ids: List[int],
+    tasks: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Recalcula las tareas desactualizadas de un lote de grabaciones.
+
+    Los análisis del lote se lanzan a la vez para que los micro-batchers
+    agrupen los textos de todas las grabaciones. Una grabación que falla se
+    informa y queda desactualizada para la siguiente pasada; si fallan todas
+    se lanza la excepción para que la cola reintente el trabajo. No hace
+    commit: se confirma junto con el estado del trabajo.
+    """
+    # Importación diferida: los modelos se cargan solo en los procesos worker
+    from .services import analyze_text, task_versions
+
+    # La sesión es síncrona: sus consultas van al pool de hilos para no
+    # bloquear el event loop del worker
+    loop = asyncio.get_running_loop()
+    versions = task_versions(list(ANALYSIS_TASKS))
+    loaded = await loop.run_in_executor(None, load_recordings, db, recording_ids)
+    done = await loop.run_in_executor(None, stored_versions, db, [recording["id"] for recording in loaded])
+    plans = []
+    for recording in loaded:
+        stale = stale_tasks(recording["metadata"].get("tasks"), done.get(recording["id"], set()), versions, tasks)
+        if stale:
+            plans.append((recording, stale))
+
+    results = await asyncio.gather(
+        *(
+            analyze_text(recording["transcription"]["text"], stale, speaker_texts(recording["transcription"]))
+            for recording, stale in plans
+        ),
+        return_exceptions=True
+    )
+
+    items, failed = [], []
+    by_task = {task: 0 for task in ANALYSIS_TASKS}
+    for (recording, stale), result in zip(plans, results):
+        if isinstance(result, Exception):
+            detail = getattr(result, "detail", None) or str(result)
+            logger.error(f"Error al reanalizar la grabación {recording['id']}: {detail}")
+            failed.append({"recording_id": recording["id"], "error": detail})
+            continue
+        items.append((recording["id"], merge_analysis(recording["metadata"], result), result))
+        for task in stale:
+            by_task[task] += 1
+
+    if plans and not items:
+        raise RuntimeError(f"Fallaron las {len(plans)} grabaciones del lote: {failed[0]['error']}")
+
+    def store() -> None:
+        upsert_transcripts(db, [
+            (recording["id"], recording["transcription"]) for recording in loaded if not recording["stored"]
+        ])
+        store_reanalyses(db, items)
+
+    await loop.run_in_executor(None, store)
+    return {
+        "recordings": len(recording_ids),
+        "reanalyzed": len(items),
+        "up_to_date": len(loaded) - len(plans),
+        "without_text": len(recording_ids) - len(loaded),
+        "tasks": by_task,
+        "failed": failed
+    }
+
+def scan_stale(
+    db: Session,
+    versions: Dict[str, str],
+    tasks: Optional[List[str]] = None,
+    user_id: Optional[int] = None
+) -> Iterator[Tuple[int, List[str]]]:
+    """Grabaciones terminadas con texto y sus tareas desactualizadas, por id."""
+    has_text = or_(transcripts.c.id.isnot(None), recordings.c.metadata["text"].as_string().isnot(None))
+    last_id = 0
+    while True:
+        query = (
+            select(recordings.c.id, recordings.c.metadata["tasks"])
+            .select_from(recordings.outerjoin(transcripts, transcripts.c.recording_id == recordings.c.id))
+            .where(recordings.c.id > last_id, recordings.c.status == "completado", has_text)
+            .order_by(recordings.c.id)
+            .limit(SCAN_PAGE_SIZE)
+        )
+        if user_id is not None:
+            query = query.where(recordings.c.user_id == user_id)
+        rows = db.execute(query).all()
+        if not rows:
+            return
+        done = stored_versions(db, [recording_id for recording_id, _ in rows])
+        for recording_id, recorded_tasks in rows:
+            stale = stale_tasks(recorded_tasks, done.get(recording_id, set()), versions, tasks)
+            if stale:
+                yield recording_id, stale
+        last_id = rows[-1][0]
+
+def plan_reanalysis(
+    db: Session,
+    versions: Dict[str, str],
+    tasks: Optional[List[str]] = None,
+    user_id: Optional[int] = None,
+    batch_size: int = 50,
+    priority: int = -1,
+    limit: int = 0,
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """Encola las grabaciones desactualizadas en trabajos de `batch_size`,
+    confirmando cada SCAN_PAGE_SIZE grabaciones."""
+    batch_id = uuid.uuid4().hex
+    by_task = {task: 0 for task in ANALYSIS_TASKS}
+    pending: List[int] = []
+    found = 0
+    jobs = 0
+
+    def flush(final: bool = False) -> int:
+        size = len(pending) if final else len(pending) - len(pending) % batch_size
+        batches = [pending[start:start + batch_size] for start in range(0, size, batch_size)]
+        del pending[:size]
+        if dry_run:
+            return len(batches)
+        return len(enqueue_reanalysis(db, batches, batch_id, priority=priority, tasks=tasks))
+
+    for recording_id, stale in scan_stale(db, versions, tasks, user_id):
+        found += 1
+        for task in stale:
+            by_task[task] += 1
+        pending.append(recording_id)
+        if len(pending) >= SCAN_PAGE_SIZE:
+            jobs += flush()
+            logger.info(f"Reanálisis {batch_id}: {found} grabaciones desactualizadas, {jobs} trabajos")
+        if limit and found >= limit:
+            break
+    jobs += flush(final=True)
+
+    return {
+        "batch_id": batch_id if jobs and not dry_run else None,
+        "recordings": found,
+        "tasks": by_task,
+        "jobs": jobs,
+        "dry_run": dry_run
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reanálisis incremental de las grabaciones guardadas")
+    parser.add_argument("--tasks", help="Tareas a comprobar separadas por comas (por defecto las de cada análisis)")
+    parser.add_argument("--user", help="Email del usuario cuyas grabaciones se reanalizan (por defecto todas)")
+    parser.add_argument("--batch-size", type=int, default=settings.REANALYSIS_BATCH_SIZE, help="Grabaciones por trabajo")
+    parser.add_argument("--priority", type=int, default=-1, help="Prioridad de los trabajos (por debajo de los nuevos)")
+    parser.add_argument("--limit", type=int, default=0, help="Máximo de grabaciones a encolar, 0 = todas")
+    parser.add_argument("--dry-run", action="store_true", help="Solo contar las grabaciones desactualizadas")
+    parser.add_argument("--force", action="store_true", help="Encolar aunque haya un reanálisis en curso")
+    parser.add_argument("--wait", action="store_true", help="Esperar a que los workers terminen")
+    parser.add_argument("--interval", type=float, default=5.0, help="Segundos entre reportes de progreso")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+
+    tasks = None
+    if args.tasks:
+        tasks = [task.strip() for task in args.tasks.split(",") if task.strip()]
+        unknown = [task for task in tasks if task not in ANALYSIS_TASKS]
+        if unknown:
+            parser.error(f"Tareas desconocidas: {', '.join(unknown)} (disponibles: {', '.join(ANALYSIS_TASKS)})")
+
+    # Solo se necesitan las versiones de las tareas: no precargar modelos
+    settings.MODEL_PRELOAD = []
+    from .services import task_versions
+
+    versions = task_versions(list(ANALYSIS_TASKS))
+    db = SessionLocal()
+    try:
+        user_id = None
+        if args.user:
+            user = db.query(User).filter(User.email == args.user).first()
+            if user is None:
+                parser.error(f"Usuario no encontrado: {args.user}")
+            user_id = user.id
+
+        running = (
+            db.query(Job.batch_id)
+            .filter(Job.kind == "reanalisis", Job.status.in_(("pendiente", "procesando")))
+            .first()
+        )
+        if running is not None and not (args.force or args.dry_run):
+            # Retomar el seguimiento del lote en curso en lugar de duplicarlo
+            logger.warning(f"Hay un reanálisis en curso (lote {running.batch_id}); usar --force para encolar otro")
+            report: Dict[str, Any] = {"batch_id": running.batch_id, "resumed": True}
+        else:
+            report = plan_reanalysis(
+                db,
+                versions,
+                tasks,
+                user_id,
+                max(1, args.batch_size),
+                args.priority,
+                args.limit,
+                args.dry_run
+            )
+    finally:
+        db.close()
+
+    if args.wait and report.get("batch_id"):
+        report["progress"] = wait_for_batch(report["batch_id"], args.interval)
+
+    sys.stdout.write(json.dumps(report, indent=2, ensure_ascii=False, default=str) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import gc
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from . import metrics
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+def get_process_rss() -> int:
+    """Devuelve la memoria residente del proceso en bytes."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _estimate_model_size(model: Any) -> int:
+    """Estima la memoria de un modelo a partir de sus parámetros torch."""
+    module = getattr(model, "model", model)
+    parameters = getattr(module, "parameters", None)
+    if not callable(parameters):
+        return 0
+    try:
+        return sum(p.numel() * p.element_size() for p in parameters())
+    except Exception:
+        return 0
+
+class ModelRegistry:
+    """Registro de modelos con carga bajo demanda y desalojo LRU.
+
+    Cada modelo se registra con una función de carga y solo se instancia la
+    primera vez que se pide. Si la memoria estimada de los modelos residentes
+    supera `memory_budget` (bytes, 0 = sin límite) se descargan los menos
+    usados recientemente.
+    """
+
+    def __init__(self, memory_budget: int = 0):
+        self.memory_budget = memory_budget
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._load_times: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.stats = {"loads": 0, "hits": 0, "evictions": 0, "load_errors": 0}
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        """Registra la función que construye el modelo `name`."""
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks.setdefault(name, threading.Lock())
+
+    def is_registered(self, name: str) -> bool:
+        return name in self._loaders
+
+    def get(self, name: str) -> Optional[Any]:
+        """Devuelve el modelo, cargándolo si no está residente.
+
+        Devuelve None si el modelo no está registrado o falla su carga.
+        """
+        with self._lock:
+            model = self._models.get(name)
+            if model is not None:
+                self._models.move_to_end(name)
+                self.stats["hits"] += 1
+                return model
+            load_lock = self._load_locks.get(name)
+        if load_lock is None:
+            logger.error(f"Modelo no registrado: {name}")
+            return None
+
+        # Un solo hilo carga cada modelo; el resto espera y lo reutiliza
+        with load_lock:
+            with self._lock:
+                model = self._models.get(name)
+                if model is not None:
+                    self._models.move_to_end(name)
+                    self.stats["hits"] += 1
+                    return model
+            return self._load(name)
+
+    def _load(self, name: str) -> Optional[Any]:
+        rss_before = get_process_rss()
+        start = time.perf_counter()
+        try:
+            model = self._loaders[name]()
+        except Exception as e:
+            logger.error(f"Error al cargar modelo {name}: {str(e)}")
+            with self._lock:
+                self.stats["load_errors"] += 1
+            metrics.MODEL_EVENTS.labels(name, "load_error").inc()
+            return None
+        elapsed = time.perf_counter() - start
+        size = _estimate_model_size(model) or max(get_process_rss() - rss_before, 0)
+        metrics.MODEL_LOAD_SECONDS.labels(name).observe(elapsed)
+        metrics.MODEL_EVENTS.labels(name, "load").inc()
+        metrics.MODEL_MEMORY.labels(name).set(size)
+
+        with self._lock:
+            self._models[name] = model
+            self._sizes[name] = size
+            self._load_times[name] = elapsed
+            self.stats["loads"] += 1
+            self._evict(keep=name)
+        logger.info(f"Modelo {name} cargado en {elapsed:.1f}s ({size / 1024 ** 2:.0f} MB)")
+        return model
+
+    def _evict(self, keep: str) -> None:
+        """Descarga modelos LRU hasta respetar el presupuesto de memoria."""
+        if not self.memory_budget:
+            return
+        while self.memory_usage() > self.memory_budget:
+            candidates = [name for name in self._models if name != keep]
+            if not candidates:
+                logger.warning(
+                    f"El modelo {keep} supera por sí solo el presupuesto de memoria"
+                )
+                break
+            self.unload(candidates[0])
+            self.stats["evictions"] += 1
+            metrics.MODEL_EVENTS.labels(candidates[0], "eviction").inc()
+
+    def unload(self, name: str) -> None:
+        """Descarga un modelo residente."""
+        with self._lock:
+            if self._models.pop(name, None) is None:
+                return
+            self._sizes.pop(name, None)
+        metrics.MODEL_MEMORY.labels(name).set(0)
+        gc.collect()
+        logger.info(f"Modelo {name} descargado")
+
+    def preload(self, names: List[str]) -> None:
+        """Carga por adelantado los modelos indicados."""
+        for name in names:
+            self.get(name)
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return list(self._models.keys())
+
+    def memory_usage(self) -> int:
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Contadores de carga/acierto/desalojo y memoria por modelo."""
+        with self._lock:
+            return {
+                **self.stats,
+                "memory_budget": self.memory_budget,
+                "memory_usage": sum(self._sizes.values()),
+                "models": {
+                    name: {
+                        "size": self._sizes.get(name, 0),
+                        "load_time": self._load_times.get(name)
+                    }
+                    for name in self._models
+                },
+            }
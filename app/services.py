@@ -3,22 +3,44 @@
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
 from fastapi import UploadFile, HTTPException
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from faster_whisper import WhisperModel
-from transformers import pipeline, AutoTokenizer
 import torch
-from pydub import AudioSegment
-import tempfile
+import numpy as np
 import redis
-from functools import lru_cache
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import functools
 import gc
+import threading
+import time
+import uuid
+import base64
+import hashlib
+import binascii
+import aiofiles
 
+from . import metrics
 from .config import settings
 from .models import Recording, Analysis, User
+from .registry import ModelRegistry
+from .backends import ANALYSIS_MODELS, backend_for, load_pipeline
+from .model_server import ModelServerClient
+from .audio import AudioDecodeError, SAMPLE_RATE, decode_to_pcm, load_pcm, pcm_slice, pcm_duration
+from .batching import MicroBatcher
+from .cache import AnalysisCache
+from .persistence import save_recording_analysis, store_job_analysis
+from .stats import get_dashboard_stats
+from .cascade import ANALYSIS_TASKS, TASK_OUTPUTS, cascade_stats, category_keywords, classify_keywords, count
+from .diarization import diarize_pcm
+from .procpool import create_process_pool
+from .transcript_store import TranscriptStore, file_digest
+from .windowing import Window, split_windows, aggregate_label_scores, top_label
+from .vad import detect_speech, plan_chunks, with_overlap, stitch_chunk
 
 # Configuración de logging
 logger = logging.getLogger(__name__)
@@ -32,162 +54,516 @@
             port=settings.REDIS_PORT,
             password=settings.REDIS_PASSWORD,
             db=settings.REDIS_DB,
-            decode_responses=True,
+            decode_responses=False,  # Los valores se guardan comprimidos
             max_connections=10  # Limitar conexiones
         )
     except Exception as e:
         logger.error(f"Error al conectar con Redis: {str(e)}")
 
-# Inicialización de modelos con manejo de errores
-try:
-    whisper = WhisperModel(
+# Registro de modelos: cada modelo se carga en su primer uso y los menos
+# usados se descargan si se supera MODEL_MEMORY_BUDGET
+registry = ModelRegistry(memory_budget=settings.MODEL_MEMORY_BUDGET * 1024 * 1024)
+
+def whisper_cpu_threads() -> int:
+    """Hilos intra-op de CTranslate2 por worker de Whisper.
+
+    Se reparten los núcleos entre los WHISPER_NUM_WORKERS chunks que se
+    transcriben a la vez para no sobresuscribir la CPU.
+    """
+    if settings.WHISPER_CPU_THREADS > 0:
+        return settings.WHISPER_CPU_THREADS
+    return max(1, (os.cpu_count() or 1) // max(1, settings.WHISPER_NUM_WORKERS))
+
+def _load_whisper() -> WhisperModel:
+    return WhisperModel(
         settings.WHISPER_MODEL,
         device=settings.MODEL_DEVICE,
         compute_type=settings.MODEL_COMPUTE_TYPE,
+        cpu_threads=whisper_cpu_threads(),
         num_workers=settings.WHISPER_NUM_WORKERS,
-        beam_size=settings.WHISPER_BEAM_SIZE,
         download_root=settings.TRANSFORMERS_CACHE
     )
-    logger.info(f"Modelo Whisper cargado: {settings.WHISPER_MODEL}")
-except Exception as e:
-    logger.error(f"Error al cargar modelo Whisper: {str(e)}")
-    whisper = None
 
-# Inicialización de modelos de análisis
-models = {}
-tokenizers = {}
+registry.register('whisper', _load_whisper)
 
 def load_model(model_name: str, task: str, model_id: str) -> None:
-    """Carga un modelo específico con manejo de memoria."""
-    try:
-        models[model_name] = pipeline(
-            task,
-            model=model_id,
-            device=settings.MODEL_DEVICE,
-            batch_size=settings.MODEL_BATCH_SIZE,
-            model_kwargs={"low_cpu_mem_usage": True}
-        )
-        tokenizers[model_name] = AutoTokenizer.from_pretrained(
-            model_id,
-            low_cpu_mem_usage=True
-        )
-        logger.info(f"Modelo {model_name} cargado correctamente")
-    except Exception as e:
-        logger.error(f"Error al cargar modelo {model_name}: {str(e)}")
-
-try:
-    # Cargar modelos uno por uno para mejor manejo de memoria
-    load_model('sentiment', 'text-classification', 'nlptown/bert-base-multilingual-uncased-sentiment')
-    load_model('summarizer', 'summarization', 'facebook/bart-large-cnn')
-    load_model('emotion', 'text-classification', 'SamLowe/roberta-base-go_emotions')
-    load_model('zero_shot', 'zero-shot-classification', 'facebook/bart-large-mnli')
-    
-    logger.info("Modelos de análisis cargados correctamente")
-except Exception as e:
-    logger.error(f"Error al cargar modelos de análisis: {str(e)}")
-    models = {}
-    tokenizers = {}
+    """Registra un modelo de análisis para cargarlo bajo demanda.
+
+    El backend (PyTorch, PyTorch int8 u ONNX Runtime) se elige por modelo
+    con MODEL_BACKENDS.
+    """
+    def loader():
+        return load_pipeline(model_name, task, model_id, backend_for(model_name))
+    registry.register(model_name, loader)
+
+for _name, (_task, _model_id) in ANALYSIS_MODELS.items():
+    load_model(_name, _task, _model_id)
+
+if settings.MODEL_PRELOAD and settings.EXECUTION_MODE != "process":
+    registry.preload(settings.MODEL_PRELOAD)
+
+def get_whisper() -> Optional[WhisperModel]:
+    """Obtiene el modelo Whisper, cargándolo si es necesario."""
+    return registry.get('whisper')
+
+def get_tokenizer(model_name: str):
+    """Obtiene el tokenizador del pipeline indicado."""
+    model = registry.get(model_name)
+    return model.tokenizer if model is not None else None
+
+# Cliente del servidor de modelos compartido (si está configurado, este
+# proceso no carga modelos y delega la inferencia)
+model_client = (
+    ModelServerClient(settings.MODEL_SERVER_SOCKET, settings.MODEL_SERVER_POOL_SIZE)
+    if settings.MODEL_SERVER_SOCKET else None
+)
+
+def transcription_signature() -> str:
+    """Firma de la configuración que determina una transcripción."""
+    return json.dumps({
+        "model": settings.WHISPER_MODEL,
+        "compute_type": settings.MODEL_COMPUTE_TYPE,
+        "beam_size": settings.WHISPER_BEAM_SIZE,
+        "chunk_seconds": settings.TRANSCRIPTION_CHUNK_SECONDS,
+        "overlap_ms": settings.CHUNK_OVERLAP_MS,
+        "vad": [
+            settings.VAD_ENABLED,
+            settings.VAD_THRESHOLD_DB,
+            settings.VAD_MIN_SILENCE_MS,
+            settings.VAD_SPEECH_PAD_MS,
+            settings.VAD_MAX_CHUNK_GAP_MS
+        ],
+        "diarization": [
+            settings.DIARIZATION_ENABLED,
+            settings.DIARIZATION_MAX_SPEAKERS,
+            settings.DIARIZATION_WINDOW_SECONDS,
+            settings.DIARIZATION_MIN_SILHOUETTE
+        ],
+    }, sort_keys=True)
+
+# Transcripciones guardadas por contenido para no repetir Whisper
+transcript_store = (
+    TranscriptStore(
+        settings.TRANSCRIPT_CACHE_DIR,
+        transcription_signature(),
+        max_bytes=settings.TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024,
+        max_age=settings.TRANSCRIPT_CACHE_MAX_AGE_DAYS * 86400
+    )
+    if settings.TRANSCRIPT_CACHE_ENABLED else None
+)
+
+# Pool de procesos para la inferencia con EXECUTION_MODE=process; los
+# modelos se cargan en los procesos hijos y no en este
+process_pool = create_process_pool()
 
 # Pool de workers para procesamiento en paralelo
-executor = ThreadPoolExecutor(
-    max_workers=settings.MAX_CONCURRENT_TRANSCRIPTIONS + settings.MAX_CONCURRENT_ANALYSES
+executor = process_pool or metrics.InstrumentedThreadPoolExecutor(
+    "analysis",
+    max_workers=settings.MAX_CONCURRENT_ANALYSES,
+    thread_name_prefix="analysis"
 )
 
-@lru_cache(maxsize=500)  # Reducido para menor uso de memoria
-def get_cached_analysis(text: str) -> Optional[Dict[str, Any]]:
-    """Obtiene el análisis desde la caché."""
-    if redis_client:
-        try:
-            cached = redis_client.get(f"analysis:{text}")
-            if cached:
-                return json.loads(cached)
-        except Exception as e:
-            logger.error(f"Error al obtener de caché: {str(e)}")
-    return None
+# Pool dedicado a Whisper: un hilo por worker de CTranslate2, compartido por
+# todas las peticiones para que los chunks en vuelo no superen la capacidad
+transcription_executor = metrics.InstrumentedThreadPoolExecutor(
+    "whisper",
+    max_workers=max(1, settings.WHISPER_NUM_WORKERS),
+    thread_name_prefix="whisper"
+)
 
-def cache_analysis(text: str, analysis: Dict[str, Any]) -> None:
-    """Guarda el análisis en la caché."""
-    if redis_client:
-        try:
-            redis_client.setex(
-                f"analysis:{text}",
-                settings.CACHE_TTL,
-                json.dumps(analysis)
-            )
-        except Exception as e:
-            logger.error(f"Error al guardar en caché: {str(e)}")
+# Categorías para la clasificación zero-shot
+CATEGORIES = settings.ANALYSIS_CATEGORIES
+
+def _get_pipeline(model_name: str):
+    model = registry.get(model_name)
+    if model is None:
+        raise RuntimeError(f"Modelo {model_name} no disponible")
+    return model
+
+def _run_sentiment(texts: List[str]) -> List[List[Dict[str, Any]]]:
+    # top_k=None devuelve todas las etiquetas para poder agregar ventanas
+    return _get_pipeline('sentiment')(
+        texts,
+        top_k=None,
+        truncation=True,
+        max_length=settings.MODEL_MAX_LENGTH,
+        batch_size=settings.MODEL_BATCH_SIZE
+    )
+
+def _run_emotion(texts: List[str]) -> List[List[Dict[str, Any]]]:
+    # top_k=None devuelve todas las etiquetas para poder agregar ventanas
+    return _get_pipeline('emotion')(
+        texts,
+        top_k=None,
+        truncation=True,
+        max_length=settings.MODEL_MAX_LENGTH,
+        batch_size=settings.MODEL_BATCH_SIZE
+    )
+
+def _run_summarizer(texts: List[str]) -> List[Dict[str, Any]]:
+    return _get_pipeline('summarizer')(
+        texts,
+        max_length=130,
+        min_length=30,
+        do_sample=False,
+        truncation=True,
+        batch_size=settings.MODEL_BATCH_SIZE
+    )
+
+def _run_zero_shot(texts: List[str]) -> List[Dict[str, Any]]:
+    results = _get_pipeline('zero_shot')(
+        texts,
+        CATEGORIES,
+        truncation=True,
+        batch_size=settings.MODEL_BATCH_SIZE
+    )
+    # Con una sola entrada el pipeline devuelve un dict en lugar de una lista
+    return [results] if isinstance(results, dict) else results
+
+# Niveles máximos de resumen de resúmenes
+MAX_SUMMARY_LEVELS = 4
+
+# Micro-batching entre peticiones: cada pipeline se ejecuta una vez por lote
+batchers = {
+    name: MicroBatcher(
+        name,
+        run_batch,
+        executor=executor,
+        max_batch_size=settings.ANALYSIS_MAX_BATCH_SIZE,
+        max_wait_ms=settings.ANALYSIS_MAX_WAIT_MS
+    )
+    for name, run_batch in (
+        ('sentiment', _run_sentiment),
+        ('summarizer', _run_summarizer),
+        ('emotion', _run_emotion),
+        ('zero_shot', _run_zero_shot),
+    )
+}
+
+# Métricas acumuladas de transcripción por chunk
+transcription_stats = {
+    "chunks": 0,
+    "audio_seconds": 0.0,
+    "processing_seconds": 0.0,
+    "last_chunk_rtf": None
+}
+_transcription_stats_lock = threading.Lock()
+
+# Versión del formato del análisis en caché; incrementar al cambiar su estructura.
+# No forma parte de las versiones de tarea (ver TASK_FORMAT_VERSIONS)
+ANALYSIS_VERSION = 6
+
+def analysis_signature() -> str:
+    """Firma de los modelos y parámetros que determinan un análisis.
+
+    Forma parte de la clave de caché: al cambiar un modelo o un parámetro las
+    entradas anteriores quedan invalidadas automáticamente.
+    """
+    return json.dumps({
+        "version": ANALYSIS_VERSION,
+        "models": {
+            name: [model_id, backend_for(name)]
+            for name, (_, model_id) in ANALYSIS_MODELS.items()
+        },
+        "max_length": settings.MODEL_MAX_LENGTH,
+        "categories": CATEGORIES,
+        "long_document": [
+            settings.LONG_DOCUMENT_MODE,
+            settings.WINDOW_STRIDE_TOKENS,
+            settings.SUMMARY_WINDOW_TOKENS
+        ],
+        "cascade": [
+            settings.CASCADE_ENABLED,
+            settings.CASCADE_CONFIDENCE_THRESHOLD,
+            settings.CASCADE_MIN_HITS,
+            category_keywords(),
+            settings.SUMMARY_MIN_WORDS
+        ],
+    }, sort_keys=True)
+
+# Versión del formato del resultado de cada tarea; incrementar solo la de la
+# tarea cuyo resultado cambia de estructura, para que `app.reanalyze` no
+# recalcule las demás
+TASK_FORMAT_VERSIONS = {"sentiment": 1, "emotion": 1, "summary": 1, "category": 1}
+
+@functools.lru_cache(maxsize=None)
+def task_version(task: str) -> str:
+    """Versión de una tarea de análisis: hash de su modelo y sus parámetros.
+
+    Cada fila de análisis guarda la versión con la que se calculó; al cambiar
+    el modelo o las categorías solo quedan desactualizadas las filas de las
+    tareas afectadas, que recalcula `app.reanalyze`.
+    """
+    model_name = TASK_OUTPUTS[task][1]
+    params: Dict[str, Any] = {
+        "format": TASK_FORMAT_VERSIONS[task],
+        "model": [ANALYSIS_MODELS[model_name][1], backend_for(model_name)],
+        "long_document": [settings.LONG_DOCUMENT_MODE, settings.WINDOW_STRIDE_TOKENS],
+    }
+    if task == "summary":
+        params["summary"] = [settings.SUMMARY_WINDOW_TOKENS, settings.SUMMARY_MIN_WORDS]
+    elif task == "category":
+        params["categories"] = CATEGORIES
+        params["cascade"] = [
+            settings.CASCADE_ENABLED,
+            settings.CASCADE_CONFIDENCE_THRESHOLD,
+            settings.CASCADE_MIN_HITS,
+            category_keywords()
+        ]
+    else:
+        params["max_length"] = settings.MODEL_MAX_LENGTH
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def task_versions(tasks: List[str]) -> Dict[str, str]:
+    return {task: task_version(task) for task in tasks}
+
+analysis_cache = AnalysisCache(
+    redis_client=redis_client,
+    signature=analysis_signature(),
+    max_bytes=settings.ANALYSIS_CACHE_MAX_BYTES,
+    ttl=settings.CACHE_TTL,
+    negative_ttl=settings.CACHE_NEGATIVE_TTL
+)
+
+def _transcribe_range(pcm: np.ndarray, start: int, end: int) -> Tuple[List[Dict[str, Any]], float]:
+    """Transcribe un tramo de muestras y devuelve los segmentos y la duración.
 
-async def process_audio_chunk(chunk_path: str) -> str:
-    """Procesa un chunk de audio en un hilo separado."""
+    Los segmentos de Whisper se generan de forma perezosa, así que se
+    consumen aquí para que la inferencia ocurra en el hilo o proceso del
+    pool. Los tiempos son relativos al inicio del tramo.
+    """
+    started = time.perf_counter()
     try:
-        segments, _ = whisper.transcribe(
-            chunk_path,
-            batch_size=settings.WHISPER_BATCH_SIZE
+        segments, _ = get_whisper().transcribe(
+            pcm_slice(pcm, start, end),
+            beam_size=settings.WHISPER_BEAM_SIZE
         )
-        result = " ".join([segment.text for segment in segments])
-        # Limpiar memoria
-        del segments
-        gc.collect()
-        return result
+        result = [
+            {"start": segment.start, "end": segment.end, "text": segment.text}
+            for segment in segments
+        ]
     except Exception as e:
         logger.error(f"Error al procesar chunk: {str(e)}")
         raise
+    return result, time.perf_counter() - started
+
+def _record_chunk(start: int, end: int, elapsed: float) -> None:
+    audio_seconds = (end - start) / SAMPLE_RATE
+    metrics.observe("whisper_chunk", elapsed, settings.WHISPER_MODEL, audio_seconds)
+    rtf = elapsed / audio_seconds if audio_seconds else 0.0
+    with _transcription_stats_lock:
+        transcription_stats["chunks"] += 1
+        transcription_stats["audio_seconds"] += audio_seconds
+        transcription_stats["processing_seconds"] += elapsed
+        transcription_stats["last_chunk_rtf"] = rtf
+    logger.debug(f"Chunk de {audio_seconds:.1f}s transcrito en {elapsed:.1f}s (RTF {rtf:.2f})")
+
+def process_audio_chunk(pcm: np.ndarray, start: int, end: int) -> List[Dict[str, Any]]:
+    """Transcribe un chunk de audio; se ejecuta en `transcription_executor`."""
+    result, elapsed = _transcribe_range(pcm, start, end)
+    _record_chunk(start, end, elapsed)
+    return result
+
+def process_pcm_chunk(pcm_path: str, start: int, end: int) -> Tuple[List[Dict[str, Any]], float]:
+    """Transcribe un tramo de un archivo PCM en un proceso del pool.
+
+    Se pasa la ruta y no las muestras: el hijo mapea el mismo archivo sin
+    copiar el audio entre procesos.
+    """
+    return _transcribe_range(load_pcm(pcm_path), start, end)
 
-async def transcribe_audio(file: UploadFile) -> str:
-    """Transcribe un archivo de audio a texto usando procesamiento en paralelo."""
-    if not whisper:
+def plan_pcm_chunks(pcm_path: str):
+    """`plan_transcription_chunks` sobre un archivo PCM, para ejecutarlo en un pool."""
+    return plan_transcription_chunks(load_pcm(pcm_path))
+
+async def transcribe_chunk(pcm: np.ndarray, pcm_path: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """Transcribe un chunk en el pool de procesos o en `transcription_executor`."""
+    loop = asyncio.get_running_loop()
+    if process_pool is None:
+        return await loop.run_in_executor(transcription_executor, process_audio_chunk, pcm, start, end)
+    result, elapsed = await loop.run_in_executor(process_pool, process_pcm_chunk, pcm_path, start, end)
+    _record_chunk(start, end, elapsed)
+    return result
+
+async def store_upload(file: UploadFile) -> str:
+    """Guarda el archivo subido en UPLOAD_DIR leyéndolo por bloques."""
+    suffix = Path(file.filename or "").suffix.lower() or ".wav"
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    dest_path = os.path.join(settings.UPLOAD_DIR, f"{uuid.uuid4().hex}{suffix}")
+    try:
+        with metrics.track("upload_spool"):
+            async with aiofiles.open(dest_path, "wb") as dest:
+                while True:
+                    chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    await dest.write(chunk)
+        return dest_path
+    except Exception as e:
+        logger.error(f"Error al guardar archivo subido: {str(e)}")
+        try:
+            os.unlink(dest_path)
+        except OSError:
+            pass
+        raise HTTPException(
+            status_code=500,
+            detail="Error al guardar el archivo de audio"
+        )
+
+async def transcribe_file(path: str, recording_id: Optional[int] = None) -> Dict[str, Any]:
+    """Transcribe un archivo de audio en disco.
+
+    Si el mismo contenido ya se transcribió con la configuración actual se
+    devuelve la transcripción guardada. Delega en el servidor de modelos si
+    MODEL_SERVER_SOCKET está configurado.
+    """
+    content_hash = None
+    if transcript_store is not None:
+        loop = asyncio.get_running_loop()
+        content_hash = await loop.run_in_executor(None, file_digest, path)
+        cached = await loop.run_in_executor(None, transcript_store.get, content_hash, recording_id)
+        if cached is not None:
+            logger.info(f"Transcripción reutilizada para {content_hash[:12]}")
+            return cached
+
+    if model_client is not None:
+        transcription = await model_client.transcribe(path)
+    else:
+        transcription = await _transcribe_file_local(path)
+
+    if transcript_store is not None:
+        await asyncio.get_running_loop().run_in_executor(
+            None, transcript_store.put, content_hash, transcription, recording_id
+        )
+        transcription["content_hash"] = content_hash
+    return transcription
+
+def plan_transcription_chunks(pcm: np.ndarray):
+    """Calcula los chunks a transcribir cortando en silencios.
+
+    Devuelve los rangos propios de cada chunk, los rangos ampliados con
+    solapamiento que se envían a Whisper y las muestras con voz. Con VAD
+    desactivado se usan tramos fijos sobre todo el audio.
+    """
+    if settings.VAD_ENABLED:
+        regions = detect_speech(
+            pcm,
+            threshold_db=settings.VAD_THRESHOLD_DB,
+            min_silence_ms=settings.VAD_MIN_SILENCE_MS,
+            speech_pad_ms=settings.VAD_SPEECH_PAD_MS
+        )
+    else:
+        regions = [(0, len(pcm))] if len(pcm) else []
+
+    chunks = plan_chunks(
+        regions,
+        settings.TRANSCRIPTION_CHUNK_SECONDS * SAMPLE_RATE,
+        settings.VAD_MAX_CHUNK_GAP_MS * SAMPLE_RATE // 1000
+    )
+    padded = with_overlap(chunks, settings.CHUNK_OVERLAP_MS * SAMPLE_RATE // 1000, len(pcm))
+    speech_samples = sum(end - start for start, end in regions)
+    return chunks, padded, speech_samples
+
+async def _transcription_events(path: str, remote: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    """Transcribe un archivo de audio en disco emitiendo los segmentos de cada
+    chunk en cuanto están listos.
+
+    El audio se decodifica una sola vez con ffmpeg a PCM de 16 kHz mono en un
+    archivo temporal que se mapea en memoria; cada chunk se convierte a float32
+    solo cuando se transcribe, así que la memoria por petición no depende de
+    la duración de la grabación. Los silencios detectados por VAD no se envían
+    a Whisper. Con `remote` los chunks se transcriben en el servidor de
+    modelos, que lee el mismo archivo PCM.
+
+    Emite un evento `segments` por chunk, en orden, y termina con un evento
+    `transcription` con el resultado completo.
+    """
+    if not remote and process_pool is None and get_whisper() is None:
         raise HTTPException(
             status_code=503,
             detail="El servicio de transcripción no está disponible"
         )
 
+    pcm_path = None
+    started = time.perf_counter()
     try:
-        # Guardar archivo temporalmente
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_path = temp_file.name
-
-        # Convertir a WAV si es necesario
-        if not file.filename.lower().endswith('.wav'):
-            audio = AudioSegment.from_file(temp_path)
-            audio.export(temp_path, format="wav")
-            del audio
-            gc.collect()
-
-        # Dividir el audio en chunks más pequeños
-        audio = AudioSegment.from_wav(temp_path)
-        chunk_length = 180000  # 3 minutos en milisegundos
-        chunks = [audio[i:i+chunk_length] for i in range(0, len(audio), chunk_length)]
-        del audio
-        gc.collect()
-        
-        # Procesar chunks en paralelo
-        chunk_paths = []
-        for i, chunk in enumerate(chunks):
-            chunk_path = f"{temp_path}_chunk_{i}.wav"
-            chunk.export(chunk_path, format="wav")
-            chunk_paths.append(chunk_path)
-            del chunk
-            gc.collect()
+        pcm_path = await decode_to_pcm(path, temp_dir=settings.PCM_TEMP_DIR or None)
+        pcm = load_pcm(pcm_path)
+        metrics.observe("decode", time.perf_counter() - started, audio_seconds=pcm_duration(pcm))
+
+        # Dividir el audio en chunks cortando en los silencios, fuera del
+        # event loop (en el pool de procesos si está activo)
+        loop = asyncio.get_running_loop()
+        with metrics.track("vad_plan"):
+            chunks, padded, speech_samples = await loop.run_in_executor(process_pool, plan_pcm_chunks, pcm_path)
 
         # Procesar chunks en paralelo
-        loop = asyncio.get_event_loop()
-        tasks = [
-            loop.run_in_executor(executor, process_audio_chunk, chunk_path)
-            for chunk_path in chunk_paths
-        ]
-        transcriptions = await asyncio.gather(*tasks)
+        if remote:
+            tasks = [
+                asyncio.ensure_future(model_client.transcribe_chunk(pcm_path, start, end))
+                for start, end in padded
+            ]
+        else:
+            tasks = [
+                asyncio.ensure_future(transcribe_chunk(pcm, pcm_path, start, end))
+                for start, end in padded
+            ]
 
-        # Limpiar archivos temporales
-        for path in [temp_path] + chunk_paths:
-            try:
-                os.unlink(path)
-            except Exception as e:
-                logger.warning(f"Error al eliminar archivo temporal {path}: {str(e)}")
+        segments: List[Dict[str, Any]] = []
+        try:
+            for index, task in enumerate(tasks):
+                chunk_segments = stitch_chunk(
+                    chunks, padded, index, await task, segments[-1] if segments else None
+                )
+                segments.extend(chunk_segments)
+                yield {
+                    "event": "segments",
+                    "segments": chunk_segments,
+                    "chunk": index + 1,
+                    "chunks": len(chunks)
+                }
+        finally:
+            # Si el cliente abandona, no transcribir los chunks pendientes
+            for task in tasks:
+                task.cancel()
+
+        duration = pcm_duration(pcm)
+        speech_duration = speech_samples / SAMPLE_RATE
+        del pcm
+        metrics.observe("transcription", time.perf_counter() - started, settings.WHISPER_MODEL, duration)
+        logger.info(
+            f"Transcripción: {duration:.0f}s de audio, {speech_duration:.0f}s con voz "
+            f"en {len(chunks)} chunks"
+        )
+
+        transcription = {
+            "text": " ".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "duration": duration,
+            "speech_duration": speech_duration
+        }
+
+        # Diarización sobre el mismo PCM, sin volver a decodificar
+        if settings.DIARIZATION_ENABLED and segments:
+            with metrics.track("diarization", audio_seconds=duration):
+                if remote:
+                    labels, speakers = await model_client.diarize(pcm_path, segments)
+                else:
+                    labels, speakers = await _diarize_local(pcm_path, segments)
+            for segment, speaker in zip(segments, labels):
+                segment["speaker"] = speaker
+            transcription["speakers"] = speakers
 
-        return " ".join(transcriptions)
+        yield {"event": "transcription", "transcription": transcription}
 
+    except HTTPException:
+        raise
+    except AudioDecodeError as e:
+        logger.error(f"Error al decodificar audio: {str(e)}")
+        raise HTTPException(
+            status_code=400,
+            detail="No se pudo decodificar el archivo de audio"
+        )
     except Exception as e:
         logger.error(f"Error en transcripción: {str(e)}")
         raise HTTPException(
@@ -195,92 +571,330 @@ async def transcribe_audio(file: UploadFile) -> str:
             detail="Error al procesar el archivo de audio"
         )
     finally:
+        # Limpiar archivos temporales
+        if pcm_path:
+            try:
+                os.unlink(pcm_path)
+            except Exception as e:
+                logger.warning(f"Error al eliminar archivo temporal {pcm_path}: {str(e)}")
         # Limpiar memoria
         gc.collect()
 
-async def analyze_text(text: str) -> Dict[str, Any]:
-    """Analiza el texto transcrito usando procesamiento en paralelo."""
+async def _transcribe_file_local(path: str) -> Dict[str, Any]:
+    """Transcribe un archivo de audio en disco usando procesamiento en paralelo."""
+    transcription = None
+    # Consumir todos los eventos para que el generador libere los temporales
+    async for event in _transcription_events(path):
+        if event["event"] == "transcription":
+            transcription = event["transcription"]
+    return transcription
+
+async def _diarize_local(pcm_path: str, segments: List[Dict[str, Any]]):
+    """Diariza un archivo PCM en el pool de procesos o, sin él, en un hilo."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(process_pool, diarize_pcm, pcm_path, segments)
+
+async def _transcribe_chunk_local(pcm_path: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """Transcribe un tramo de un archivo PCM ya decodificado por el cliente."""
+    if process_pool is None and get_whisper() is None:
+        raise HTTPException(
+            status_code=503,
+            detail="El servicio de transcripción no está disponible"
+        )
+    return await transcribe_chunk(load_pcm(pcm_path), pcm_path, start, end)
+
+async def transcribe_file_stream(
+    path: str,
+    recording_id: Optional[int] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Versión incremental de `transcribe_file`: emite los segmentos de cada
+    chunk al terminar y al final la transcripción completa."""
+    content_hash = None
+    if transcript_store is not None:
+        loop = asyncio.get_running_loop()
+        content_hash = await loop.run_in_executor(None, file_digest, path)
+        cached = await loop.run_in_executor(None, transcript_store.get, content_hash, recording_id)
+        if cached is not None:
+            logger.info(f"Transcripción reutilizada para {content_hash[:12]}")
+            yield {"event": "segments", "segments": cached["segments"], "chunk": 1, "chunks": 1}
+            yield {"event": "transcription", "transcription": cached}
+            return
+
+    async for event in _transcription_events(path, remote=model_client is not None):
+        if event["event"] == "transcription" and transcript_store is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, transcript_store.put, content_hash, event["transcription"], recording_id
+            )
+            event["transcription"]["content_hash"] = content_hash
+        yield event
+
+async def transcribe_audio(file: UploadFile) -> Dict[str, Any]:
+    """Transcribe un archivo de audio subido a texto y segmentos."""
+    path = await store_upload(file)
+    try:
+        return await transcribe_file(path)
+    finally:
+        try:
+            os.unlink(path)
+        except Exception as e:
+            logger.warning(f"Error al eliminar archivo temporal {path}: {str(e)}")
+
+def _analysis_variant(tasks: List[str], speakers: Optional[List[str]]) -> str:
+    """Variante de caché: tareas calculadas y, si las hay, textos por hablante."""
+    variant = ",".join(tasks)
+    if speakers:
+        digest = hashlib.sha256(json.dumps(speakers, ensure_ascii=False).encode("utf-8")).hexdigest()
+        variant += f"|speakers:{digest[:16]}"
+    return variant
+
+async def analyze_text(
+    text: str,
+    tasks: Optional[List[str]] = None,
+    speakers: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Analiza el texto transcrito, usando la caché si es posible.
+
+    `tasks` limita las tareas calculadas (ver `cascade.resolve_profile`); por
+    defecto se calculan todas. Con `speakers` (texto de cada hablante, ver
+    `diarization.speaker_texts`) el sentimiento y la emoción se calculan
+    además por hablante. Delega en el servidor de modelos si
+    MODEL_SERVER_SOCKET está configurado.
+    """
+    tasks = [task for task in ANALYSIS_TASKS if tasks is None or task in tasks]
+    variant = _analysis_variant(tasks, speakers)
+
     # Verificar caché
-    cached = get_cached_analysis(text)
-    if cached:
+    cached = analysis_cache.get(text, variant)
+    if cached is not None:
         return cached
 
-    if not all(models.values()):
+    with metrics.track("analysis", model=",".join(tasks)):
+        if model_client is not None:
+            analysis = await model_client.analyze(text, tasks, speakers)
+        else:
+            analysis = await _analyze_text_local(text, tasks, speakers)
+
+    # Guardar en caché
+    analysis_cache.set(text, analysis, variant)
+
+    return analysis
+
+async def analyze_text_stream(
+    text: str,
+    tasks: Optional[List[str]] = None,
+    speakers: Optional[List[str]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Versión incremental de `analyze_text`: emite el resultado de cada tarea
+    en cuanto termina y al final el análisis completo, que se guarda en caché."""
+    tasks = [task for task in ANALYSIS_TASKS if tasks is None or task in tasks]
+    variant = _analysis_variant(tasks, speakers)
+
+    cached = analysis_cache.get(text, variant)
+    if cached is not None:
+        for task in tasks:
+            yield {"event": "analysis", "task": task, "result": cached[TASK_OUTPUTS[task][0]]}
+        yield {"event": "analysis_complete", "analysis": cached}
+        return
+
+    if model_client is None:
+        _check_analysis_models(tasks)
+
+    async def run(task: str):
+        if model_client is not None:
+            partial = await model_client.analyze(text, [task], speakers)
+            return task, partial[TASK_OUTPUTS[task][0]]
+        return task, await _run_task(task, text, speakers)
+
+    pending = [asyncio.ensure_future(run(task)) for task in tasks]
+    analysis: Dict[str, Any] = {}
+    try:
+        for next_done in asyncio.as_completed(pending):
+            try:
+                task, result = await next_done
+            except HTTPException:
+                raise
+            except Exception as e:
+                logger.error(f"Error en análisis: {str(e)}")
+                raise HTTPException(
+                    status_code=500,
+                    detail="Error al analizar el texto"
+                )
+            analysis[TASK_OUTPUTS[task][0]] = result
+            yield {"event": "analysis", "task": task, "result": result}
+    finally:
+        for future in pending:
+            future.cancel()
+
+    # Mismo orden de claves que analyze_text
+    analysis = {TASK_OUTPUTS[task][0]: analysis[TASK_OUTPUTS[task][0]] for task in tasks}
+    analysis["tasks"] = tasks
+    analysis["versions"] = task_versions(tasks)
+    analysis["timestamp"] = datetime.now().isoformat()
+    analysis_cache.set(text, analysis, variant)
+    yield {"event": "analysis_complete", "analysis": analysis}
+
+async def _windows(model_name: str, text: str, max_tokens: int) -> List[Window]:
+    """Divide el texto según el tokenizador del modelo.
+
+    Con LONG_DOCUMENT_MODE desactivado se devuelve una única ventana y el
+    pipeline trunca el texto como antes.
+    """
+    if not settings.LONG_DOCUMENT_MODE:
+        return [Window(text, 0, 0)]
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor,
+        _split_text,
+        model_name,
+        text,
+        max_tokens,
+        settings.WINDOW_STRIDE_TOKENS
+    )
+
+def _split_text(model_name: str, text: str, max_tokens: int, stride: int) -> List[Window]:
+    # Se ejecuta en `executor`; en modo process el tokenizador es el del hijo
+    return split_windows(text, get_tokenizer(model_name), max_tokens, stride)
+
+def _weights(windows: List[Window]) -> List[float]:
+    return [float(window.tokens or len(window.text)) for window in windows]
+
+async def _classify(model_name: str, text: str, speakers: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Clasifica todas las ventanas en lote y agrega por longitud.
+
+    Con `speakers` las ventanas se toman del texto de cada hablante y se
+    clasifican todas en el mismo lote: el resultado global agrega todas y
+    `by_speaker` las de cada hablante, en arrays por id de hablante.
+    """
+    # Reservar los tokens especiales del modelo
+    max_tokens = settings.MODEL_MAX_LENGTH - 2
+    if not speakers:
+        windows = await _windows(model_name, text, max_tokens)
+        results = await batchers[model_name].submit_many([window.text for window in windows])
+        scores = aggregate_label_scores(results, _weights(windows))
+        return {**top_label(scores), "scores": scores, "windows": len(windows)}
+
+    async def split(speaker_text: str) -> List[Window]:
+        return await _windows(model_name, speaker_text, max_tokens) if speaker_text.strip() else []
+
+    per_speaker = await asyncio.gather(*(split(speaker_text) for speaker_text in speakers))
+    windows = [window for speaker_windows in per_speaker for window in speaker_windows]
+    if not windows:
+        return await _classify(model_name, text)
+    results = await batchers[model_name].submit_many([window.text for window in windows])
+    scores = aggregate_label_scores(results, _weights(windows))
+
+    labels: List[Optional[str]] = []
+    speaker_scores: List[Optional[float]] = []
+    offset = 0
+    for speaker_windows in per_speaker:
+        if not speaker_windows:
+            labels.append(None)
+            speaker_scores.append(None)
+            continue
+        speaker_results = results[offset:offset + len(speaker_windows)]
+        offset += len(speaker_windows)
+        best = top_label(aggregate_label_scores(speaker_results, _weights(speaker_windows)))
+        labels.append(best["label"])
+        speaker_scores.append(best["score"])
+
+    return {
+        **top_label(scores),
+        "scores": scores,
+        "windows": len(windows),
+        "by_speaker": {"label": labels, "score": speaker_scores}
+    }
+
+async def _categorize(text: str) -> Dict[str, Any]:
+    """Clasificación en cascada: palabras clave y, si no son concluyentes,
+    zero-shot por ventana, agregada y como línea temporal."""
+    if settings.CASCADE_ENABLED:
+        categorization = classify_keywords(text, CATEGORIES)
+        if categorization is not None:
+            count("keyword_decisions")
+            return categorization
+        count("escalations")
+
+    # Reservar espacio para la hipótesis que añade el pipeline zero-shot
+    windows = await _windows('zero_shot', text, settings.MODEL_MAX_LENGTH - 24)
+    results = await batchers['zero_shot'].submit_many([window.text for window in windows])
+    per_window = [
+        [{"label": label, "score": score} for label, score in zip(result["labels"], result["scores"])]
+        for result in results
+    ]
+    scores = aggregate_label_scores(per_window, _weights(windows))
+    best = top_label(scores)
+    categorization = {
+        "category": best["label"],
+        "score": float(best["score"]),
+        "scores": scores,
+        "method": "zero_shot"
+    }
+    if len(windows) > 1:
+        categorization["timeline"] = [
+            {"offset": window.offset, "category": result["labels"][0], "score": float(result["scores"][0])}
+            for window, result in zip(windows, results)
+        ]
+    return categorization
+
+async def _summarize(text: str) -> str:
+    """Resumen map-reduce: se resumen las ventanas en lote y, si hay varias,
+    se vuelve a resumir la unión de los resúmenes hasta obtener uno solo."""
+    # Un texto breve ya es su propio resumen
+    if len(text.split()) < settings.SUMMARY_MIN_WORDS:
+        count("short_summaries")
+        return text.strip()
+    windows = await _windows('summarizer', text, settings.SUMMARY_WINDOW_TOKENS)
+    for _ in range(MAX_SUMMARY_LEVELS):
+        results = await batchers['summarizer'].submit_many([window.text for window in windows])
+        summaries = [result["summary_text"] for result in results]
+        if len(summaries) == 1:
+            return summaries[0]
+        windows = await _windows('summarizer', " ".join(summaries), settings.SUMMARY_WINDOW_TOKENS)
+    return " ".join(summaries)
+
+def _check_analysis_models(tasks: List[str]) -> None:
+    # En modo process los modelos viven en los hijos: un modelo que no carga
+    # se reporta como error del análisis
+    if process_pool is not None:
+        return
+    # Con la cascada el modelo zero-shot se carga solo si hay que escalar
+    required = [
+        TASK_OUTPUTS[task][1] for task in tasks
+        if not (task == "category" and settings.CASCADE_ENABLED)
+    ]
+    if not all(registry.get(name) for name in required):
         raise HTTPException(
             status_code=503,
             detail="Los servicios de análisis no están disponibles"
         )
 
-    try:
-        # Preparar tareas para procesamiento en paralelo
-        loop = asyncio.get_event_loop()
-        
-        # Análisis de sentimiento
-        sentiment_task = loop.run_in_executor(
-            executor,
-            lambda: models['sentiment'](
-                text,
-                truncation=True,
-                max_length=settings.MODEL_MAX_LENGTH,
-                return_tensors="pt"
-            )[0]
-        )
-        
-        # Resumen
-        summary_task = loop.run_in_executor(
-            executor,
-            lambda: models['summarizer'](
-                text,
-                max_length=130,
-                min_length=30,
-                do_sample=False,
-                truncation=True,
-                return_tensors="pt"
-            )[0]
-        )
-        
-        # Análisis de emociones
-        emotion_task = loop.run_in_executor(
-            executor,
-            lambda: models['emotion'](
-                text,
-                truncation=True,
-                max_length=settings.MODEL_MAX_LENGTH,
-                return_tensors="pt"
-            )[0]
-        )
-        
-        # Categorización
-        categories = ["atención al cliente", "ventas", "soporte técnico", "reclamaciones"]
-        categorization_task = loop.run_in_executor(
-            executor,
-            lambda: models['zero_shot'](
-                text,
-                categories,
-                truncation=True,
-                max_length=settings.MODEL_MAX_LENGTH,
-                return_tensors="pt"
-            )[0]
-        )
+def _run_task(task: str, text: str, speakers: Optional[List[str]] = None):
+    if task == "sentiment":
+        return _classify('sentiment', text, speakers)
+    if task == "emotion":
+        return _classify('emotion', text, speakers)
+    if task == "summary":
+        return _summarize(text)
+    return _categorize(text)
 
-        # Esperar resultados
-        sentiment, summary, emotions, categorization = await asyncio.gather(
-            sentiment_task, summary_task, emotion_task, categorization_task
-        )
+async def _analyze_text_local(
+    text: str,
+    tasks: Optional[List[str]] = None,
+    speakers: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Analiza el texto transcrito usando procesamiento en paralelo."""
+    tasks = [task for task in ANALYSIS_TASKS if tasks is None or task in tasks]
+    _check_analysis_models(tasks)
 
-        analysis = {
-            "sentiment": sentiment,
-            "summary": summary["summary_text"],
-            "emotions": emotions,
-            "categorization": {
-                "category": categorization["labels"][0],
-                "score": float(categorization["scores"][0])
-            },
-            "timestamp": datetime.now().isoformat()
-        }
+    try:
+        # Cada pipeline agrupa las ventanas de este texto con las de otras
+        # peticiones concurrentes
+        results = await asyncio.gather(*(_run_task(task, text, speakers) for task in tasks))
 
-        # Guardar en caché
-        cache_analysis(text, analysis)
+        analysis = {TASK_OUTPUTS[task][0]: result for task, result in zip(tasks, results)}
+        analysis["tasks"] = tasks
+        analysis["versions"] = task_versions(tasks)
+        analysis["timestamp"] = datetime.now().isoformat()
 
         return analysis
 
@@ -299,49 +913,40 @@ async def save_analysis(
     filename: str,
     user_id: int,
     db: Session
-) -> None:
-    """Guarda el análisis en la base de datos."""
-    try:
-        recording = Recording(
-            user_id=user_id,
-            filename=filename,
-            status="completado",
-            metadata=analysis
-        )
-        db.add(recording)
-        db.commit()
-        db.refresh(recording)
-
-        analysis_record = Analysis(
-            recording_id=recording.id,
-            type="completo",
-            result=analysis
-        )
-        db.add(analysis_record)
-        db.commit()
+) -> int:
+    """Guarda grabación y análisis en una transacción, fuera del event loop.
 
+    Devuelve el id de la grabación creada.
+    """
+    try:
+        return await run_in_threadpool(save_recording_analysis, db, user_id, filename, analysis)
     except Exception as e:
         logger.error(f"Error al guardar análisis: {str(e)}")
-        db.rollback()
         raise HTTPException(
             status_code=500,
             detail="Error al guardar el análisis"
         )
 
-async def get_recording_stats(db: Session) -> Dict[str, Any]:
-    """Obtiene estadísticas de las grabaciones."""
+def update_recording_analysis(
+    recording_id: int,
+    analysis: Dict[str, Any],
+    db: Session,
+    commit: bool = True
+) -> None:
+    """Guarda el resultado de un trabajo sobre una grabación ya existente.
+
+    El estado de la grabación lo gestiona la cola de trabajos.
+    """
     try:
-        total = db.query(Recording).count()
-        completed = db.query(Recording).filter(Recording.status == "completado").count()
-        pending = db.query(Recording).filter(Recording.status == "pendiente").count()
-        error = db.query(Recording).filter(Recording.status == "error").count()
-
-        return {
-            "total": total,
-            "completed": completed,
-            "pending": pending,
-            "error": error
-        }
+        store_job_analysis(db, recording_id, analysis, commit=commit)
+    except Exception as e:
+        logger.error(f"Error al guardar análisis de la grabación {recording_id}: {str(e)}")
+        raise
+
+async def get_recording_stats(user_id: int, db: AsyncSession, days: int = 30) -> Dict[str, Any]:
+    """Obtiene estadísticas de las grabaciones del usuario desde los agregados."""
+    try:
+        return await get_dashboard_stats(db, user_id, days)
 
     except Exception as e:
         logger.error(f"Error al obtener estadísticas: {str(e)}")
@@ -350,6 +955,81 @@ async def get_recording_stats(db: Session) -> Dict[str, Any]:
             detail="Error al obtener estadísticas"
         )
 
+def encode_cursor(created_at: datetime, recording_id: int) -> str:
+    """Cursor opaco con la posición (created_at, id) de la última fila."""
+    raw = json.dumps([created_at.isoformat(), recording_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, recording_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(recording_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+async def list_recordings(
+    db: AsyncSession,
+    user_id: int,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    category: Optional[str] = None,
+    sentiment_min: Optional[float] = None,
+    sentiment_max: Optional[float] = None,
+    include_metadata: bool = False
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Página de grabaciones del usuario, de la más reciente a la más antigua.
+
+    Paginación por clave sobre (created_at, id) con el índice
+    (user_id, created_at, id): el coste de una página no depende de su
+    profundidad. Devuelve las filas y el cursor de la página siguiente.
+    """
+    recordings = Recording.__table__
+    columns = [
+        recordings.c.id,
+        recordings.c.user_id,
+        recordings.c.filename,
+        recordings.c.duration,
+        recordings.c.status,
+        recordings.c.created_at,
+        recordings.c.category,
+        recordings.c.sentiment
+    ]
+    if include_metadata:
+        columns.append(recordings.c.metadata)
+
+    query = select(*columns).where(recordings.c.user_id == user_id)
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(recordings.c.created_at, recordings.c.id) < tuple_(cursor_created_at, cursor_id)
+        )
+    if status:
+        query = query.where(recordings.c.status == status)
+    if date_from:
+        query = query.where(recordings.c.created_at >= date_from)
+    if date_to:
+        query = query.where(recordings.c.created_at < date_to)
+    if category:
+        query = query.where(recordings.c.category == category)
+    if sentiment_min is not None:
+        query = query.where(recordings.c.sentiment >= sentiment_min)
+    if sentiment_max is not None:
+        query = query.where(recordings.c.sentiment <= sentiment_max)
+
+    # Una fila extra indica si hay página siguiente
+    result = await db.execute(
+        query.order_by(recordings.c.created_at.desc(), recordings.c.id.desc()).limit(limit + 1)
+    )
+    rows = [dict(row) for row in result.mappings().all()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    return rows, next_cursor
+
 def validate_audio_file(file: UploadFile) -> bool:
     """Valida que el archivo sea un formato de audio soportado."""
     allowed_types = {
@@ -368,4 +1048,31 @@ def validate_audio_file(file: UploadFile) -> bool:
     if file_ext not in [ext for exts in allowed_types.values() for ext in exts]:
         return False
         
-    return True 
\ No newline at end of file
+    return True
+
+async def get_model_stats() -> Dict[str, Any]:
+    """Estado del registro de modelos del proceso que ejecuta la inferencia."""
+    if model_client is not None:
+        # La caché de análisis vive en este proceso, no en el servidor de modelos
+        stats = await model_client.stats()
+        stats["analysis_cache"] = analysis_cache.get_stats()
+        if transcript_store is not None:
+            stats["transcript_store"] = transcript_store.get_stats()
+        return stats
+    with _transcription_stats_lock:
+        transcription = dict(transcription_stats)
+    return {
+        **registry.get_stats(),
+        "transcription": transcription,
+        "batching": {name: batcher.get_stats() for name, batcher in batchers.items()},
+        "analysis_cache": analysis_cache.get_stats(),
+        "transcript_store": transcript_store.get_stats() if transcript_store is not None else None,
+        "cascade": dict(cascade_stats),
+        # En modo process el registro de arriba es el de este proceso; los
+        # modelos residen en los hijos del pool
+        "execution": {
+            "mode": settings.EXECUTION_MODE,
+            "process_workers": process_pool.max_workers if process_pool is not None else None,
+            "threads_per_process": process_pool.threads if process_pool is not None else None
+        }
+    }
@@ -0,0 +1,370 @@
+"""Estadísticas de grabaciones servidas desde agregados diarios.
+
+Uso:
+    python -m app.stats --rebuild    # reconstruir los agregados desde las grabaciones
+    python -m app.stats --backfill   # migrar `recordings` y rellenar category/sentiment
+"""
+import argparse
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, func, insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import Recording, RecordingStatsDaily
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+recordings = Recording.__table__
+rollups = RecordingStatsDaily.__table__
+
+# Estados finales que se acumulan en los agregados; el resto se cuenta en vivo
+FINAL_STATUSES = ("completado", "error")
+LIVE_STATUSES = ("pendiente", "procesando")
+
+def sentiment_value(analysis: Optional[Dict[str, Any]]) -> Optional[float]:
+    """Valor esperado en estrellas (1-5) del análisis de sentimiento."""
+    sentiment = (analysis or {}).get("sentiment")
+    if not sentiment:
+        return None
+    scores = sentiment.get("scores") or {sentiment["label"]: 1.0}
+    total = sum(scores.values())
+    if not total:
+        return None
+    try:
+        return sum(int(label.split()[0]) * score for label, score in scores.items()) / total
+    except (ValueError, IndexError):
+        return None
+
+def _rollup_row(
+    user_id: int,
+    status: str,
+    analysis: Optional[Dict[str, Any]],
+    duration: Optional[float],
+    day: date
+) -> Dict[str, Any]:
+    sentiment = sentiment_value(analysis)
+    categorization = (analysis or {}).get("categorization") or {}
+    return {
+        "user_id": user_id,
+        "day": day,
+        "status": status,
+        "category": categorization.get("category") or "",
+        "count": 1,
+        "duration_seconds": float(duration or 0.0),
+        "sentiment_sum": sentiment or 0.0,
+        "sentiment_count": 1 if sentiment is not None else 0,
+        "updated_at": datetime.now()
+    }
+
+# Campos acumulados de cada fila de agregados
+_ROLLUP_FIELDS = ("count", "duration_seconds", "sentiment_sum", "sentiment_count")
+
+def _accumulate(rows: Iterable[Tuple[int, str, date, Optional[float], Optional[dict]]]) -> Dict[tuple, Dict[str, Any]]:
+    """Agrupa grabaciones (usuario, estado, día, duración, análisis) por clave de agregado."""
+    buckets: Dict[tuple, Dict[str, Any]] = {}
+    for user_id, status, day, duration, analysis in rows:
+        row = _rollup_row(user_id, status, analysis, duration, day)
+        key = (row["user_id"], row["day"], row["status"], row["category"])
+        bucket = buckets.get(key)
+        if bucket is None:
+            buckets[key] = row
+            continue
+        for field in _ROLLUP_FIELDS:
+            bucket[field] += row[field]
+    return buckets
+
+def _upsert_rollups(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Suma las filas a los agregados existentes con un único upsert."""
+    if not rows:
+        return
+    statement = pg_insert(rollups)
+    excluded = statement.excluded
+    db.execute(
+        statement.on_conflict_do_update(
+            constraint="uq_recording_stats_daily",
+            set_={
+                "count": rollups.c.count + excluded.count,
+                "duration_seconds": rollups.c.duration_seconds + excluded.duration_seconds,
+                "sentiment_sum": rollups.c.sentiment_sum + excluded.sentiment_sum,
+                "sentiment_count": rollups.c.sentiment_count + excluded.sentiment_count,
+                "updated_at": excluded.updated_at
+            }
+        ),
+        rows
+    )
+
+def record_outcomes(
+    db: Session,
+    outcomes: Iterable[Tuple[Optional[int], str, Optional[date], Optional[float], Optional[Dict[str, Any]]]]
+) -> None:
+    """Suma grabaciones terminadas (usuario, estado, día, duración, análisis)
+    a los agregados con un único upsert. No hace commit.
+
+    El día es el de creación de la grabación, como en `rebuild_rollups` y
+    `record_reanalyses`, aunque termine días después (cola, reintentos).
+    """
+    _upsert_rollups(db, list(_accumulate(
+        (user_id, status, day or date.today(), duration, analysis)
+        for user_id, status, day, duration, analysis in outcomes
+        if user_id is not None and status in FINAL_STATUSES
+    ).values()))
+
+def record_reanalyses(
+    db: Session,
+    changes: Iterable[Tuple[Optional[int], str, date, Optional[float], Optional[dict], Optional[dict]]]
+) -> None:
+    """Traslada en los agregados grabaciones ya contadas cuyo análisis cambió.
+
+    Cada cambio es (usuario, estado, día, duración, análisis anterior,
+    análisis nuevo): se resta la fila del anterior y se suma la del nuevo con
+    un único upsert; si no cambian la categoría ni el sentimiento no se
+    escribe nada. El día es el de creación, como en `rebuild_rollups`. No
+    hace commit.
+    """
+    buckets: Dict[tuple, Dict[str, Any]] = {}
+    for user_id, status, day, duration, old, new in changes:
+        if user_id is None or status not in FINAL_STATUSES:
+            continue
+        for analysis, sign in ((old, -1), (new, 1)):
+            row = _rollup_row(user_id, status, analysis, duration, day)
+            key = (row["user_id"], row["day"], row["status"], row["category"])
+            bucket = buckets.setdefault(key, {**row, **{field: 0 for field in _ROLLUP_FIELDS}})
+            for field in _ROLLUP_FIELDS:
+                bucket[field] += sign * row[field]
+    _upsert_rollups(db, [
+        bucket for bucket in buckets.values()
+        if any(bucket[field] for field in _ROLLUP_FIELDS)
+    ])
+
+def record_outcome(
+    db: Session,
+    user_id: Optional[int],
+    status: str,
+    day: Optional[date],
+    analysis: Optional[Dict[str, Any]] = None,
+    duration: Optional[float] = None
+) -> None:
+    """Suma una grabación terminada al agregado de su día de creación (upsert, sin commit)."""
+    record_outcomes(db, [(user_id, status, day, duration, analysis)])
+
+async def get_dashboard_stats(db: AsyncSession, user_id: int, days: int = 30) -> Dict[str, Any]:
+    """Estadísticas del usuario: totales, categorías y serie diaria.
+
+    Los estados finales salen de los agregados (filas por día y categoría) y
+    los pendientes de una única consulta agrupada sobre el índice
+    (user_id, status), acotada por el tamaño de la cola.
+    """
+    live = await db.execute(
+        select(recordings.c.status, func.count())
+        .where(recordings.c.user_id == user_id, recordings.c.status.in_(LIVE_STATUSES))
+        .group_by(recordings.c.status)
+    )
+    live_counts = {status: count for status, count in live.all()}
+
+    totals = await db.execute(
+        select(
+            rollups.c.status,
+            rollups.c.category,
+            func.sum(rollups.c.count),
+            func.sum(rollups.c.duration_seconds),
+            func.sum(rollups.c.sentiment_sum),
+            func.sum(rollups.c.sentiment_count)
+        )
+        .where(rollups.c.user_id == user_id)
+        .group_by(rollups.c.status, rollups.c.category)
+    )
+    by_status = {status: 0 for status in FINAL_STATUSES}
+    categories: Dict[str, int] = {}
+    duration = sentiment_sum = 0.0
+    sentiment_count = 0
+    for status, category, count, duration_sum, s_sum, s_count in totals.all():
+        by_status[status] = by_status.get(status, 0) + count
+        duration += duration_sum or 0.0
+        sentiment_sum += s_sum or 0.0
+        sentiment_count += s_count or 0
+        if status == "completado" and category:
+            categories[category] = categories.get(category, 0) + count
+
+    since = date.today() - timedelta(days=max(0, days - 1))
+    daily_rows = await db.execute(
+        select(
+            rollups.c.day,
+            rollups.c.status,
+            func.sum(rollups.c.count),
+            func.sum(rollups.c.duration_seconds),
+            func.sum(rollups.c.sentiment_sum),
+            func.sum(rollups.c.sentiment_count)
+        )
+        .where(rollups.c.user_id == user_id, rollups.c.day >= since)
+        .group_by(rollups.c.day, rollups.c.status)
+        .order_by(rollups.c.day)
+    )
+    daily: Dict[date, Dict[str, Any]] = {}
+    for day, status, count, duration_sum, s_sum, s_count in daily_rows.all():
+        entry = daily.setdefault(day, {
+            "day": day.isoformat(), "completed": 0, "error": 0,
+            "duration_seconds": 0.0, "_sentiment": [0.0, 0]
+        })
+        entry["completed" if status == "completado" else "error"] += count
+        entry["duration_seconds"] += duration_sum or 0.0
+        entry["_sentiment"][0] += s_sum or 0.0
+        entry["_sentiment"][1] += s_count or 0
+    for entry in daily.values():
+        s_sum, s_count = entry.pop("_sentiment")
+        entry["average_sentiment"] = s_sum / s_count if s_count else None
+
+    pending = live_counts.get("pendiente", 0)
+    processing = live_counts.get("procesando", 0)
+    return {
+        "total": by_status["completado"] + by_status["error"] + pending + processing,
+        "completed": by_status["completado"],
+        "pending": pending,
+        "processing": processing,
+        "error": by_status["error"],
+        "duration_seconds": duration,
+        "average_sentiment": sentiment_sum / sentiment_count if sentiment_count else None,
+        "categories": dict(sorted(categories.items(), key=lambda item: item[1], reverse=True)),
+        "daily": list(daily.values())
+    }
+
+def rebuild_rollups(db: Session, chunk_size: int = 5000) -> int:
+    """Recalcula todos los agregados a partir de las grabaciones terminadas.
+
+    Las grabaciones se asignan al día de creación, ya que no se guarda la
+    fecha en que terminaron. Devuelve el número de filas de agregados.
+    """
+    result = db.execute(
+        select(
+            recordings.c.user_id,
+            recordings.c.status,
+            recordings.c.created_at,
+            recordings.c.duration,
+            recordings.c.metadata
+        )
+        .where(recordings.c.status.in_(FINAL_STATUSES))
+        .execution_options(yield_per=chunk_size)
+    )
+    buckets = _accumulate(
+        (user_id, status, (created_at or datetime.now()).date(), duration, metadata)
+        for user_id, status, created_at, duration, metadata in result
+    )
+    try:
+        db.execute(delete(rollups))
+        rows = list(buckets.values())
+        for start in range(0, len(rows), chunk_size):
+            db.execute(insert(rollups), rows[start:start + chunk_size])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(buckets)
+
+# Columnas e índices de `recordings` que create_all no añade a tablas existentes
+SCHEMA_MIGRATIONS = (
+    "ALTER TABLE recordings ADD COLUMN IF NOT EXISTS category VARCHAR",
+    "ALTER TABLE recordings ADD COLUMN IF NOT EXISTS sentiment DOUBLE PRECISION",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_recordings_user_created "
+    "ON recordings (user_id, created_at, id)",
+)
+
+def migrate_schema(engine) -> None:
+    """Añade las columnas de resumen y los índices del listado.
+
+    Los índices se crean con CONCURRENTLY (fuera de transacción) para no
+    bloquear las escrituras. `ix_recordings_user_status` existía sin
+    `created_at` y se recrea solo si conserva la definición anterior.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in SCHEMA_MIGRATIONS:
+            logger.info(statement)
+            conn.execute(text(statement))
+        definition = conn.execute(
+            text("SELECT indexdef FROM pg_indexes WHERE indexname = 'ix_recordings_user_status'")
+        ).scalar()
+        if definition is None or "created_at" not in definition:
+            conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_recordings_user_status"))
+            conn.execute(text(
+                "CREATE INDEX CONCURRENTLY ix_recordings_user_status "
+                "ON recordings (user_id, status, created_at)"
+            ))
+            logger.info("Índice ix_recordings_user_status recreado")
+
+def backfill_summary_columns(db: Session, chunk_size: int = 1000) -> int:
+    """Rellena category y sentiment de las grabaciones guardadas antes de
+    existir las columnas, a partir de su metadata. Devuelve las filas
+    actualizadas."""
+    # Importación diferida: persistence importa este módulo
+    from .persistence import summary_columns
+
+    last_id = 0
+    updated = 0
+    while True:
+        rows = db.execute(
+            select(recordings.c.id, recordings.c.metadata)
+            .where(
+                recordings.c.id > last_id,
+                recordings.c.metadata.isnot(None),
+                recordings.c.category.is_(None),
+                recordings.c.sentiment.is_(None)
+            )
+            .order_by(recordings.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return updated
+        last_id = rows[-1].id
+        values = [
+            {"recording": recording_id, **columns}
+            for recording_id, columns in (
+                (row.id, summary_columns(row.metadata)) for row in rows
+            )
+            if columns["category"] is not None or columns["sentiment"] is not None
+        ]
+        try:
+            if values:
+                db.execute(update(recordings).where(recordings.c.id == bindparam("recording")), values)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        updated += len(values)
+        logger.info(f"Backfill: {updated} grabaciones actualizadas (hasta id {last_id})")
+
+def main() -> None:
+    from .database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Agregados de estadísticas de grabaciones")
+    parser.add_argument("--rebuild", action="store_true", help="Recalcular todos los agregados")
+    parser.add_argument(
+        "--backfill",
+        action="store_true",
+        help="Añadir las columnas category/sentiment y sus índices y rellenarlas desde metadata"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+    if not (args.rebuild or args.backfill):
+        parser.print_help()
+        return
+
+    if args.backfill:
+        migrate_schema(engine)
+    db = SessionLocal()
+    try:
+        if args.backfill:
+            rows = backfill_summary_columns(db)
+            logger.info(f"Backfill terminado: {rows} grabaciones")
+        if args.rebuild:
+            rows = rebuild_rollups(db)
+            logger.info(f"Agregados reconstruidos: {rows} filas")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,82 @@
+"""Prueba manual de transcripción y análisis contra una API en ejecución.
+
+Uso:
+    python app/test_transcribe_and_analyze.py ruta/al/audio.mp3
+
+Credenciales en AUDITORIA_USER / AUDITORIA_PASSWORD y URL en API_BASE_URL.
+Para medir rendimiento usar `python -m app.benchmark`.
+"""
+import os
+import sys
+
 import requests
-import json
 
 # Configuración
-API_BASE_URL = "http://localhost:8000"
-TRANSCRIBE_URL = f"{API_BASE_URL}/transcribe/"
-ANALYZE_URL = f"{API_BASE_URL}/analyze/"
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+TOKEN_URL = f"{API_BASE_URL}/token"
+TRANSCRIBE_URL = f"{API_BASE_URL}/api/transcribe/"
+ANALYZE_URL = f"{API_BASE_URL}/api/analyze/"
+
+if len(sys.argv) != 2:
+    print(f"Uso: {sys.argv[0]} ruta/al/audio.mp3")
+    sys.exit(2)
 
 # Ruta del archivo de audio
-file_path = r"C:\Users\agust\Downloads\3314089248-6377740-20250421091646.mp3"
+file_path = sys.argv[1]
+content_type = "audio/wav" if file_path.lower().endswith(".wav") else "audio/mpeg"
+
+# Iniciar sesión; la cookie se fija a mano porque la API la marca como secure
+session = requests.Session()
+login_response = session.post(TOKEN_URL, data={
+    "username": os.getenv("AUDITORIA_USER", ""),
+    "password": os.getenv("AUDITORIA_PASSWORD", "")
+})
+if login_response.status_code != 200:
+    print("❌ Error al iniciar sesión:")
+    print(login_response.status_code, login_response.text)
+    sys.exit(1)
+session.cookies.set("access_token", login_response.json()["access_token"])
 
-# Enviar audio al endpoint /transcribe
+# Enviar audio al endpoint /api/transcribe
 with open(file_path, "rb") as f:
-    files = {"file": ("mi_audio.mp3", f, "audio/mpeg")}
+    files = {"file": (os.path.basename(file_path), f, content_type)}
     print("🔁 Enviando audio para transcripción...")
-    transcribe_response = requests.post(TRANSCRIBE_URL, files=files)
+    transcribe_response = session.post(TRANSCRIBE_URL, files=files)
 
 # Validar respuesta de transcripción
 if transcribe_response.status_code != 200:
     print("❌ Error al transcribir:")
     print(transcribe_response.status_code, transcribe_response.text)
-    exit()
+    sys.exit(1)
 
 # Obtener y validar el texto transcripto
 transcribed_text = transcribe_response.json().get("text", "").strip()
 if not transcribed_text:
     print("⚠️ La transcripción está vacía.")
-    exit()
+    sys.exit(1)
 
 print("✅ Transcripción completa:\n")
 print(transcribed_text)
 
-# Enviar texto transcripto al endpoint /analyze
+# Enviar texto transcripto al endpoint /api/analyze
 print("\n🔁 Enviando texto para análisis...")
-analyze_response = requests.post(ANALYZE_URL, json={"text": transcribed_text})
+analyze_response = session.post(ANALYZE_URL, data={
+    "text": transcribed_text,
+    "filename": os.path.basename(file_path)
+})
 
 # Validar respuesta de análisis
 if analyze_response.status_code != 200:
     print("❌ Error al analizar:")
     print(analyze_response.status_code, analyze_response.text)
-    exit()
+    sys.exit(1)
 
-analysis = analyze_response.json().get("analysis", [])
-print("✅ Análisis de sentimiento:\n")
-for result in analysis:
-    print(f"- Label: {result['label']} (Score: {result['score']:.2f})")
+analysis = analyze_response.json().get("analysis", {})
+sentiment = analysis.get("sentiment") or {}
+print("✅ Análisis:\n")
+if sentiment:
+    print(f"- Sentimiento: {sentiment['label']} (Score: {sentiment['score']:.2f})")
+if analysis.get("categorization"):
+    print(f"- Categoría: {analysis['categorization']['category']}")
+if analysis.get("summary"):
+    print(f"- Resumen: {analysis['summary']}")
@@ -0,0 +1,214 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+from . import metrics
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 del contenido de un archivo leído por bloques."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class TranscriptStore:
+    """Almacén en disco de transcripciones direccionado por contenido.
+
+    La clave combina el hash del archivo subido con la firma de la
+    configuración de transcripción (modelo, beam, VAD, chunks), de modo que
+    volver a subir el mismo audio devuelve la transcripción guardada sin
+    ejecutar Whisper. Cada entrada recuerda las grabaciones que la usan.
+
+    Varios procesos comparten el directorio: la lectura-modificación-escritura
+    de una entrada se serializa con un flock por subdirectorio. El almacén se
+    acota por antigüedad desde el último uso y por tamaño total, descartando
+    primero las entradas usadas hace más tiempo; la poda recorre el
+    directorio como mucho una vez cada EVICT_INTERVAL segundos por proceso.
+    Los métodos hacen E/S bloqueante y deben llamarse fuera del event loop.
+    """
+
+    EVICT_INTERVAL = 600
+
+    def __init__(self, root: str, signature: str = "", max_bytes: int = 0, max_age: float = 0):
+        self.root = root
+        self.signature_hash = hashlib.sha256(signature.encode("utf-8")).hexdigest()[:16]
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._last_eviction = 0.0
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "errors": 0, "evictions": 0}
+
+    def key(self, content_hash: str) -> str:
+        return f"{content_hash}-{self.signature_hash}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    @contextmanager
+    def _locked(self, key: str) -> Iterator[None]:
+        """Bloqueo exclusivo entre procesos del subdirectorio de `key`."""
+        directory = os.path.dirname(self._path(key))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), encoding="utf-8") as entry_file:
+                return json.load(entry_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Transcripción guardada ilegible {key}: {str(e)}")
+            with self._lock:
+                self.stats["errors"] += 1
+            return None
+
+    def _write(self, key: str, entry: Dict[str, Any]) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escritura atómica: varios workers pueden guardar la misma clave
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as entry_file:
+                json.dump(entry, entry_file, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except Exception:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def get(self, content_hash: str, recording_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Devuelve la transcripción guardada y enlaza la grabación indicada."""
+        key = self.key(content_hash)
+        with self._locked(key):
+            entry = self._read(key)
+            if entry is not None:
+                try:
+                    if recording_id is not None and recording_id not in entry["recording_ids"]:
+                        entry["recording_ids"].append(recording_id)
+                        self._write(key, entry)
+                    else:
+                        # La fecha de modificación marca el último uso para la poda
+                        os.utime(self._path(key))
+                except Exception as e:
+                    logger.warning(f"No se pudo enlazar la grabación {recording_id}: {str(e)}")
+        with self._lock:
+            self.stats["hits" if entry else "misses"] += 1
+        metrics.cache_result("transcript", "hit" if entry else "miss")
+        if entry is None:
+            return None
+
+        return {
+            **entry["transcription"],
+            "content_hash": content_hash,
+            "source_recording_id": entry["recording_ids"][0] if entry["recording_ids"] else None,
+            "cached": True
+        }
+
+    def put(
+        self,
+        content_hash: str,
+        transcription: Dict[str, Any],
+        recording_id: Optional[int] = None
+    ) -> None:
+        """Guarda una transcripción; los errores solo se registran.
+
+        Si otro proceso guardó la misma clave entretanto se conservan las
+        grabaciones que ya tenía enlazadas.
+        """
+        key = self.key(content_hash)
+        try:
+            with self._locked(key):
+                previous = self._read(key)
+                recording_ids = previous["recording_ids"] if previous else []
+                if recording_id is not None and recording_id not in recording_ids:
+                    recording_ids.append(recording_id)
+                self._write(key, {
+                    "transcription": transcription,
+                    "recording_ids": recording_ids,
+                    "created_at": datetime.now().isoformat()
+                })
+            with self._lock:
+                self.stats["writes"] += 1
+        except Exception as e:
+            logger.error(f"Error al guardar transcripción {key}: {str(e)}")
+            with self._lock:
+                self.stats["errors"] += 1
+        self._maybe_evict()
+
+    def _maybe_evict(self) -> None:
+        if not (self.max_bytes or self.max_age):
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_eviction < self.EVICT_INTERVAL:
+                return
+            self._last_eviction = now
+        try:
+            self.evict()
+        except Exception as e:
+            logger.error(f"Error al podar el almacén de transcripciones: {str(e)}")
+
+    def evict(self) -> int:
+        """Descarta las entradas sin uso desde hace más de `max_age` segundos
+        y, si el almacén supera `max_bytes`, las usadas hace más tiempo.
+
+        Devuelve el número de entradas eliminadas.
+        """
+        entries = []
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith(".json"):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    info = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, path))
+        entries.sort()
+
+        cutoff = time.time() - self.max_age if self.max_age else None
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            expired = cutoff is not None and mtime < cutoff
+            if not expired and (not self.max_bytes or total <= self.max_bytes):
+                break
+            key = os.path.basename(path)[:-len(".json")]
+            with self._locked(key):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            removed += 1
+        if removed:
+            with self._lock:
+                self.stats["evictions"] += removed
+            logger.info(f"Almacén de transcripciones: {removed} entradas descartadas")
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {**self.stats, "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0}
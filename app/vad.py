@@ -0,0 +1,140 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .audio import SAMPLE_RATE
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+Region = Tuple[int, int]
+
+# Bloque de lectura del PCM mapeado en memoria (60 s)
+_BLOCK_SAMPLES = 60 * SAMPLE_RATE
+
+def frame_energies(pcm: np.ndarray, frame_samples: int) -> np.ndarray:
+    """Energía en dBFS por frame, leyendo el PCM por bloques."""
+    block = _BLOCK_SAMPLES - (_BLOCK_SAMPLES % frame_samples)
+    energies = []
+    for start in range(0, len(pcm), block):
+        samples = np.asarray(pcm[start:start + block], dtype=np.float32) / 32768.0
+        usable = len(samples) - (len(samples) % frame_samples)
+        if usable == 0:
+            continue
+        frames = samples[:usable].reshape(-1, frame_samples)
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        energies.append(20 * np.log10(rms + 1e-10))
+    if not energies:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(energies)
+
+def detect_speech(
+    pcm: np.ndarray,
+    frame_ms: int = 30,
+    threshold_db: float = 12.0,
+    min_db: float = -50.0,
+    min_speech_ms: int = 250,
+    min_silence_ms: int = 500,
+    speech_pad_ms: int = 200
+) -> List[Region]:
+    """Detecta regiones con voz mediante un umbral de energía adaptativo.
+
+    El umbral se sitúa `threshold_db` por encima del ruido de fondo (percentil
+    10), sin superar el nivel típico de voz (percentil 90) menos el mismo
+    margen, y nunca por debajo de `min_db`. Devuelve rangos de muestras.
+    """
+    frame_samples = SAMPLE_RATE * frame_ms // 1000
+    energies = frame_energies(pcm, frame_samples)
+    if len(energies) == 0:
+        return []
+
+    noise_floor = float(np.percentile(energies, 10))
+    speech_level = float(np.percentile(energies, 90))
+    threshold = max(min(noise_floor + threshold_db, speech_level - threshold_db), min_db)
+    is_speech = energies > threshold
+
+    # Convertir frames con voz en regiones contiguas
+    regions: List[List[int]] = []
+    edges = np.diff(np.concatenate(([0], is_speech.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    min_silence_frames = max(1, min_silence_ms // frame_ms)
+    for start, end in zip(starts, ends):
+        if regions and start - regions[-1][1] < min_silence_frames:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    min_speech_frames = max(1, min_speech_ms // frame_ms)
+    pad = SAMPLE_RATE * speech_pad_ms // 1000
+    result: List[Region] = []
+    for start, end in regions:
+        if end - start < min_speech_frames:
+            continue
+        region = (max(0, start * frame_samples - pad), min(len(pcm), end * frame_samples + pad))
+        if result and region[0] <= result[-1][1]:
+            result[-1] = (result[-1][0], region[1])
+        else:
+            result.append(region)
+    return result
+
+def plan_chunks(regions: List[Region], max_samples: int, max_gap: int) -> List[Region]:
+    """Agrupa regiones de voz en chunks de hasta `max_samples`.
+
+    Solo se unen regiones separadas por pausas de hasta `max_gap` muestras,
+    de modo que los silencios largos (p. ej. esperas del IVR) no se envían a
+    Whisper. Solo una región más larga que `max_samples` se divide en tramos
+    fijos.
+    """
+    chunks: List[Region] = []
+    for start, end in regions:
+        if chunks and start - chunks[-1][1] <= max_gap and end - chunks[-1][0] <= max_samples:
+            chunks[-1] = (chunks[-1][0], end)
+            continue
+        while end - start > max_samples:
+            chunks.append((start, start + max_samples))
+            start += max_samples
+        chunks.append((start, end))
+    return chunks
+
+def with_overlap(chunks: List[Region], overlap: int, total: int) -> List[Region]:
+    """Extiende cada chunk `overlap` muestras hacia ambos lados."""
+    return [(max(0, start - overlap), min(total, end + overlap)) for start, end in chunks]
+
+def stitch_chunk(
+    chunks: List[Region],
+    padded: List[Region],
+    index: int,
+    segments: List[Dict[str, Any]],
+    previous: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """Segmentos propios del chunk `index` con tiempos absolutos.
+
+    La zona propia de un chunk va del punto medio del hueco con el chunk
+    anterior al punto medio del hueco con el siguiente; un segmento se
+    conserva solo si su punto medio cae en ella. `previous` es el último
+    segmento ya emitido, para descartar repeticiones en la frontera.
+    """
+    own_start = (chunks[index - 1][1] + chunks[index][0]) / 2 / SAMPLE_RATE if index > 0 else float("-inf")
+    own_end = (
+        (chunks[index][1] + chunks[index + 1][0]) / 2 / SAMPLE_RATE
+        if index < len(chunks) - 1 else float("inf")
+    )
+    offset = padded[index][0] / SAMPLE_RATE
+    stitched: List[Dict[str, Any]] = []
+    for segment in segments:
+        start = segment["start"] + offset
+        end = segment["end"] + offset
+        middle = (start + end) / 2
+        if middle < own_start or middle >= own_end:
+            continue
+        text = segment["text"].strip()
+        if not text:
+            continue
+        # Descartar repeticiones exactas en la frontera entre chunks
+        last = stitched[-1] if stitched else previous
+        if last and last["text"] == text and start < last["end"]:
+            continue
+        stitched.append({"start": round(float(start), 2), "end": round(float(end), 2), "text": text})
+    return stitched
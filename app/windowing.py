@@ -0,0 +1,76 @@
+import re
+from typing import Any, Dict, List, NamedTuple
+
+class Window(NamedTuple):
+    """Fragmento de un texto largo que cabe en la ventana de un modelo."""
+    text: str
+    tokens: int
+    offset: int  # Posición del primer carácter en el texto original
+
+def split_windows(text: str, tokenizer, max_tokens: int, stride: int = 0) -> List[Window]:
+    """Divide un texto en ventanas de como máximo `max_tokens` tokens.
+
+    Usa los offsets del tokenizador para cortar el texto original, con
+    `stride` tokens de solapamiento entre ventanas consecutivas. Si el
+    tokenizador no devuelve offsets se aproxima por palabras.
+    """
+    max_tokens = max(1, max_tokens)
+    stride = min(max(0, stride), max_tokens // 2)
+    try:
+        encoding = tokenizer(
+            text,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            truncation=False
+        )
+        offsets = encoding["offset_mapping"]
+    except (NotImplementedError, KeyError, TypeError, ValueError):
+        return _split_words(text, max_tokens, stride)
+
+    if len(offsets) <= max_tokens:
+        return [Window(text, len(offsets), 0)]
+
+    windows = []
+    step = max_tokens - stride
+    for start in range(0, len(offsets), step):
+        end = min(start + max_tokens, len(offsets))
+        char_start = offsets[start][0]
+        windows.append(Window(text[char_start:offsets[end - 1][1]], end - start, char_start))
+        if end == len(offsets):
+            break
+    return windows
+
+def _split_words(text: str, max_tokens: int, stride: int) -> List[Window]:
+    # Aproximación: ~0.75 palabras por token en español
+    max_words = max(1, int(max_tokens * 0.75))
+    overlap = int(stride * 0.75)
+    spans = [match.span() for match in re.finditer(r"\S+", text)]
+    if len(spans) <= max_words:
+        return [Window(text, int(len(spans) / 0.75), 0)]
+
+    windows = []
+    step = max(1, max_words - overlap)
+    for start in range(0, len(spans), step):
+        chunk = spans[start:start + max_words]
+        char_start = chunk[0][0]
+        windows.append(Window(text[char_start:chunk[-1][1]], int(len(chunk) / 0.75), char_start))
+        if start + max_words >= len(spans):
+            break
+    return windows
+
+def aggregate_label_scores(results: List[List[Dict[str, Any]]], weights: List[float]) -> Dict[str, float]:
+    """Promedio ponderado por longitud de las puntuaciones de cada etiqueta."""
+    totals: Dict[str, float] = {}
+    total_weight = sum(weights) or 1.0
+    for scores, weight in zip(results, weights):
+        for item in scores:
+            totals[item["label"]] = totals.get(item["label"], 0.0) + float(item["score"]) * weight
+    return {
+        label: score / total_weight
+        for label, score in sorted(totals.items(), key=lambda pair: pair[1], reverse=True)
+    }
+
+def top_label(scores: Dict[str, float]) -> Dict[str, Any]:
+    """Etiqueta con mayor puntuación agregada."""
+    label = max(scores, key=scores.get)
+    return {"label": label, "score": scores[label]}
@@ -0,0 +1,241 @@
+"""Worker de la cola de trabajos de transcripción y análisis.
+
+Uso:
+    python -m app.worker --workers 4
+
+Lanza un pool de procesos que drenan la tabla `jobs` por prioridad y
+reintentan los trabajos fallidos con backoff exponencial hasta
+JOB_MAX_ATTEMPTS. Cada proceso carga sus propios modelos salvo que
+MODEL_SERVER_SOCKET apunte al servidor de modelos compartido. El proceso
+principal reinicia los workers que terminan inesperadamente.
+
+Con el servidor de modelos los workers apenas usan CPU, así que conviene
+subir `--concurrency` (JOB_CONCURRENCY) para mantener ocupados los pools de
+inferencia y el micro-batching; sin él, cada trabajo ya usa
+WHISPER_NUM_WORKERS chunks en paralelo y `--workers` no debería superar
+núcleos / (WHISPER_NUM_WORKERS * WHISPER_CPU_THREADS).
+"""
+import argparse
+import asyncio
+import functools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import time
+from typing import Dict, Any
+
+from . import metrics
+from .config import settings
+from .database import SessionLocal
+from .jobs import claim_next_job, complete_job, fail_job, renew_lease
+from .models import Job
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+async def run_job(job: Job, db) -> Dict[str, Any]:
+    """Ejecuta la transcripción y/o el análisis de un trabajo."""
+    # Importación diferida: los modelos se cargan solo en los procesos worker
+    from .services import transcribe_file, analyze_text, update_recording_analysis
+    from .diarization import speaker_texts
+
+    payload = job.payload or {}
+    if job.kind == "reanalisis":
+        from .reanalyze import reanalyze_recordings
+
+        return await reanalyze_recordings(db, payload.get("recording_ids") or [], payload.get("tasks"))
+
+    result: Dict[str, Any] = {}
+
+    text = payload.get("text")
+    segments = None
+    speakers = None
+    if job.kind in ("transcripcion", "completo"):
+        transcription = await transcribe_file(payload["path"], job.recording_id)
+        text = transcription["text"]
+        segments = transcription["segments"]
+        result["text"] = text
+        result["segments"] = segments
+        result["duration"] = transcription.get("duration")
+        result["speakers"] = transcription.get("speakers")
+        speakers = speaker_texts(transcription)
+        if transcription.get("cached"):
+            result["source_recording_id"] = transcription.get("source_recording_id")
+
+    if job.kind in ("analisis", "completo"):
+        if not text:
+            # Audio sin voz o descartado por el VAD: no es un fallo
+            # transitorio, se completa sin análisis como en la API
+            logger.info(f"Trabajo {job.id} sin texto que analizar; se completa sin análisis")
+            result["analysis"] = None
+            return result
+        analysis = await analyze_text(text, payload.get("tasks"), speakers)
+        analysis["text"] = text
+        if segments is not None:
+            analysis["segments"] = segments
+            analysis["duration"] = result["duration"]
+            analysis["speakers"] = result["speakers"]
+        if "source_recording_id" in result:
+            analysis["source_recording_id"] = result["source_recording_id"]
+        # Se confirma junto con el estado del trabajo en complete_job
+        await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(update_recording_analysis, job.recording_id, analysis, db, commit=False)
+        )
+        result["analysis"] = analysis
+
+    return result
+
+def _renew_lease(job_id: int, worker_id: str) -> bool:
+    """Renueva el lease con una sesión propia: la del trabajo está en uso."""
+    db = SessionLocal()
+    try:
+        return renew_lease(db, job_id, worker_id)
+    finally:
+        db.close()
+
+async def lease_heartbeat(job_id: int, worker_id: str) -> None:
+    """Mantiene vivo el lease mientras el trabajo se procesa.
+
+    Sin renovación, un trabajo que tarda más que JOB_LEASE_TIMEOUT se
+    reclamaría y otro worker lo procesaría a la vez.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(settings.JOB_HEARTBEAT_INTERVAL)
+        try:
+            if not await loop.run_in_executor(None, _renew_lease, job_id, worker_id):
+                logger.warning(f"[{worker_id}] Se perdió el lease del trabajo {job_id}")
+                return
+        except Exception as e:
+            logger.error(f"[{worker_id}] Error al renovar el lease del trabajo {job_id}: {str(e)}")
+
+def _fail(db, job: Job, worker_id: str, detail: str) -> bool:
+    """Descarta la transacción del trabajo fallido y registra el fallo."""
+    db.rollback()
+    return fail_job(db, job, worker_id, detail)
+
+async def worker_loop(worker_id: str, stop_event: asyncio.Event) -> None:
+    """Reclama y procesa trabajos hasta recibir la señal de parada.
+
+    Las operaciones de base de datos van al pool de hilos para no bloquear
+    el event loop, que comparten los demás trabajos del proceso y sus
+    heartbeats.
+    """
+    loop = asyncio.get_running_loop()
+    while not stop_event.is_set():
+        db = SessionLocal()
+        try:
+            job = await loop.run_in_executor(None, claim_next_job, db, worker_id)
+            if job is None:
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id = job.id
+            logger.info(f"[{worker_id}] Procesando trabajo {job_id} ({job.kind})")
+            metrics.update_process_metrics()
+            heartbeat = asyncio.create_task(lease_heartbeat(job_id, worker_id))
+            try:
+                try:
+                    with metrics.track("job", model=job.kind):
+                        result = await run_job(job, db)
+                finally:
+                    heartbeat.cancel()
+                if await loop.run_in_executor(None, complete_job, db, job, worker_id, result):
+                    logger.info(f"[{worker_id}] Trabajo {job_id} completado")
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                await loop.run_in_executor(None, _fail, db, job, worker_id, detail)
+        except Exception as e:
+            logger.error(f"[{worker_id}] Error en el bucle del worker: {str(e)}")
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+        finally:
+            db.close()
+
+def _worker_process(index: int, concurrency: int = 1) -> None:
+    """Punto de entrada de cada proceso del pool."""
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{index}"
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+
+    async def main() -> None:
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop_event.set)
+        # Cada bucle procesa un trabajo a la vez
+        await asyncio.gather(*(
+            worker_loop(f"{worker_id}-{slot}", stop_event)
+            for slot in range(max(1, concurrency))
+        ))
+
+    asyncio.run(main())
+    logger.info(f"[{worker_id}] Worker detenido")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Worker de la cola de trabajos")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.JOB_WORKERS,
+        help="Número de procesos worker"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.JOB_CONCURRENCY,
+        help="Trabajos simultáneos por proceso"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+
+    def spawn(index: int) -> multiprocessing.Process:
+        process = multiprocessing.Process(
+            target=_worker_process,
+            args=(index, args.concurrency),
+            name=f"job-worker-{index}"
+        )
+        process.start()
+        return process
+
+    processes: Dict[int, multiprocessing.Process] = {
+        index: spawn(index) for index in range(max(1, args.workers))
+    }
+    logger.info(f"Pool de {len(processes)} workers iniciado")
+    stopping = False
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    # Supervisar los procesos: uno que muere (OOM, fallo nativo) se
+    # reemplaza para que el pool no se reduzca hasta detener la cola
+    while processes:
+        ready = multiprocessing.connection.wait([process.sentinel for process in processes.values()])
+        for index, process in list(processes.items()):
+            if process.sentinel not in ready:
+                continue
+            process.join()
+            metrics.mark_process_dead(process.pid)
+            del processes[index]
+            if stopping:
+                continue
+            logger.error(f"Worker {process.name} terminó con código {process.exitcode}; se reinicia")
+            # Evitar un bucle de reinicios si el proceso muere al arrancar
+            time.sleep(1)
+            if not stopping:
+                processes[index] = spawn(index)
+
+if __name__ == "__main__":
+    main()
@@ -33,8 +33,35 @@ echo "Iniciando la aplicación..."
 cd /app
 source venv/bin/activate
 
+# Directorio de métricas compartido por todos los procesos; se vacía en
+# cada arranque para no mezclar valores de procesos anteriores
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/auditoria_ia_metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Iniciar el servidor de modelos compartido por todos los workers. El socket
+# vive en un directorio solo accesible por este usuario y las conexiones se
+# autentican con una clave compartida por los procesos de este arranque
+mkdir -p -m 700 /tmp/auditoria_ia
+export MODEL_SERVER_SOCKET=${MODEL_SERVER_SOCKET:-/tmp/auditoria_ia/models.sock}
+export MODEL_SERVER_AUTHKEY=${MODEL_SERVER_AUTHKEY:-$(python -c 'import secrets; print(secrets.token_hex(32))')}
+echo "Iniciando servidor de modelos..."
+nohup python -m app.model_server >> /var/log/auditoria_ia/model_server.log 2>&1 &
+
+# Esperar a que el socket esté disponible
+while [ ! -S "$MODEL_SERVER_SOCKET" ]; do
+    echo "Esperando al servidor de modelos..."
+    sleep 1
+done
+
+# Iniciar el pool de workers de la cola de trabajos
+echo "Iniciando workers de la cola de trabajos..."
+nohup python -m app.worker --workers ${JOB_WORKERS:-2} \
+    >> /var/log/auditoria_ia/worker.log 2>&1 &
+
 # Iniciar Gunicorn
 gunicorn app.main:app \
+    -c python:app.gunicorn_conf \
     --workers $API_WORKERS \
     --worker-class uvicorn.workers.UvicornWorker \
     --bind $API_HOST:$API_PORT \